@@ -0,0 +1,93 @@
+"""Compare cold starts from the source tree with starts from a bundle.
+
+Builds a bundle of the checkout, then starts fresh interpreters that
+import cricket's runner modules and list the tests, as the GUI and the
+daemon do at boot, and reports how long they took:
+
+- from the source tree, with the bytecode cache already written;
+- from the source tree with no bytecode cache, as on a fresh or
+  read-only root filesystem;
+- from the bundle.
+
+Run from the directory containing setup.py:
+
+    python -m benchmarks.bundle [--runs N]
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+# Where the cricket package is, and the checkout it is part of.
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+CHECKOUT_DIR = os.path.dirname(SOURCE_DIR)
+
+# What each interpreter does: import what the runner needs, and list the tests.
+WORKLOAD = '\n'.join([
+    'import cricket.unittest.daemon, cricket.discovery, cricket.history',
+    'from cricket.unittest.discoverer import PyTestDiscoverer',
+    'PyTestDiscoverer().collect_tests()',
+])
+
+
+def run(cwd, env):
+    start = time.time()
+    subprocess.run(
+        [sys.executable, '-c', WORKLOAD],
+        cwd=cwd,
+        env=env,
+        stdout=subprocess.DEVNULL,
+        stderr=subprocess.DEVNULL,
+        check=True,
+    )
+    return time.time() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--runs', type=int, default=10)
+    options = parser.parse_args()
+
+    from cricket.bundle import build
+
+    workdir = tempfile.mkdtemp(prefix='cricket-bench-')
+    try:
+        archive = os.path.join(workdir, 'factorytest.pyz')
+        build(CHECKOUT_DIR, archive)
+
+        env = dict(os.environ)
+        env.pop('PYTHONDONTWRITEBYTECODE', None)
+        env.pop('PYTHONPYCACHEPREFIX', None)
+        source_env = dict(env, PYTHONPATH=SOURCE_DIR)
+        cold_env = dict(
+            source_env,
+            PYTHONDONTWRITEBYTECODE='1',
+            PYTHONPYCACHEPREFIX=os.path.join(workdir, 'no-cache'),
+        )
+        bundle_env = dict(env, PYTHONPATH=archive)
+        tests = os.path.join(CHECKOUT_DIR, 'tests')
+
+        modes = [
+            ('source', tests, source_env),
+            ('source, no .pyc', tests, cold_env),
+            ('bundle', workdir, bundle_env),
+        ]
+        # Write the bytecode cache for the source tree.
+        run(tests, source_env)
+
+        print('Starting %s, best and median of %d runs' % (CHECKOUT_DIR, options.runs))
+        print('%-20s %9s %9s' % ('mode', 'best', 'median'))
+        for name, cwd, mode_env in modes:
+            times = sorted(run(cwd, mode_env) for i in range(options.runs))
+            print('%-20s %7.0fms %7.0fms' % (name, times[0] * 1000, times[len(times) // 2] * 1000))
+    finally:
+        shutil.rmtree(workdir)
+
+
+if __name__ == '__main__':
+    sys.exit(main())
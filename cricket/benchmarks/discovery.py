@@ -0,0 +1,59 @@
+"""Compare cold-start test discovery by importing with reading the source.
+
+Starts the discoverer in a fresh interpreter, as the GUI does at boot,
+in each mode, and reports how long it took and how many tests were
+found.
+
+Run from the directory containing setup.py:
+
+    python -m benchmarks.discovery [--tree DIR] [--runs N]
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import subprocess
+import sys
+import time
+
+# Where the discoverer finds the cricket package.
+SOURCE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+def run(tree, extra_args):
+    env = dict(os.environ)
+    env['PYTHONPATH'] = os.pathsep.join(filter(None, [SOURCE_DIR, env.get('PYTHONPATH')]))
+    start = time.time()
+    output = subprocess.run(
+        [sys.executable, '-m', 'cricket.unittest.discoverer'] + extra_args,
+        cwd=tree,
+        env=env,
+        stdout=subprocess.PIPE,
+        stderr=subprocess.DEVNULL,
+    ).stdout
+    return time.time() - start, len(output.splitlines())
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tree', default=os.path.join(os.path.dirname(SOURCE_DIR), 'tests'),
+                        help="The test tree to discover (default: the factory tests)")
+    parser.add_argument('--runs', type=int, default=5)
+    options = parser.parse_args()
+
+    modes = [
+        ('import (unittest)', ['--import']),
+        ('static (ast)', []),
+    ]
+    print('Discovering %s, best and median of %d runs' % (options.tree, options.runs))
+    print('%-20s %6s %9s %9s' % ('mode', 'tests', 'best', 'median'))
+    for name, extra_args in modes:
+        results = [run(options.tree, extra_args) for i in range(options.runs)]
+        times = sorted(elapsed for elapsed, count in results)
+        print('%-20s %6d %7.0fms %7.0fms' % (
+            name, results[-1][1], times[0] * 1000, times[len(times) // 2] * 1000,
+        ))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
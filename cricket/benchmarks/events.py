@@ -0,0 +1,121 @@
+"""Measure how fast event sources emit events.
+
+Emits events from test methods, using the model's EventSource and a
+copy of the one it replaced (handlers bound per class, and only to the
+exact class), and reports the time per emit:
+
+- with no handlers, as for most of the model's events;
+- with one handler bound to the class;
+- with one handler subscribed to the instance emitting;
+- with one handler bound to the class through a coalescer, which also
+  counts delivering the batch of every test method once.
+
+Run from the directory containing setup.py:
+
+    python -m benchmarks.events [--emits N]
+"""
+from __future__ import print_function
+
+import argparse
+import sys
+import time
+
+from cricket.events import Coalescer, EventSource
+
+
+class LegacyEventSource(object):
+    "The event source EventSource used to be."
+    __slots__ = ()
+
+    _events = {}
+
+    @classmethod
+    def bind(cls, event, handler):
+        cls._events.setdefault(cls, {}).setdefault(event, []).append(handler)
+
+    def emit(self, event, **data):
+        try:
+            for handler in self._events[self.__class__][event]:
+                handler(self, **data)
+        except KeyError:
+            pass
+
+
+class LegacyNode(LegacyEventSource):
+    __slots__ = ()
+
+
+class Node(EventSource):
+    __slots__ = ('_subscriptions',)
+
+    def __init__(self):
+        self._subscriptions = None
+
+
+class Listener(object):
+    def __init__(self):
+        self.count = 0
+
+    def on_event(self, node):
+        self.count += 1
+
+    def on_batch(self, nodes):
+        self.count += len(nodes)
+
+
+def timed(nodes, emits, flush=None):
+    "Nanoseconds per emit of 'status_update', cycling through the nodes."
+    best = None
+    for attempt in range(5):
+        start = time.perf_counter()
+        for index in range(emits):
+            nodes[index % len(nodes)].emit('status_update')
+        if flush is not None:
+            flush()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best / emits * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--emits', type=int, default=200000)
+    parser.add_argument('--nodes', type=int, default=1000)
+    options = parser.parse_args()
+
+    listener = Listener()
+    results = []
+
+    # No handlers for the event.
+    legacy = [LegacyNode() for i in range(options.nodes)]
+    nodes = [Node() for i in range(options.nodes)]
+    results.append(('no handlers', timed(legacy, options.emits), timed(nodes, options.emits)))
+
+    # A handler on the class.
+    LegacyNode.bind('status_update', listener.on_event)
+    Node.bind('status_update', listener.on_event)
+    results.append(('class handler', timed(legacy, options.emits), timed(nodes, options.emits)))
+    Node.unbind('status_update', listener.on_event)
+
+    # A handler on each instance.
+    for node in nodes:
+        node.subscribe('status_update', listener.on_event)
+    results.append(('instance handler', None, timed(nodes, options.emits)))
+    for node in nodes:
+        node.unsubscribe('status_update', listener.on_event)
+
+    # A handler on the class, through a coalescer.
+    scheduled = []
+    coalescer = Coalescer(scheduled.append)
+    Node.bind('status_update', listener.on_batch, coalescer)
+    results.append(('coalesced', None, timed(nodes, options.emits, lambda: scheduled.pop()())))
+
+    print('%d emits from %d nodes' % (options.emits, options.nodes))
+    print('%-20s %12s %12s' % ('handlers', 'legacy', 'EventSource'))
+    for name, legacy_time, time_per_emit in results:
+        print('%-20s %12s %10.0fns' % (
+            name, '-' if legacy_time is None else '%10.0fns' % legacy_time, time_per_emit))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
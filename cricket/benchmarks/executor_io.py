@@ -0,0 +1,112 @@
+"""Compare the threaded, timer-polled executor with the event-driven one.
+
+Runs a suite of short tests through each executor and reports how many
+times the GUI side woke up, how long that took, and how long after a
+test finished its result was handled.
+
+Run from the directory containing setup.py:
+
+    python -m benchmarks.executor_io [--tests N] [--delay SECONDS]
+"""
+from __future__ import print_function
+
+import argparse
+import os
+import sys
+import time
+
+from cricket.compat import unittest
+from cricket.executor import Executor, EventDrivenExecutor
+from cricket.unittest.model import UnittestProject
+
+TESTS = int(os.environ.get('BENCHMARK_TESTS', 50))
+DELAY = float(os.environ.get('BENCHMARK_DELAY', 0.02))
+
+# The interval the GUI used to re-poll the threaded executor.
+POLL_INTERVAL = 0.1
+
+
+def _make_test(index):
+    def test(self):
+        time.sleep(DELAY)
+    test.__name__ = 'test_%04d' % index
+    return test
+
+
+# Built at import time, so the runner subprocess sees the same tests.
+Ticks = type('Ticks', (unittest.TestCase,), dict(
+    ('test_%04d' % i, _make_test(i)) for i in range(TESTS)
+))
+
+
+def measured(executor_class):
+    "Wrap an executor class so it records when each result is handled."
+    class Measured(executor_class):
+        def _start_readers(self):
+            self.latencies = []
+            super(Measured, self)._start_readers()
+
+        def _end_test(self, token, post):
+            self.latencies.append(time.time() - post['end_time'])
+            super(Measured, self)._end_test(token, post)
+
+    return Measured
+
+
+def run(executor_class, wait):
+    labels = ['benchmarks.executor_io.Ticks']
+    executor = measured(executor_class)(UnittestProject(), 'benchmarks', TESTS, labels)
+    wakeups = 0
+    busy = 0.0
+    start = time.time()
+    while True:
+        wait(executor)
+        wakeups += 1
+        tick = time.time()
+        running = executor.poll()
+        busy += time.time() - tick
+        if not running:
+            break
+    elapsed = time.time() - start
+
+    latencies = sorted(executor.latencies)
+    return {
+        'tests': len(latencies),
+        'elapsed': elapsed,
+        'wakeups': wakeups,
+        'busy': busy,
+        'median': latencies[len(latencies) // 2] if latencies else 0.0,
+        'worst': latencies[-1] if latencies else 0.0,
+    }
+
+
+def main():
+    global TESTS, DELAY
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--tests', type=int, default=TESTS)
+    parser.add_argument('--delay', type=float, default=DELAY)
+    options = parser.parse_args()
+    TESTS, DELAY = options.tests, options.delay
+    # The runner subprocess builds its suite from the environment.
+    os.environ['BENCHMARK_TESTS'] = str(TESTS)
+    os.environ['BENCHMARK_DELAY'] = str(DELAY)
+
+    modes = [
+        ('threads + %dms timer' % (POLL_INTERVAL * 1000), Executor,
+         lambda executor: time.sleep(POLL_INTERVAL)),
+        ('event driven', EventDrivenExecutor,
+         lambda executor: executor.wait()),
+    ]
+    print('%d tests, %.0fms each' % (TESTS, DELAY * 1000))
+    print('%-22s %6s %8s %9s %9s %9s %9s' % (
+        'mode', 'tests', 'wakeups', 'poll cpu', 'elapsed', 'median', 'worst'))
+    for name, executor_class, wait in modes:
+        stats = run(executor_class, wait)
+        print('%-22s %6d %8d %8.1fms %8.2fs %7.1fms %7.1fms' % (
+            name, stats['tests'], stats['wakeups'], stats['busy'] * 1000,
+            stats['elapsed'], stats['median'] * 1000, stats['worst'] * 1000,
+        ))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
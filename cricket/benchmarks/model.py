@@ -0,0 +1,83 @@
+"""Time the project model's lookups on large synthetic projects.
+
+Builds projects of 10k to 100k test methods (packages of test modules,
+each with test cases of ten methods) and reports how long it takes to:
+
+- build a project from the list of test labels, and refresh it again;
+- confirm one test exists, as the executor does for every result;
+- select the labels to run for one method, one test case and one
+  package;
+- select the failed tests to run again (one has failed).
+
+Run from the directory containing setup.py:
+
+    python -m benchmarks.model [--sizes N,N,...] [--repeat N]
+"""
+from __future__ import print_function
+
+import argparse
+import sys
+import time
+
+from cricket.model import Project, TestMethod
+
+# The shape of each package: modules, test cases per module, methods per case.
+MODULES = 10
+CASES = 10
+METHODS = 10
+
+
+def labels(size):
+    "Test labels for a project of about `size` test methods."
+    packages = max(1, size // (MODULES * CASES * METHODS))
+    return [
+        'package%d.test_module%d.Case%d.test_method%d' % (package, module, case, method)
+        for package in range(packages)
+        for module in range(MODULES)
+        for case in range(CASES)
+        for method in range(METHODS)
+    ]
+
+
+def timed(function, repeat):
+    "The best time of `repeat` calls of a function, in milliseconds."
+    best = None
+    for i in range(repeat):
+        start = time.perf_counter()
+        function()
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return best * 1000
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', default='10000,30000,100000',
+                        help="Comma separated numbers of test methods")
+    parser.add_argument('--repeat', type=int, default=20)
+    options = parser.parse_args()
+
+    print('%8s %10s %10s %12s %10s %10s %10s %10s' % (
+        'methods', 'build', 'refresh', 'confirm', 'method', 'case', 'package', 'failed'))
+    for size in [int(size) for size in options.sizes.split(',')]:
+        test_labels = labels(size)
+        build = timed(lambda: Project().refresh(test_labels), 3)
+        project = Project()
+        project.refresh(test_labels)
+        refresh = timed(lambda: project.refresh(test_labels), 3)
+
+        middle = test_labels[len(test_labels) // 2]
+        package, module, case, method = middle.split('.')
+        confirm = timed(lambda: project.confirm_exists(middle), options.repeat * 50)
+        by_method = timed(lambda: project.find_tests(labels=[middle]), options.repeat)
+        by_case = timed(lambda: project.find_tests(labels=['.'.join([package, module, case])]), options.repeat)
+        by_package = timed(lambda: project.find_tests(labels=[package]), options.repeat)
+        project.confirm_exists(middle).set_result(TestMethod.STATUS_FAIL, '', '', 0.0)
+        failed = timed(lambda: project.find_tests(False, [TestMethod.STATUS_FAIL]), options.repeat)
+
+        print('%8d %8.1fms %8.1fms %10.4fms %8.2fms %8.2fms %8.2fms %8.2fms' % (
+            len(test_labels), build, refresh, confirm, by_method, by_case, by_package, failed))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,96 @@
+"""Measure the memory and attribute access time of test method nodes.
+
+Builds test cases full of test methods, each with a result, using the
+model's TestMethod and a copy of the layout it replaced (an instance
+__dict__, and each result in a dict of its own), and reports:
+
+- the memory taken per test method, including its result;
+- how long it takes to read a test method's status, and its duration.
+
+Run from the directory containing setup.py:
+
+    python -m benchmarks.nodes [--methods N]
+"""
+from __future__ import print_function
+
+import argparse
+import sys
+import timeit
+import tracemalloc
+
+from cricket.model import Project, TestCase, TestMethod, TestModule
+
+
+class DictTestMethod(object):
+    "The test method layout TestMethod used to have."
+    def __init__(self, name, testCase):
+        self.name = name
+        self.description = ''
+        self._active = True
+        self._result = None
+        self.parent = testCase
+        self.parent[name] = self
+        self.timestamp = None
+
+    @property
+    def status(self):
+        try:
+            return self._result['status']
+        except TypeError:
+            return None
+
+    @property
+    def duration(self):
+        try:
+            return self._result['duration']
+        except TypeError:
+            return None
+
+    def set_result(self, status, output, error, duration, output_file=None):
+        self._result = {
+            'status': status,
+            'output': output,
+            'error': error,
+            'duration': duration,
+            'output_file': output_file,
+        }
+
+
+def build(method_class, count):
+    "A test case of `count` test methods, each with a passing result."
+    project = Project()
+    testCase = TestCase('Case', TestModule('module', project))
+    for index in range(count):
+        method_class('test_%06d' % index, testCase).set_result(TestMethod.STATUS_PASS, '', '', 0.25)
+    return project, testCase
+
+
+def measure(method_class, count):
+    "Bytes per test method, and nanoseconds per status and duration read."
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    project, testCase = build(method_class, count)
+    used = tracemalloc.get_traced_memory()[0] - before
+    tracemalloc.stop()
+
+    testMethod = testCase['test_000000']
+    number = 1000000
+    status = min(timeit.repeat(lambda: testMethod.status, number=number, repeat=5)) / number
+    duration = min(timeit.repeat(lambda: testMethod.duration, number=number, repeat=5)) / number
+    return used / count, status * 1e9, duration * 1e9
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--methods', type=int, default=10000)
+    options = parser.parse_args()
+
+    print('%d test methods with results' % options.methods)
+    print('%-16s %12s %12s %12s' % ('layout', 'bytes/node', 'status', 'duration'))
+    for name, method_class in [('dict', DictTestMethod), ('TestMethod', TestMethod)]:
+        size, status, duration = measure(method_class, options.methods)
+        print('%-16s %12.0f %10.1fns %10.1fns' % (name, size, status, duration))
+
+
+if __name__ == '__main__':
+    sys.exit(main())
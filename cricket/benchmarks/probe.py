@@ -0,0 +1,148 @@
+"""Measure the processes started to answer simple questions about the system.
+
+Asks each question the way the GUI and tests used to (a command, and
+parsing its output) and through cricket.probe, counting the processes
+started and timing each answer. The legacy commands needn't be
+installed: a missing one still costs the process (and shell) started
+to find that out.
+
+Spawns per minute are for each question asked at --rate a minute (the
+GUI asked about the WiFi interface, driver and daemon once a second).
+Probes whose answers are remembered are timed across their time to
+live, so the count includes asking again when it has passed.
+
+Run from the directory containing setup.py:
+
+    python -m benchmarks.probe [--asks N] [--rate PER_MINUTE]
+"""
+from __future__ import print_function
+
+import argparse
+import re
+import subprocess
+import time
+
+from cricket import probe
+
+# The HDMI connector, whose EDID is read.
+CONNECTOR = 'card2-HDMI-A-1'
+
+
+def legacy_wifi_mac():
+    proc = subprocess.run('ifconfig wlan0', capture_output=True, text=True, shell=True, timeout=1)
+    match = re.search(r"HWaddr\s+([0-9A-Fa-f:]{17})", proc.stdout)
+    return match.group(1) if match else None
+
+
+def legacy_interface(interface='wlan0'):
+    result = subprocess.run(['ip', 'link', 'show', interface], stdout=subprocess.PIPE, stderr=subprocess.PIPE,
+                            text=True)
+    return result.returncode == 0 and interface in result.stdout
+
+
+def legacy_module_loaded(name='8852bs'):
+    result = subprocess.run(['lsmod'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    return name in result.stdout
+
+
+def legacy_process_running(name='wpa_supplicant'):
+    result = subprocess.run(['ps', 'aux'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
+    return name in result.stdout
+
+
+def legacy_pidof(name='wpa_supplicant'):
+    proc = subprocess.run(f'pidof {name}', capture_output=True, text=True, shell=True, timeout=10)
+    return proc.returncode == 0
+
+
+def legacy_edid(connector=CONNECTOR):
+    proc = subprocess.run(f'cat /sys/class/drm/{connector}/edid | edid-decode', shell=True, capture_output=True, text=True)
+    manufacturer = model = ''
+    for line in proc.stdout.splitlines():
+        if line.strip().startswith('Manufacturer'):
+            manufacturer = line.strip().split(':')[1].strip()
+        if line.strip().startswith('Model'):
+            model = line.strip().split(':')[1].strip()
+    return manufacturer, model
+
+
+QUESTIONS = [
+    ('wifi MAC', legacy_wifi_mac, lambda: probe.interface_mac('wlan0')),
+    ('interface', legacy_interface, lambda: probe.interface_flags('wlan0') is not None),
+    ('module loaded', legacy_module_loaded, lambda: probe.module_loaded('8852bs')),
+    ('process running', legacy_process_running, lambda: probe.process_running('wpa_supplicant')),
+    ('pidof', legacy_pidof, lambda: probe.pidof('wpa_supplicant')),
+    ('EDID', legacy_edid, lambda: probe.read_edid(CONNECTOR)),
+]
+
+
+class SpawnCounter(object):
+    "Counts the processes started through subprocess."
+    def __init__(self):
+        self.spawns = 0
+        self._execute_child = subprocess.Popen._execute_child
+
+    def __enter__(self):
+        counter = self
+
+        def execute_child(popen, *args, **kwargs):
+            counter.spawns += 1
+            return counter._execute_child(popen, *args, **kwargs)
+
+        subprocess.Popen._execute_child = execute_child
+        return self
+
+    def __exit__(self, *exc_info):
+        subprocess.Popen._execute_child = self._execute_child
+
+
+def timed(ask, asks, interval=None):
+    """Ask a question a number of times; return the time per answer and spawns per ask.
+
+    With an interval, the clock of the probe's cache is moved on by
+    that much between asks, as if they were asked at that rate.
+    """
+    clock = [time.monotonic()]
+    real_clock, probe._clock = probe._clock, (lambda: clock[0])
+    try:
+        with SpawnCounter() as counter:
+            start = time.perf_counter()
+            for i in range(asks):
+                try:
+                    ask()
+                except OSError:
+                    # A command that isn't installed (still started a process).
+                    pass
+                if interval:
+                    clock[0] += interval
+            elapsed = time.perf_counter() - start
+    finally:
+        probe._clock = real_clock
+    return elapsed / asks * 1e6, float(counter.spawns) / asks
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--asks', type=int, default=100)
+    parser.add_argument('--rate', type=float, default=60.0)
+    options = parser.parse_args()
+
+    interval = 60.0 / options.rate
+    print('%d asks of each question, %g a minute' % (options.asks, options.rate))
+    print('%-16s %14s %14s %12s %12s' % ('question', 'legacy', 'probe', 'legacy', 'probe'))
+    print('%-16s %14s %14s %12s %12s' % ('', 'per answer', 'per answer', 'spawns/min', 'spawns/min'))
+    totals = [0.0, 0.0]
+    for name, legacy, ask in QUESTIONS:
+        legacy_time, legacy_spawns = timed(legacy, options.asks)
+        for function in (probe.interface_mac, probe.interface_flags, probe.loaded_modules, probe.processes):
+            function.cache_clear()
+        probe_time, probe_spawns = timed(ask, options.asks, interval)
+        totals[0] += legacy_spawns * options.rate
+        totals[1] += probe_spawns * options.rate
+        print('%-16s %12.0fus %12.0fus %12.0f %12.0f' % (
+            name, legacy_time, probe_time, legacy_spawns * options.rate, probe_spawns * options.rate))
+    print('%-16s %14s %14s %12.0f %12.0f' % ('total', '', '', totals[0], totals[1]))
+
+
+if __name__ == '__main__':
+    main()
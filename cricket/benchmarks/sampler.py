@@ -0,0 +1,59 @@
+"""Measure how fast a sysfs file can be read again and again.
+
+Reads the temperature of a thermal zone (or, with --path, any file)
+the way the GUI used to (finding the zone and opening the file for
+every reading) and the way a sensor does (one descriptor, read with
+pread), and reports the time per reading.
+
+Run from the directory containing setup.py:
+
+    python -m benchmarks.sampler [--reads N] [--zone TYPE | --path FILE]
+"""
+from __future__ import print_function
+
+import argparse
+import sys
+import time
+
+from cricket.sampler import Sensor, find_thermal_zone
+
+
+def timed(read, reads):
+    start = time.perf_counter()
+    for i in range(reads):
+        read()
+    return (time.perf_counter() - start) / reads * 1e6
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--reads', type=int, default=10000)
+    parser.add_argument('--zone', default='cluster0_thermal')
+    parser.add_argument('--path')
+    options = parser.parse_args()
+
+    path = options.path or find_thermal_zone(options.zone)
+    if path is None:
+        print('No thermal zone of type %s; use --path' % options.zone)
+        sys.exit(1)
+
+    def reopen():
+        if not options.path:
+            find_thermal_zone(options.zone)
+        with open(path) as f:
+            return f.read().strip()
+
+    sensor = Sensor('benchmark', path)
+    try:
+        results = [('open per reading', timed(reopen, options.reads)),
+                   ('sensor (pread)', timed(sensor.read, options.reads))]
+    finally:
+        sensor.close()
+
+    print('%d reads of %s' % (options.reads, path))
+    for name, time_per_read in results:
+        print('%-20s %8.1fus' % (name, time_per_read))
+
+
+if __name__ == '__main__':
+    main()
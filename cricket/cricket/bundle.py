@@ -0,0 +1,204 @@
+"""Running cricket and the tests from a single precompiled archive.
+
+Importing from a source tree costs a stat call or a directory listing
+for every module looked up, and on a fresh or read-only root
+filesystem, compiling every module again. A bundle is a zipapp holding
+cricket, the test tree and the helper modules, each compiled ahead of
+time (as unchecked hash based .pyc, next to its source for tracebacks).
+Python imports from it using the archive's directory, which is read
+once.
+
+The archive also holds an index: the test modules, in the order
+unittest discovery would find them, and a digest of all the sources.
+When cricket runs from a bundle, tests are found and imported using
+the index, and the digest stands in for the test tree when deciding
+whether cached discovery is still valid.
+
+Build one from the checkout (the .pyc files are specific to the
+version of Python that builds them, so build with the stations'):
+
+    python -m cricket.bundle --output factorytest.pyz
+
+and run it with the archive as the only entry on PYTHONPATH:
+
+    PYTHONPATH=factorytest.pyz python -m cricket.unittest --jobs 4 --daemon
+"""
+from __future__ import absolute_import
+
+import argparse
+import hashlib
+import json
+import os
+import py_compile
+import shutil
+import sys
+import tempfile
+import unittest
+import zipapp
+import zipimport
+from importlib import import_module
+from unittest import loader as unittest_loader
+
+import cricket
+
+INDEX_NAME = 'cricket-index.json'
+
+# Where the stations run the bundle from; compiled code names its
+# source files as if they are there.
+DEFAULT_INSTALL_PATH = '/opt/factorytest/factorytest.pyz'
+
+# The bundle cricket was imported from, once it has been looked for.
+_current = []
+
+
+def current():
+    "The bundle cricket is running from, or None if it runs from source."
+    if not _current:
+        loader = getattr(cricket, '__loader__', None)
+        if isinstance(loader, zipimport.zipimporter):
+            _current.append(Bundle(loader.archive, loader))
+        else:
+            _current.append(None)
+    return _current[0]
+
+
+class Bundle(object):
+    "A bundle, and the index of its test modules."
+    def __init__(self, path, loader=None):
+        self.path = path
+        # The importer already has the archive's directory in memory.
+        self.loader = loader or zipimport.zipimporter(path)
+        index = json.loads(self.read(os.path.join(path, INDEX_NAME)).decode('utf-8'))
+        self.digest = index['digest']
+        # (module name, path of its source) for each test module, as
+        # find_test_modules lists them.
+        self.tests = [(name, os.path.join(path, arcname)) for name, arcname in index['tests']]
+        self.modules = set(name for name, path in self.tests)
+
+    def read(self, path):
+        "The content of a file in the bundle, given its full path."
+        return self.loader.get_data(path)
+
+    def load_tests(self, loader, names=None):
+        """Import test modules and load their tests, as unittest discovery does.
+
+        All of them are loaded unless `names` says which. A package that
+        defines load_tests chooses its own tests, so its modules aren't
+        imported separately.
+        """
+        suite = loader.suiteClass()
+        chosen = set()
+        for name, path in self.tests:
+            if (names is not None and name not in names) or name.rpartition('.')[0] in chosen:
+                continue
+            try:
+                module = import_module(name)
+            except unittest.SkipTest as e:
+                suite.addTest(unittest_loader._make_skipped_test(name, e, loader.suiteClass))
+                continue
+            except Exception:
+                error_case, error_message = unittest_loader._make_failed_import_test(name, loader.suiteClass)
+                loader.errors.append(error_message)
+                suite.addTest(error_case)
+                continue
+            if path.endswith('__init__.py') and hasattr(module, 'load_tests'):
+                chosen.add(name)
+            suite.addTest(loader.loadTestsFromModule(module))
+        return suite
+
+
+def _sources(root):
+    "Yield (archive name, path) for the files that go into a bundle of a checkout."
+    package = os.path.dirname(os.path.abspath(cricket.__file__))
+    for dirpath, dirnames, filenames in os.walk(package):
+        dirnames[:] = sorted(d for d in dirnames if d != '__pycache__')
+        for filename in sorted(filenames):
+            if filename.endswith(('.py', '.json')):
+                path = os.path.join(dirpath, filename)
+                yield os.path.join('cricket', os.path.relpath(path, package)), path
+
+    # The tests are discovered from inside the test tree, so its
+    # packages go at the top of the archive.
+    tests = os.path.join(root, 'tests')
+    for dirpath, dirnames, filenames in os.walk(tests):
+        dirnames[:] = sorted(d for d in dirnames if d != '__pycache__')
+        for filename in sorted(filenames):
+            if filename.endswith('.py') and dirpath != tests:
+                path = os.path.join(dirpath, filename)
+                yield os.path.relpath(path, tests), path
+
+    utils = os.path.join(root, 'utils')
+    for filename in sorted(os.listdir(utils)) if os.path.isdir(utils) else []:
+        if filename.endswith('.py'):
+            yield os.path.join('utils', filename), os.path.join(utils, filename)
+
+
+def build(root, output, install_path=DEFAULT_INSTALL_PATH):
+    """Bundle the checkout at `root` into the archive `output`.
+
+    Returns the number of modules compiled.
+    """
+    from cricket.unittest.discoverer import find_test_modules
+
+    root = os.path.abspath(root)
+    digest = hashlib.sha1()
+    staging = tempfile.mkdtemp(prefix='cricket-bundle-')
+    try:
+        compiled = 0
+        for arcname, path in _sources(root):
+            target = os.path.join(staging, arcname)
+            if not os.path.isdir(os.path.dirname(target)):
+                os.makedirs(os.path.dirname(target))
+            shutil.copyfile(path, target)
+            with open(path, 'rb') as f:
+                digest.update(arcname.encode('utf-8') + b'\0' + f.read() + b'\0')
+            if arcname.endswith('.py'):
+                py_compile.compile(
+                    path,
+                    cfile=target + 'c',
+                    dfile=os.path.join(install_path, arcname),
+                    doraise=True,
+                    invalidation_mode=py_compile.PycInvalidationMode.UNCHECKED_HASH,
+                )
+                compiled += 1
+
+        tests = os.path.join(root, 'tests')
+        index = {
+            'version': 1,
+            'python': '%d.%d' % sys.version_info[:2],
+            'digest': digest.hexdigest(),
+            'tests': [
+                [name, os.path.relpath(path, tests)]
+                for name, path in find_test_modules(tests)
+            ],
+        }
+        with open(os.path.join(staging, INDEX_NAME), 'w') as f:
+            json.dump(index, f, indent=2)
+
+        tmp = output + '.tmp'
+        zipapp.create_archive(staging, tmp, main='cricket.unittest.__main__:main')
+        os.replace(tmp, output)
+        return compiled
+    finally:
+        shutil.rmtree(staging)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Build a precompiled bundle of cricket and the tests.')
+    parser.add_argument(
+        '--root', default=os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(cricket.__file__)))),
+        help='The checkout to bundle, containing tests/ and utils/ (default: the one cricket is in)'
+    )
+    parser.add_argument('--output', default='factorytest.pyz', help='The archive to write')
+    parser.add_argument(
+        '--install-path', default=DEFAULT_INSTALL_PATH,
+        help='Where the archive will be run from, for tracebacks (default: %s)' % DEFAULT_INSTALL_PATH
+    )
+    options = parser.parse_args()
+
+    compiled = build(options.root, options.output, options.install_path)
+    print('Bundled %d modules into %s for Python %d.%d' % ((compiled, options.output) + sys.version_info[:2]))
+
+
+if __name__ == '__main__':
+    main()
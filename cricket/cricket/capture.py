@@ -0,0 +1,216 @@
+"""Bounded capture of test output.
+
+Output is kept in memory up to a byte limit. Beyond that, it is
+written to a file in the run's log directory, and results refer to the
+file rather than carrying all of the text.
+
+The limits and the log directory can be configured with environment
+variables:
+
+* CRICKET_OUTPUT_LIMIT: bytes of output kept for each test
+* CRICKET_ERROR_LIMIT: bytes of the runner's error output kept
+* CRICKET_LOG_DIR: where run log directories are created
+
+The executor picks a log directory for each run, and passes it to the
+runner in CRICKET_RUN_DIR, so both sides spill into the same place.
+"""
+from __future__ import absolute_import
+
+import collections
+import itertools
+import os
+import re
+import tempfile
+import time
+
+OUTPUT_LIMIT_ENV = 'CRICKET_OUTPUT_LIMIT'
+ERROR_LIMIT_ENV = 'CRICKET_ERROR_LIMIT'
+LOG_DIR_ENV = 'CRICKET_LOG_DIR'
+RUN_DIR_ENV = 'CRICKET_RUN_DIR'
+
+DEFAULT_OUTPUT_LIMIT = 1024 * 1024
+DEFAULT_ERROR_LIMIT = 256 * 1024
+
+_run_numbers = itertools.count(1)
+
+
+def _limit(name, default):
+    try:
+        return int(os.environ[name])
+    except (KeyError, ValueError):
+        return default
+
+
+def output_limit():
+    "The number of bytes of output kept for each test."
+    return _limit(OUTPUT_LIMIT_ENV, DEFAULT_OUTPUT_LIMIT)
+
+
+def error_limit():
+    "The number of bytes of the runner's error output kept."
+    return _limit(ERROR_LIMIT_ENV, DEFAULT_ERROR_LIMIT)
+
+
+def new_run_directory():
+    "Choose a log directory for a new run. It is only created if something is spilled."
+    base = os.environ.get(LOG_DIR_ENV) or os.path.join(tempfile.gettempdir(), 'cricket-logs')
+    name = '%s-%d-%d' % (time.strftime('%Y%m%d-%H%M%S'), os.getpid(), next(_run_numbers))
+    return os.path.join(base, name)
+
+
+def run_directory():
+    "The log directory of the current run."
+    path = os.environ.get(RUN_DIR_ENV)
+    if not path:
+        # Not started by an executor; pick a directory of our own.
+        path = os.environ[RUN_DIR_ENV] = new_run_directory()
+    return path
+
+
+class SpillFile(object):
+    """A file in a run's log directory, created on the first write.
+
+    If the file can't be written, the data is dropped, and `path` is None.
+    """
+    def __init__(self, name, directory=None):
+        self.directory = directory or run_directory()
+        self.path = os.path.join(self.directory, re.sub(r'[^\w.-]', '_', name) + '.log')
+        self._file = None
+
+    def write(self, data):
+        if self.path is None:
+            return
+        try:
+            if self._file is None:
+                if not os.path.isdir(self.directory):
+                    os.makedirs(self.directory)
+                self._file = open(self.path, 'ab')
+            self._file.write(data)
+        except (IOError, OSError):
+            self.path = None
+
+    def read(self):
+        "Everything written so far, or None if the file couldn't be written."
+        if self.path is None:
+            return None
+        if self._file is None:
+            return b''
+        try:
+            self._file.flush()
+            with open(self.path, 'rb') as f:
+                return f.read()
+        except (IOError, OSError):
+            return None
+
+    def close(self):
+        if self._file is not None:
+            self._file.close()
+            self._file = None
+
+    def remove(self):
+        "Close the file, and delete it."
+        self.close()
+        if self.path is not None and os.path.exists(self.path):
+            try:
+                os.unlink(self.path)
+            except OSError:
+                pass
+
+
+class RingBuffer(object):
+    """Keep the most recent `limit` bytes written to it.
+
+    Older data is spilled to a file named after the buffer. Once the
+    buffer is closed, the spill file (if there is one) holds everything
+    that was written.
+    """
+    def __init__(self, name, limit, directory=None):
+        self.name = name
+        self.limit = limit
+        self.directory = directory
+        self.spill = None
+        self._chunks = collections.deque()
+        self._size = 0
+
+    def write(self, data):
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8', 'replace')
+        if not data:
+            return
+        self._chunks.append(data)
+        self._size += len(data)
+
+        excess = self._size - self.limit
+        if excess > 0 and self.spill is None:
+            self.spill = SpillFile(self.name, self.directory)
+        while excess > 0:
+            chunk = self._chunks[0]
+            if len(chunk) <= excess:
+                self._chunks.popleft()
+            else:
+                self._chunks[0] = chunk[excess:]
+                chunk = chunk[:excess]
+            self.spill.write(chunk)
+            self._size -= len(chunk)
+            excess -= len(chunk)
+
+    def __len__(self):
+        return self._size
+
+    def contents(self):
+        "The bytes held in memory."
+        return b''.join(self._chunks)
+
+    def close(self):
+        "Finish the spill file. Returns its path, or None if nothing was spilled."
+        if self.spill is None:
+            return None
+        self.spill.write(self.contents())
+        self.spill.close()
+        return self.spill.path
+
+
+class CapturedOutput(RingBuffer):
+    "A stdout replacement that keeps the most recent output of a test."
+    encoding = 'utf-8'
+
+    def write(self, text):
+        super(CapturedOutput, self).write(text)
+        return len(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        pass
+
+    def isatty(self):
+        return False
+
+    def getvalue(self):
+        return self.contents().decode('utf-8', 'replace')
+
+
+class LineBuffer(RingBuffer):
+    "Keep the most recent lines of some error output."
+    def append(self, line):
+        self.write(line + '\n')
+
+    def extend(self, lines):
+        for line in lines:
+            self.append(line)
+
+    def text(self):
+        """Return the lines kept, closing the buffer.
+
+        If earlier lines had to be spilled, a note of where they went
+        takes their place.
+        """
+        path = self.close()
+        text = self.contents().decode('utf-8', 'replace')
+        if self.spill is None:
+            return text.rstrip('\n')
+        # Drop the line that was cut in half.
+        text = text.partition('\n')[2].rstrip('\n')
+        return '(Earlier output in %s)\n%s' % (path or 'a file that could not be written', text)
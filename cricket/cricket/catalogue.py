@@ -0,0 +1,132 @@
+"""The translated text cricket shows, in one catalogue.
+
+The GUI's own text comes from languages.json. The names of the tests
+come from the tests: the LANGUAGES of each test case, and the
+MODULE_NAME of each test package, which discovery records in its
+metadata. The catalogue merges them into one table keyed by (language,
+key), where the key of the GUI's own text is its key in
+languages.json, and the key of the name of a test package, test case
+or test method is its path.
+
+The catalogue is compiled whenever a discovery is cached, and written
+next to the cache as marshal data, so later starts load it in one step
+without parsing languages.json or importing any test. If languages.json
+has changed since, it is compiled again from the cached discovery.
+Everything showing text (the GUI, reports, runners) shares the one
+catalogue returned by `current()`, loaded the first time it is used.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import json
+import marshal
+import os
+import pkgutil
+
+LANGUAGES_FILE = 'languages.json'
+
+# The format of the compiled catalogue.
+VERSION = 1
+
+# The catalogue in use, once it has been loaded.
+_current = []
+
+
+def current():
+    "The catalogue shared by everything in this process, loaded on first use."
+    if not _current:
+        from cricket.discovery import DiscoveryCache
+
+        _current.append(load(DiscoveryCache()))
+    return _current[0]
+
+
+def _languages_source():
+    # Read through the package's loader, which also works in a bundle.
+    return pkgutil.get_data('cricket', LANGUAGES_FILE)
+
+
+def compile_texts(languages, metadata):
+    """Merge the GUI's text and the names of the tests into one table.
+
+    `languages` is the content of languages.json; `metadata` is the
+    test metadata recorded by discovery, by path.
+    """
+    texts = {}
+    for language, entries in languages.items():
+        for key, text in entries.items():
+            texts[language, key] = text
+    for path, data in metadata.items():
+        for language, text in (data.get('MODULE_NAME') or {}).items():
+            texts[language, path] = text
+        # A test case names itself, and its test methods, by name.
+        name = path.rpartition('.')[2]
+        for language, entries in (data.get('LANGUAGES') or {}).items():
+            for key, text in entries.items():
+                texts[language, path if key == name else '%s.%s' % (path, key)] = text
+    return texts
+
+
+def load(cache):
+    """The catalogue compiled alongside a DiscoveryCache.
+
+    If there isn't one, or languages.json has changed since it was
+    compiled, it is compiled again from the cached discovery (if there
+    is one) and saved.
+    """
+    source = _languages_source()
+    digest = hashlib.sha1(source).hexdigest()
+    try:
+        with open(cache.catalogue_path, 'rb') as f:
+            compiled = marshal.load(f)
+        if compiled['version'] == VERSION and compiled['languages'] == digest:
+            return Catalogue(compiled['texts'])
+    except (IOError, OSError, EOFError, ValueError, TypeError, KeyError):
+        pass
+
+    cached = cache.load()
+    catalogue = Catalogue(compile_texts(json.loads(source.decode('utf-8')), cached['metadata'] if cached else {}))
+    catalogue.save(cache.catalogue_path)
+    return catalogue
+
+
+class Catalogue(object):
+    "Translated text, by (language, key)."
+    def __init__(self, texts):
+        self.texts = texts
+
+    @classmethod
+    def from_metadata(cls, metadata):
+        "Compile a catalogue of the GUI's text and the names in some test metadata."
+        return cls(compile_texts(json.loads(_languages_source().decode('utf-8')), metadata))
+
+    @property
+    def languages(self):
+        "The languages there is text for."
+        return sorted(set(language for language, key in self.texts))
+
+    def text(self, language, key):
+        "The text for a key in a language. Raises KeyError if there isn't any."
+        return self.texts[language, key]
+
+    def get(self, language, key, default=None):
+        "The text for a key in a language, or `default` if there isn't any."
+        return self.texts.get((language, key), default)
+
+    def update(self, metadata):
+        "Add the names in some more test metadata, as discovery finds it."
+        self.texts.update(compile_texts({}, metadata))
+
+    def save(self, path):
+        "Write the compiled catalogue in one step."
+        tmp = path + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                marshal.dump({
+                    'version': VERSION,
+                    'languages': hashlib.sha1(_languages_source()).hexdigest(),
+                    'texts': self.texts,
+                }, f)
+            os.replace(tmp, path)
+        except (IOError, OSError):
+            pass
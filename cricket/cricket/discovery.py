@@ -0,0 +1,262 @@
+"""Finding the tests in a project, and remembering what was found.
+
+Discovery may import test modules, which is slow, so its result is
+cached on disk. The cache is keyed by a fingerprint of the test tree
+(the path, size and modification time of every Python file under it)
+and of the interpreter, so any change to either is noticed.
+
+As well as the test labels, the cache keeps metadata about each test
+case, such as its LANGUAGES, and each test package, such as its
+MODULE_NAME, so the GUI doesn't need to import the tests to label
+them; the catalogue of translated text (see cricket.catalogue) is
+compiled from it. Backends that can describe test cases write the
+metadata to the file named in CRICKET_METADATA_FILE, as JSON, one
+test case per line (with its "path"), before printing its tests.
+
+The cache lives in CRICKET_CACHE_DIR, or ~/.cache/cricket by default.
+
+When cricket runs from a bundle, the tests are those in the bundle, so
+its digest is used in place of the files under the test tree.
+"""
+from __future__ import absolute_import
+
+import hashlib
+import json
+import os
+import selectors
+import subprocess
+import sys
+import tempfile
+
+import cricket
+from cricket import bundle
+from cricket.catalogue import Catalogue
+from cricket.events import EventSource
+from cricket.model import ModelLoadError
+from cricket.profiler import profiler
+
+CACHE_DIR_ENV = 'CRICKET_CACHE_DIR'
+METADATA_FILE_ENV = 'CRICKET_METADATA_FILE'
+
+# The prefix unittest gives to modules that could not be imported.
+FAILED_TEST_PREFIX = 'unittest.loader._FailedTest.'
+
+
+def fingerprint(root='.'):
+    "A digest of the Python files under a test tree, and of the interpreter."
+    digest = hashlib.sha1()
+    digest.update(('%s\0%s\0%s\0' % (sys.executable, sys.version, cricket.__version__)).encode('utf-8'))
+    current = bundle.current()
+    if current is not None:
+        digest.update(('bundle\0%s\0' % current.digest).encode('utf-8'))
+        return digest.hexdigest()
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = sorted(d for d in dirnames if not d.startswith('.') and d != '__pycache__')
+        for filename in sorted(filenames):
+            if not filename.endswith('.py'):
+                continue
+            path = os.path.join(dirpath, filename)
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            digest.update(('%s\0%d\0%d\0' % (os.path.relpath(path, root), stat.st_size, stat.st_mtime_ns)).encode('utf-8'))
+    return digest.hexdigest()
+
+
+class DiscoveryCache(object):
+    "The result of the last discovery of a test tree."
+    def __init__(self, root='.', path=None):
+        self.root = os.path.abspath(root)
+        if path is None:
+            directory = os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.expanduser('~'), '.cache', 'cricket')
+            name = hashlib.sha1(self.root.encode('utf-8')).hexdigest()[:12]
+            path = os.path.join(directory, 'discovery-%s.json' % name)
+        self.path = path
+        # The catalogue compiled with the cached discovery.
+        self.catalogue_path = os.path.splitext(path)[0] + '.catalogue'
+
+    def fingerprint(self):
+        return fingerprint(self.root)
+
+    def load(self):
+        """Return the cached discovery, whatever its fingerprint, or None.
+
+        The result is a dict of the fingerprint, the test labels, the
+        load errors, and the test case metadata.
+        """
+        try:
+            with open(self.path) as f:
+                entry = json.load(f)
+            return {
+                'fingerprint': entry['fingerprint'],
+                'tests': entry['tests'],
+                'errors': entry['errors'],
+                'metadata': entry['metadata'],
+            }
+        except (IOError, OSError, ValueError, KeyError, TypeError):
+            return None
+
+    def save(self, fingerprint, tests, errors, metadata):
+        "Replace the cached discovery, and the catalogue compiled with it, in one step each."
+        tmp = self.path + '.tmp'
+        try:
+            if not os.path.isdir(os.path.dirname(self.path)):
+                os.makedirs(os.path.dirname(self.path))
+            with open(tmp, 'w') as f:
+                json.dump({
+                    'fingerprint': fingerprint,
+                    'tests': tests,
+                    'errors': errors,
+                    'metadata': metadata,
+                }, f)
+            os.replace(tmp, self.path)
+        except (IOError, OSError):
+            return
+        Catalogue.from_metadata(metadata).save(self.catalogue_path)
+
+
+class Discovery(EventSource):
+    """A run of the project's discoverer.
+
+    Polled like an EventDrivenExecutor; `wait()` blocks until
+    discovery is done.
+
+    Tests are announced as they are found, with a `tests_found` event.
+    The discoverer finds the tests of one top level module after
+    another, so when the first test of the next one arrives, a
+    `module_found` event says that the previous module is complete.
+    `discovery_end` follows the last of them.
+
+    When discovery succeeds, the result is saved to the cache (if one
+    is given) under the fingerprint of the tree it was run on.
+    """
+    def __init__(self, project, cache=None, fingerprint=None):
+        self.project = project
+        self.cache = cache
+        self.fingerprint = fingerprint
+
+        # The test labels, load errors and test case metadata found.
+        self.tests = []
+        self.errors = []
+        self.metadata = {}
+
+        # The top level module whose tests are arriving.
+        self.module = None
+
+        fd, self._metadata_file = tempfile.mkstemp(prefix='cricket-', suffix='.json')
+        os.close(fd)
+        self._metadata = open(self._metadata_file, 'rb')
+        self._metadata_partial = b''
+        env = dict(os.environ)
+        env[METADATA_FILE_ENV] = self._metadata_file
+
+        profiler.begin('discovery')
+        self.proc = subprocess.Popen(
+            project.discover_commandline(),
+            stdin=None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            shell=False,
+            env=env,
+        )
+        self._partial = {}
+        self._open = {}
+        for pipe in (self.proc.stdout, self.proc.stderr):
+            os.set_blocking(pipe.fileno(), False)
+            self._open[pipe.fileno()] = pipe
+            self._partial[pipe] = b''
+
+    @property
+    def failed(self):
+        "The modules that could not be imported."
+        return [test[len(FAILED_TEST_PREFIX):] for test in self.tests if test.startswith(FAILED_TEST_PREFIX)]
+
+    def filenos(self):
+        "The file descriptors that still need to be watched."
+        return list(self._open)
+
+    def poll(self):
+        "Read whatever the discoverer has written. Returns True until discovery is done."
+        for fd, pipe in list(self._open.items()):
+            chunks = [self._partial[pipe]]
+            while True:
+                try:
+                    data = os.read(fd, 65536)
+                except BlockingIOError:
+                    break
+                if not data:
+                    del self._open[fd]
+                    pipe.close()
+                    chunks.append(b'\n')
+                    break
+                chunks.append(data)
+            lines = b''.join(chunks).split(b'\n')
+            self._partial[pipe] = lines.pop()
+            lines = [line.strip().decode('utf-8') for line in lines if line.strip()]
+            if pipe is self.proc.stdout:
+                self._found(lines)
+            else:
+                self.errors.extend(lines)
+        if self._open:
+            return True
+
+        self.proc.wait()
+        profiler.end('discovery')
+        self._read_metadata()
+        self._metadata.close()
+        os.unlink(self._metadata_file)
+        if self.module is not None:
+            self.emit('module_found', module=self.module)
+
+        if self.cache is not None and self.tests and not self.errors and not self.failed:
+            self.cache.save(self.fingerprint, self.tests, self.errors, self.metadata)
+        self.emit('discovery_end')
+        return False
+
+    def _found(self, tests):
+        "Record some tests the discoverer has printed, and announce them."
+        if not tests:
+            return
+        # The discoverer describes test cases before printing their tests.
+        self._read_metadata()
+        self.tests.extend(tests)
+        start = 0
+        for index, test in enumerate(tests):
+            if test.startswith(FAILED_TEST_PREFIX):
+                test = test[len(FAILED_TEST_PREFIX):]
+            module = test.split('.', 1)[0]
+            if module != self.module:
+                if start < index:
+                    self.emit('tests_found', tests=tests[start:index])
+                    start = index
+                if self.module is not None:
+                    self.emit('module_found', module=self.module)
+                self.module = module
+        self.emit('tests_found', tests=tests[start:])
+
+    def _read_metadata(self):
+        lines = (self._metadata_partial + self._metadata.read()).split(b'\n')
+        self._metadata_partial = lines.pop()
+        for line in lines:
+            try:
+                data = json.loads(line.decode('utf-8'))
+                self.metadata[data.pop('path')] = data
+            except (ValueError, KeyError):
+                pass
+
+    def wait(self):
+        """Block until discovery is done.
+
+        Raises ModelLoadError if nothing could be discovered.
+        """
+        with selectors.DefaultSelector() as selector:
+            for fd in self._open:
+                selector.register(fd, selectors.EVENT_READ)
+            while self.poll():
+                for fd in list(selector.get_map()):
+                    if fd not in self._open:
+                        selector.unregister(fd)
+                selector.select()
+        if self.errors and not self.tests:
+            raise ModelLoadError('\n'.join(self.errors))
@@ -14,6 +14,7 @@ class DjangoProject(Project):
     The Project is a wrapper around the command-line calls to interface
     to test collection and test execution
     '''
+    supports_framed_protocol = True
 
     def __init__(self, options=None):
         self.settings = None
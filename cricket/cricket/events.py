@@ -1,3 +1,56 @@
+"""Events passed from the model, discovery and executors to the views.
+
+A handler is subscribed to one topic, either on a class with `bind`
+(for every instance of that exact class, or with ``subclasses=True``,
+of its subclasses too) or on a single instance with `subscribe`. It is
+called as `handler(source, **data)`.
+
+Handlers that are bound methods are held by weak reference, so a
+subscription ends when the object the method belongs to goes away.
+Other callables are held for as long as they are subscribed.
+
+A subscription can be made with a `Coalescer`. Events for it are then
+collected, and delivered once per turn of the event loop as a single
+call of `handler(sources)`: every source that emitted the topic since
+the last batch, each once, in the order they first emitted it. This
+suits the model's 'status_update' and 'active' events, which come in
+bursts and whose handlers read what they need from the source.
+"""
+import weakref
+
+
+def _subscription(handler, coalescer, subscriptions):
+    """A subscription of a handler, to add to a list of subscriptions.
+
+    Subscriptions are (owner, function, coalescer) tuples. For a bound
+    method, owner is a weak reference to its object, and the handler
+    is function(owner(), ...); it is taken out of the list when the
+    object goes away. Otherwise owner is None, and the handler is
+    function itself.
+    """
+    if getattr(handler, '__self__', None) is not None and hasattr(handler, '__func__'):
+        def forget(ref):
+            # The object owning the handler has gone.
+            subscriptions[:] = [s for s in subscriptions if s[0] is not ref]
+            _routes.clear()
+
+        return (weakref.ref(handler.__self__, forget), handler.__func__, coalescer)
+    return (None, handler, coalescer)
+
+
+def _unsubscribe(subscriptions, handler):
+    owner = getattr(handler, '__self__', None)
+    function = getattr(handler, '__func__', handler)
+    subscriptions[:] = [
+        s for s in subscriptions
+        if not (s[1] == function and (s[0] is None or s[0]() is owner))
+    ]
+
+
+# The class subscriptions that apply to an event from an instance of a
+# class, in the order they are called: class -> topic -> tuple. Built
+# on first use, and cleared whenever a class subscription changes.
+_routes = {}
 
 
 class EventSource(object):
@@ -5,17 +58,112 @@ class EventSource(object):
 
     An event source can receive handlers for events, and
     can emit events.
+
+    Subclasses with __slots__ need a '_subscriptions' slot, set to
+    None, if their instances are to take subscriptions of their own.
     """
+    # Event sources add no slots of their own, so subclasses can use
+    # __slots__, and can also derive from dict.
+    __slots__ = ()
+
+    # The subscriptions made on each class: class -> topic -> list; and
+    # those that apply to its subclasses too.
     _events = {}
+    _inherited_events = {}
+
+    # The subscriptions made on an instance: topic -> list.
+    _subscriptions = None
 
     @classmethod
-    def bind(cls, event, handler):
-        cls._events.setdefault(cls, {}).setdefault(event, []).append(handler)
+    def bind(cls, event, handler, coalescer=None, subclasses=False):
+        """Subscribe a handler to an event from every instance of this class.
+
+        With `subclasses`, instances of its subclasses are included.
+        """
+        events = cls._inherited_events if subclasses else cls._events
+        subscriptions = events.setdefault(cls, {}).setdefault(event, [])
+        subscriptions.append(_subscription(handler, coalescer, subscriptions))
+        _routes.clear()
+
+    @classmethod
+    def unbind(cls, event, handler, subclasses=False):
+        "End a subscription made with bind."
+        events = cls._inherited_events if subclasses else cls._events
+        _unsubscribe(events.get(cls, {}).get(event, []), handler)
+        _routes.clear()
+
+    def subscribe(self, event, handler, coalescer=None):
+        "Subscribe a handler to an event from this instance only."
+        subscriptions = self._subscriptions
+        if subscriptions is None:
+            subscriptions = self._subscriptions = {}
+        subscriptions = subscriptions.setdefault(event, [])
+        subscriptions.append(_subscription(handler, coalescer, subscriptions))
+
+    def unsubscribe(self, event, handler):
+        "End a subscription made with subscribe."
+        if self._subscriptions is not None:
+            _unsubscribe(self._subscriptions.get(event, []), handler)
+
+    @classmethod
+    def _route(cls, event):
+        "The class subscriptions an event from an instance of this class goes to."
+        route = []
+        for klass in reversed(cls.__mro__):
+            route.extend(cls._inherited_events.get(klass, {}).get(event, ()))
+        route.extend(cls._events.get(cls, {}).get(event, ()))
+        route = tuple(route)
+        _routes.setdefault(cls, {})[event] = route
+        return route
 
     def emit(self, event, **data):
         try:
-            for handler in self._events[self.__class__][event]:
-                handler(self, **data)
+            route = _routes[self.__class__][event]
         except KeyError:
-            # No handler registered for event.
-            pass
+            route = self._route(event)
+        if self._subscriptions is not None and event in self._subscriptions:
+            route = route + tuple(self._subscriptions[event])
+        for subscription in route:
+            owner, function, coalescer = subscription
+            if coalescer is not None:
+                coalescer.add(subscription, self)
+            elif owner is None:
+                function(self, **data)
+            else:
+                owner = owner()
+                if owner is not None:
+                    function(owner, self, **data)
+
+
+class Coalescer(object):
+    """Collects events, and delivers them in batches.
+
+    `schedule` is called with a function to call on the next turn of
+    the event loop, e.g. ``lambda flush: QTimer.singleShot(0, flush)``.
+    It is called once for each batch, when its first event arrives.
+    """
+    def __init__(self, schedule):
+        self.schedule = schedule
+        # id(subscription) -> (subscription, {id(source): source}), in
+        # order of arrival.
+        self._pending = {}
+
+    def add(self, subscription, source):
+        "Add an event from `source` to the next batch for a subscription."
+        if not self._pending:
+            self.schedule(self.flush)
+        try:
+            self._pending[id(subscription)][1][id(source)] = source
+        except KeyError:
+            self._pending[id(subscription)] = (subscription, {id(source): source})
+
+    def flush(self):
+        "Deliver the events collected so far."
+        pending, self._pending = self._pending, {}
+        for (owner, function, coalescer), sources in pending.values():
+            if owner is None:
+                function(list(sources.values()))
+            else:
+                owner = owner()
+                if owner is not None:
+                    function(owner, list(sources.values()))
@@ -1,6 +1,8 @@
-import json
+import os
+import selectors
 import subprocess
 import sys
+import time
 from threading import Thread
 
 try:
@@ -8,9 +10,40 @@ try:
 except ImportError:
     from queue import Queue, Empty  # python 3.x
 
+from cricket.capture import RUN_DIR_ENV, LineBuffer, error_limit, new_run_directory
 from cricket.events import EventSource
+from cricket.history import format_duration, load_history
 from cricket.model import TestMethod
-from cricket.pipes import PipedTestResult, PipedTestRunner
+from cricket.pipes import FRAMED_PROTOCOL, PROTOCOL_ENV, PipedStreamDecoder
+
+
+# Map the status codes used by the pipe protocol to result states.
+STATUS_CODES = {
+    'OK': TestMethod.STATUS_PASS,
+    's': TestMethod.STATUS_SKIP,
+    'F': TestMethod.STATUS_FAIL,
+    'x': TestMethod.STATUS_EXPECTED_FAIL,
+    'u': TestMethod.STATUS_UNEXPECTED_SUCCESS,
+    'E': TestMethod.STATUS_ERROR,
+    'T': TestMethod.STATUS_TIMEOUT,
+}
+
+# How often to check whether a runner that has closed its pipes has exited.
+EXIT_POLL_INTERVAL = 0.05
+
+
+def enqueue_events(out, queue):
+    """A utility method for consuming the piped results of a test runner.
+
+    Reads content from `out` as it becomes available, decodes it, and
+    puts the resulting events onto queue for consumption in a separate
+    thread.
+    """
+    decoder = PipedStreamDecoder()
+    for data in iter(lambda: out.read1(65536), b''):
+        for event in decoder.feed(data):
+            queue.put(event)
+    out.close()
 
 
 def enqueue_output(out, queue):
@@ -20,7 +53,7 @@ def enqueue_output(out, queue):
     queue for consumption in a separate thread.
     """
     for line in iter(out.readline, b''):
-        queue.put(line.strip().decode('utf-8'))
+        queue.put(line.strip().decode('utf-8', 'replace'))
     out.close()
 
 
@@ -30,41 +63,39 @@ class Executor(EventSource):
         self.project = project
         self.module = module
 
-        self.proc = subprocess.Popen(
-            self.project.execute_commandline(labels),
-            stdin=None,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=False,
-            close_fds='posix' in sys.builtin_module_names
-        )
+        # Where output too large to keep in memory is written.
+        self.run_dir = new_run_directory()
 
-        # Piped stdout/stderr reads are blocking; therefore, we need to
-        # do all our readline calls in a background thread, and use a
-        # queue object to store lines that have been read.
-        self.stdout = Queue()
-        t = Thread(target=enqueue_output, args=(self.proc.stdout, self.stdout))
-        t.daemon = True
-        t.start()
+        # How long tests have taken in earlier runs.
+        self.history = load_history()
 
-        self.stderr = Queue()
-        t = Thread(target=enqueue_output, args=(self.proc.stderr, self.stderr))
-        t.daemon = True
-        t.start()
+        # The labels of the tests that haven't finished yet.
+        self.queued = set(labels)
 
-        # The TestMethod object currently under execution.
+        self.proc = self._launch(labels)
+        self._start_readers()
+
+        # The TestMethod object most recently started.
         self.current_test = None
 
-        # An accumulator of ouput from the tests. If buffer is None,
-        # then the test suite isn't currently running - it's in suite
-        # setup/teardown.
-        self.buffer = None
+        # The tests currently under execution, keyed by the id the
+        # runner gave them: (TestMethod, header, output chunks).
+        self.running_tests = {}
+
+        # The time the runner last reported it was alive.
+        self.last_heartbeat = None
 
-        # An accumulator for error output from the tests.
-        self.error_buffer = []
+        # An accumulator for the most recent error output from the tests.
+        self.error_buffer = LineBuffer('%s-stderr' % module, error_limit(), self.run_dir)
 
-        # The timestamp when current_test started
+        # The timestamp when the first test started, and when the
+        # most recent test finished.
         self.start_time = None
+        self.end_time = None
+
+        # The time spent running tests, summed over every test; more
+        # than the elapsed time when tests run in parallel.
+        self.busy_time = 0.0
 
         # The total count of tests under execution
         self.total_count = count
@@ -75,6 +106,33 @@ class Executor(EventSource):
         # The count of specific test results.
         self.result_count = {}
 
+    @classmethod
+    def attach_running(cls, project):
+        """Return executors for any runs of the project that are still in
+        progress from an earlier session.
+
+        Runner subprocesses don't outlive the GUI, so there are never any.
+        """
+        return []
+
+    def _launch(self, labels):
+        "Start the runner subprocess for the given test labels."
+        env = dict(os.environ)
+        env[RUN_DIR_ENV] = self.run_dir
+        # Ask for the framed protocol if the backend can produce it.
+        if self.project.supports_framed_protocol:
+            env[PROTOCOL_ENV] = FRAMED_PROTOCOL
+
+        return subprocess.Popen(
+            self.project.execute_commandline(labels),
+            stdin=None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            shell=False,
+            close_fds='posix' in sys.builtin_module_names,
+            env=env,
+        )
+
     @property
     def is_running(self):
         "Return True if this runner currently running."
@@ -88,22 +146,35 @@ class Executor(EventSource):
         "Stop the executor."
         self.proc.terminate()
 
-    def poll(self):
-        "Poll the runner looking for new test output"
-        stopped = False
-        finished = False
+    def _start_readers(self):
+        "Start consuming the output of the subprocess."
+        # Piped stdout/stderr reads are blocking; therefore, we need to
+        # do all our read calls in a background thread, and use a
+        # queue object to store what has been read.
+        self.stdout = Queue()
+        t = Thread(target=enqueue_events, args=(self.proc.stdout, self.stdout))
+        t.daemon = True
+        t.start()
 
-        # Read from stdout, building a buffer.
-        lines = []
+        self.stderr = Queue()
+        t = Thread(target=enqueue_output, args=(self.proc.stderr, self.stderr))
+        t.daemon = True
+        t.start()
+
+    def _read_events(self):
+        "Return the decoded events that have been read from stdout."
+        events = []
         try:
             while True:
-                lines.append(self.stdout.get(block=False))
+                events.append(self.stdout.get(block=False))
         except Empty:
             # queue.get() raises an exception when the queue is empty.
             # This means there is no more output to consume at this time.
             pass
+        return events
 
-        # Read from stderr, building a buffer.
+    def _read_errors(self):
+        "Add the lines that have been read from stderr to the error buffer."
         try:
             while True:
                 self.error_buffer.append(self.stderr.get(block=False))
@@ -112,6 +183,17 @@ class Executor(EventSource):
             # This means there is no more output to consume at this time.
             pass
 
+    def poll(self):
+        "Poll the runner looking for new test output"
+        stopped = False
+        finished = False
+
+        # Read decoded events from stdout, building a buffer.
+        events = self._read_events()
+
+        # Read from stderr, building a buffer.
+        self._read_errors()
+
         # Check to see if the subprocess is still running.
         # If it isn't, raise an error.
         if self.proc is None:
@@ -119,128 +201,43 @@ class Executor(EventSource):
         elif self.proc.poll() is not None:
             stopped = True
 
-        # Process all the full lines that are available
-        for line in lines:
-            # Look for a separator.
-            if line in (PipedTestResult.RESULT_SEPARATOR, PipedTestRunner.START_TEST_RESULTS, PipedTestRunner.END_TEST_RESULTS):
-                if self.buffer is None:
-                    # Preamble is finished. Set up the line buffer.
-                    self.buffer = []
+        # Process all the events that are available
+        for kind, token, data in events:
+            if kind == 'output':
+                # Content outside the test results - just display the
+                # output as a status update line.
+                self.emit('test_status_update', module=self.module, update=data)
+            elif kind == 'start':
+                self._start_test(token, data)
+            elif kind == 'chunk':
+                if token in self.running_tests:
+                    test, pre, chunks = self.running_tests[token]
+                    chunks.append(data)
+                    self.emit('test_output', module=self.module, test_path=test.path,
+                              output=data.decode('utf-8', 'replace'))
                 else:
-                    # Start of new test result; record the last result
-                    # Then, work out what content goes where.
-                    pre = json.loads(self.buffer[0])
-                    post = json.loads(self.buffer[1])
-
-                    if post['status'] == 'OK':
-                        status = TestMethod.STATUS_PASS
-                        error = None
-                    elif post['status'] == 's':
-                        status = TestMethod.STATUS_SKIP
-                        error = 'Skipped: ' + post.get('error')
-                    elif post['status'] == 'F':
-                        status = TestMethod.STATUS_FAIL
-                        error = post.get('error')
-                    elif post['status'] == 'x':
-                        status = TestMethod.STATUS_EXPECTED_FAIL
-                        error = post.get('error')
-                    elif post['status'] == 'u':
-                        status = TestMethod.STATUS_UNEXPECTED_SUCCESS
-                        error = None
-                    elif post['status'] == 'E':
-                        status = TestMethod.STATUS_ERROR
-                        error = post.get('error')
-
-                    output = post.get('output')
-                    if output:
-                        print(f'{self.current_test.path}:')
-                        print(output)
-
-                    if error:
-                        print(error)
-
-                    # Increase the count of executed tests
-                    self.completed_count = self.completed_count + 1
-
-                    # Get the start and end times for the test
-                    start_time = float(pre['start_time'])
-                    end_time = float(post['end_time'])
-
-                    self.current_test.description = post['description']
-
-                    self.current_test.set_result(
-                        status=status,
-                        output=output,
-                        error=error,
-                        duration=end_time - start_time,
-                    )
-
-                    # Work out how long the suite has left to run (approximately)
-                    if self.start_time is None:
-                        self.start_time = start_time
-                    total_duration = end_time - self.start_time
-                    time_per_test = total_duration / self.completed_count
-                    remaining_time = (self.total_count - self.completed_count) * time_per_test
-                    if remaining_time > 4800:
-                        remaining = '%s hours' % int(remaining_time / 2400)
-                    elif remaining_time > 2400:
-                        remaining = '%s hour' % int(remaining_time / 2400)
-                    elif remaining_time > 120:
-                        remaining = '%s mins' % int(remaining_time / 60)
-                    elif remaining_time > 60:
-                        remaining = '%s min' % int(remaining_time / 60)
-                    else:
-                        remaining = '%ss' % int(remaining_time)
-
-                    # Update test result counts
-                    self.result_count.setdefault(status, 0)
-                    self.result_count[status] = self.result_count[status] + 1
-
-                    # Notify the display to update.
-                    self.emit('test_end', module=self.module, test_path=self.current_test.path, result=status, remaining_time=remaining)
-
-                    # Clear the decks for the next test.
-                    self.current_test = None
-                    self.buffer = []
-
-                    if line == PipedTestRunner.END_TEST_RESULTS:
-                        # End of test execution.
-                        # Mark the runner as finished, and move back
-                        # to a pre-test state in the results.
-                        finished = True
-                        self.buffer = None
+                    self.emit('test_status_update', module=self.module,
+                              update=data.decode('utf-8', 'replace').strip())
+            elif kind == 'metric':
+                if token in self.running_tests:
+                    self.emit('test_metric', module=self.module,
+                              test_path=self.running_tests[token][0].path,
+                              name=data['name'], value=data['value'])
+            elif kind == 'heartbeat':
+                self.last_heartbeat = time.time()
+            elif kind == 'end':
+                self._end_test(token, data)
+            elif kind == 'finish':
+                # End of test execution.
+                finished = True
+
+        if finished or stopped:
+            self._record_history()
 
-            else:
-                # Not a separator line, so it's actual content.
-                if self.buffer is None:
-                    # Suite isn't running yet - just display the output
-                    # as a status update line.
-                    self.emit('test_status_update', module=self.module, update=line)
-                else:
-                    # Suite is running - have we got an active test?
-                    # Doctest (and some other tools) output invisible escape sequences.
-                    # Strip these if they exist.
-                    if line.startswith('\x1b'):
-                        line = line[line.find('{'):]
-
-                    # Store the cleaned buffer
-                    self.buffer.append(line)
-
-                    # If we don't have an currently active test, this line will
-                    # contain the path for the test.
-                    if self.current_test is None:
-                        try:
-                            # No active test; first line tells us which test is running.
-                            pre = json.loads(line)
-                        except ValueError:
-                            self.emit('suit_end', module=self.module)
-                            return True
-                        self.current_test = self.project.confirm_exists(pre['path'])
-                        self.emit('test_start', module=self.module, test_path=pre['path'])
         # If we're not finished, requeue the event.
         if finished:
             if self.error_buffer:
-                self.emit('suite_end', module=self.module, error='\n'.join(self.error_buffer))
+                self.emit('suite_end', module=self.module, error=self.error_buffer.text())
             else:
                 self.emit('suite_end', module=self.module)
             return False
@@ -248,7 +245,7 @@ class Executor(EventSource):
         elif stopped:
             # Suite has stopped producing output.
             if self.error_buffer:
-                self.emit('suite_error', module=self.module, error='\n'.join(self.error_buffer))
+                self.emit('suite_error', module=self.module, error=self.error_buffer.text())
             else:
                 self.emit('suite_error', module=self.module, error='Test output ended unexpectedly')
 
@@ -258,3 +255,209 @@ class Executor(EventSource):
         else:
             # Still running - requeue event.
             return True
+
+    def _start_test(self, token, pre):
+        "A test has started running."
+        test = self.project.confirm_exists(pre['path'])
+        self.current_test = test
+        self.running_tests[token] = (test, pre, [])
+        if self.start_time is None:
+            self.start_time = float(pre['start_time'])
+        self.emit('test_start', module=self.module, test_path=pre['path'])
+
+    def _end_test(self, token, post):
+        "A test has finished running; record the result."
+        try:
+            test, pre, chunks = self.running_tests.pop(token)
+        except KeyError:
+            # The end of a test we never saw start.
+            return
+
+        status = STATUS_CODES.get(post['status'], TestMethod.STATUS_ERROR)
+        if status == TestMethod.STATUS_SKIP:
+            error = 'Skipped: ' + post.get('error')
+        elif status in (TestMethod.STATUS_PASS, TestMethod.STATUS_UNEXPECTED_SUCCESS):
+            error = None
+        else:
+            error = post.get('error')
+
+        if chunks:
+            output = b''.join(chunks).decode('utf-8', 'replace')
+        else:
+            output = post.get('output')
+        output_file = post.get('output_file')
+        if output:
+            print(f'{test.path}:')
+            print(output)
+        if output_file:
+            print(f'Full output of {test.path} in {output_file}')
+
+        if error:
+            print(error)
+
+        # Increase the count of executed tests
+        self.completed_count = self.completed_count + 1
+
+        # Get the start and end times for the test
+        start_time = float(pre['start_time'])
+        end_time = float(post['end_time'])
+        duration = end_time - start_time
+
+        test.description = post['description']
+
+        test.set_result(
+            status=status,
+            output=output,
+            error=error,
+            duration=duration,
+            output_file=output_file,
+        )
+
+        self.history.record(test.path, duration)
+        self.busy_time += duration
+        self.end_time = max(end_time, self.end_time or end_time)
+        self.queued.discard(test.path)
+
+        # Work out how long the suite has left to run (approximately)
+        remaining = format_duration(self.remaining_time(end_time))
+
+        # Update test result counts
+        self.result_count.setdefault(status, 0)
+        self.result_count[status] = self.result_count[status] + 1
+
+        # Notify the display to update.
+        self.emit('test_end', module=self.module, test_path=test.path, result=status, remaining_time=remaining)
+
+        # Clear the decks for the next test.
+        if self.current_test is test:
+            self.current_test = None
+
+    @property
+    def parallelism(self):
+        "The number of tests that have been running at once, on average."
+        if self.start_time is None or self.end_time is None or self.end_time <= self.start_time:
+            return self.history.parallelism(self.module)
+        return max(self.busy_time / (self.end_time - self.start_time), 1.0)
+
+    def remaining_time(self, now):
+        """Estimate how many seconds are left until the run finishes.
+
+        Each test still to run is expected to take as long as it has in
+        the past. Tests that have never run (or that were asked for by a
+        module or class label) are expected to take as long as the
+        average test of this run. Time already spent on running tests is
+        deducted, and the total is shared between the tests that run at
+        once.
+        """
+        average = self.busy_time / self.completed_count if self.completed_count else 0.0
+        remaining = 0.0
+        known = 0
+        for path in self.queued:
+            estimate = self.history.estimate(path)
+            if estimate is not None:
+                remaining += estimate
+                known += 1
+        remaining += max(self.total_count - self.completed_count - known, 0) * average
+
+        for test, pre, chunks in self.running_tests.values():
+            estimate = self.history.estimate(test.path)
+            elapsed = now - float(pre['start_time'])
+            remaining -= min(elapsed, average if estimate is None else estimate)
+        return max(remaining, 0.0) / self.parallelism
+
+    def _record_history(self):
+        "Store the durations of this run for the estimates of later runs."
+        if self.completed_count:
+            self.history.record_run(self.module, self.parallelism)
+            self.history.save()
+
+
+class EventDrivenExecutor(Executor):
+    """An executor that reads the subprocess pipes without helper threads.
+
+    The pipes are non-blocking; the owner watches `filenos()` (with a
+    QSocketNotifier, or `wait()` when there is no event loop) and calls
+    `poll()` whenever one of them is readable. Results are parsed and
+    emitted as soon as the bytes arrive, and nothing runs while the
+    runner is quiet. Discovery, the hotplug monitor, the sampler and the
+    wpa_supplicant client are driven the same way, through `fileno()` or
+    `filenos()` and `poll()`, so their events arrive in the owner's thread.
+
+    Once both pipes are closed there is nothing left to watch, but the
+    runner may not have exited yet; nothing waits for it. Until `poll()`
+    returns False, the owner polls again every EXIT_POLL_INTERVAL.
+    """
+    def _start_readers(self):
+        self._decoder = PipedStreamDecoder()
+        self._error_partial = b''
+        self._open = {}
+        for pipe in (self.proc.stdout, self.proc.stderr):
+            fd = pipe.fileno()
+            os.set_blocking(fd, False)
+            self._open[fd] = pipe
+        self._selector = None
+
+    def filenos(self):
+        "The file descriptors that still need to be watched."
+        return list(self._open)
+
+    def wait(self, timeout=None):
+        """Block until there is output to read, or the timeout expires.
+
+        For use without an event loop. Returns True if there is
+        something to poll.
+        """
+        if not self._open:
+            # Waiting for the runner to exit.
+            time.sleep(min(timeout, EXIT_POLL_INTERVAL) if timeout is not None else EXIT_POLL_INTERVAL)
+            return True
+        if self._selector is None:
+            self._selector = selectors.DefaultSelector()
+            for fd in self._open:
+                self._selector.register(fd, selectors.EVENT_READ)
+        return bool(self._selector.select(timeout))
+
+    def _read(self, pipe):
+        "Read everything currently available on a pipe, closing it at end of file."
+        chunks = []
+        fd = pipe.fileno()
+        while True:
+            try:
+                data = os.read(fd, 65536)
+            except BlockingIOError:
+                break
+            if not data:
+                self._close(pipe)
+                break
+            chunks.append(data)
+        return b''.join(chunks)
+
+    def _close(self, pipe):
+        "Stop watching a pipe, and close it."
+        fd = pipe.fileno()
+        del self._open[fd]
+        if self._selector is not None:
+            self._selector.unregister(fd)
+        pipe.close()
+
+    def _read_events(self):
+        pipe = self.proc.stdout
+        if pipe.closed:
+            return []
+        return self._decoder.feed(self._read(pipe))
+
+    def _read_errors(self):
+        pipe = self.proc.stderr
+        if pipe.closed:
+            return
+        self._add_errors(self._read(pipe), pipe.closed)
+
+    def _add_errors(self, data, at_end):
+        "Add the complete lines of error output to the error buffer."
+        lines = (self._error_partial + data).split(b'\n')
+        self._error_partial = lines.pop()
+        if at_end and self._error_partial:
+            # The last line had no newline.
+            lines.append(self._error_partial)
+            self._error_partial = b''
+        self.error_buffer.extend(line.strip().decode('utf-8', 'replace') for line in lines)
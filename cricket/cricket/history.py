@@ -0,0 +1,136 @@
+"""A record of how long tests take, kept between runs.
+
+For each test path, the store keeps an exponential moving average of
+its duration, plus its most recent durations for percentiles. For each
+module it keeps how many tests ran at the same time, on average, so
+estimates allow for tests run in parallel.
+
+The store is a small JSON file; CRICKET_HISTORY names it, and it
+defaults to ~/.local/share/cricket/durations.json.
+"""
+from __future__ import absolute_import
+
+import json
+import math
+import os
+
+HISTORY_ENV = 'CRICKET_HISTORY'
+
+# The weight of the newest duration in the moving average.
+EMA_WEIGHT = 0.3
+
+# The number of recent durations kept for each test.
+MAX_SAMPLES = 20
+
+_loaded = {}
+
+
+def default_path():
+    path = os.environ.get(HISTORY_ENV)
+    if not path:
+        data_home = os.environ.get('XDG_DATA_HOME') or os.path.join(os.path.expanduser('~'), '.local', 'share')
+        path = os.path.join(data_home, 'cricket', 'durations.json')
+    return path
+
+
+def load_history(path=None):
+    "Return the history stored in a file. Everyone loading the same file shares one copy."
+    path = path or default_path()
+    if path not in _loaded:
+        _loaded[path] = DurationHistory(path)
+    return _loaded[path]
+
+
+def format_duration(seconds):
+    "Describe a duration the way a person would."
+    if seconds > 7200:
+        return '%s hours' % int(seconds / 3600)
+    elif seconds > 3600:
+        return '%s hour' % int(seconds / 3600)
+    elif seconds > 120:
+        return '%s mins' % int(seconds / 60)
+    elif seconds > 60:
+        return '%s min' % int(seconds / 60)
+    else:
+        return '%ss' % int(seconds)
+
+
+def percentile(samples, fraction):
+    "The nearest-rank percentile of some samples."
+    ordered = sorted(samples)
+    rank = int(math.ceil(fraction * len(ordered)))
+    return ordered[min(max(rank, 1), len(ordered)) - 1]
+
+
+class DurationHistory(object):
+    "The durations of past test runs."
+    def __init__(self, path):
+        self.path = path
+        self.tests = {}
+        self.modules = {}
+        try:
+            with open(path) as f:
+                data = json.load(f)
+            self.tests = data.get('tests', {})
+            self.modules = data.get('modules', {})
+        except (IOError, OSError, ValueError):
+            # No history yet (or it's unreadable); start again.
+            pass
+
+    def save(self):
+        "Write the history out, replacing the file in one step."
+        directory = os.path.dirname(self.path)
+        tmp = self.path + '.tmp'
+        try:
+            if directory and not os.path.isdir(directory):
+                os.makedirs(directory)
+            with open(tmp, 'w') as f:
+                json.dump({'tests': self.tests, 'modules': self.modules}, f, separators=(',', ':'))
+            os.replace(tmp, self.path)
+        except (IOError, OSError):
+            pass
+
+    def record(self, path, duration):
+        "Record how long a test took."
+        entry = self.tests.get(path)
+        if entry is None:
+            entry = self.tests[path] = {'ema': duration, 'samples': []}
+        else:
+            entry['ema'] = EMA_WEIGHT * duration + (1 - EMA_WEIGHT) * entry['ema']
+        entry['samples'] = (entry['samples'] + [duration])[-MAX_SAMPLES:]
+
+    def record_run(self, module, parallelism):
+        "Record how many tests of a module were running at once, on average."
+        entry = self.modules.setdefault(module, {'parallelism': parallelism})
+        entry['parallelism'] = EMA_WEIGHT * parallelism + (1 - EMA_WEIGHT) * entry['parallelism']
+
+    def estimate(self, path, fraction=None):
+        """How long a test is expected to take, or None if it has never run.
+
+        By default, this is the moving average; if `fraction` is given,
+        it's that percentile of the recent durations.
+        """
+        entry = self.tests.get(path)
+        if entry is None:
+            return None
+        if fraction is None:
+            return entry['ema']
+        return percentile(entry['samples'], fraction)
+
+    def parallelism(self, module):
+        "How many tests of a module usually run at once."
+        entry = self.modules.get(module)
+        return entry['parallelism'] if entry else 1.0
+
+    def cycle_time(self, module, paths, fraction=None):
+        """How long a run of the given tests of a module is expected to take.
+
+        Tests that have never run are assumed to take as long as the
+        average test that has. Returns None if none of them have run.
+        """
+        estimates = [self.estimate(path, fraction) for path in paths]
+        known = [estimate for estimate in estimates if estimate is not None]
+        if not known:
+            return None
+        total = sum(known) + (len(estimates) - len(known)) * (sum(known) / len(known))
+        return total / max(self.parallelism(module), 1.0)
@@ -0,0 +1,172 @@
+"""Following USB devices and display connectors as they come and go.
+
+The kernel announces every device added, removed or changed with a
+uevent on a NETLINK_KOBJECT_UEVENT socket. The monitor reads those for
+the USB ports and DRM connectors it has been asked to watch, so nothing
+needs to poll sysfs: the state of each is read once when watching
+starts, and again only when the kernel says something has changed.
+
+A uevent is a datagram of NUL separated strings: a summary
+(ACTION@DEVPATH), then KEY=VALUE properties, e.g.
+
+    add@/devices/platform/usb2/2-1/2-1.1
+    ACTION=add
+    DEVPATH=/devices/platform/usb2/2-1/2-1.1
+    SUBSYSTEM=usb
+    DEVTYPE=usb_device
+
+`feed()` takes one, so monitors can be driven by synthetic uevents.
+"""
+from __future__ import absolute_import
+
+import errno
+import os
+import socket
+
+from cricket.events import EventSource
+
+NETLINK_KOBJECT_UEVENT = 15
+
+# The multicast group the kernel sends uevents to.
+KERNEL_GROUP = 1
+
+# Bursts of uevents (a hub with several devices plugged in) must fit in
+# the socket's buffer until they are read.
+RECEIVE_BUFFER = 1024 * 1024
+
+
+def parse_uevent(data):
+    """The properties of a uevent, as a dict.
+
+    Returns None for anything that isn't a uevent from the kernel.
+    """
+    fields = data.split(b'\0')
+    if b'@' not in fields[0]:
+        return None
+    properties = {}
+    for field in fields[1:]:
+        key, sep, value = field.decode('utf-8', 'replace').partition('=')
+        if sep:
+            properties[key] = value
+    if 'ACTION' not in properties or 'DEVPATH' not in properties:
+        return None
+    return properties
+
+
+def open_uevent_socket():
+    "A non-blocking socket receiving the kernel's uevents."
+    sock = socket.socket(socket.AF_NETLINK, socket.SOCK_DGRAM, NETLINK_KOBJECT_UEVENT)
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, RECEIVE_BUFFER)
+        sock.bind((0, KERNEL_GROUP))
+        sock.setblocking(False)
+    except OSError:
+        sock.close()
+        raise
+    return sock
+
+
+class HotplugMonitor(EventSource):
+    """Follows USB ports and DRM connectors, using the kernel's uevents.
+
+    USB ports are named by their place in the device tree, as under
+    /sys/bus/usb/devices (e.g. 'usb2/2-1/2-1.1'); connectors by their
+    name under /sys/class/drm (e.g. 'card2-HDMI-A-1').
+
+    Emits:
+        * 'usb_port' with port and present (a bool) when a device is
+          plugged into or taken out of a watched port.
+        * 'connector' with connector and status (as in its sysfs
+          status file, e.g. 'connected') when a watched connector's
+          status changes.
+
+    `scan()` emits the current state of everything watched.
+    """
+    def __init__(self, sock=None, sysfs='/sys'):
+        # Open the socket before anything is scanned, so no change
+        # between the scan and the first poll is missed.
+        self.sock = sock if sock is not None else open_uevent_socket()
+        self.sysfs = sysfs
+
+        # The last known state of each port and connector.
+        self.ports = {}
+        self.connectors = {}
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        self.sock.close()
+
+    def watch_usb_port(self, port):
+        self.ports[port] = None
+
+    def watch_connector(self, connector):
+        self.connectors[connector] = None
+
+    def _port_present(self, port):
+        return os.path.isdir(os.path.join(self.sysfs, 'bus', 'usb', 'devices', port))
+
+    def _connector_status(self, connector):
+        try:
+            with open(os.path.join(self.sysfs, 'class', 'drm', connector, 'status')) as f:
+                return f.read().strip()
+        except (IOError, OSError):
+            return None
+
+    def _set_port(self, port, present):
+        if self.ports[port] != present:
+            self.ports[port] = present
+            self.emit('usb_port', port=port, present=present)
+
+    def _set_connector(self, connector, status):
+        if self.connectors[connector] != status:
+            self.connectors[connector] = status
+            self.emit('connector', connector=connector, status=status)
+
+    def scan(self):
+        "Read the state of everything watched from sysfs."
+        for port in self.ports:
+            self._set_port(port, self._port_present(port))
+        for connector in self.connectors:
+            self._set_connector(connector, self._connector_status(connector))
+
+    def poll(self):
+        "Handle the uevents that have arrived."
+        while True:
+            try:
+                data = self.sock.recv(65536)
+            except BlockingIOError:
+                return
+            except OSError as e:
+                if e.errno != errno.ENOBUFS:
+                    raise
+                # Some uevents were dropped; read the state instead.
+                self.scan()
+                continue
+            self.feed(data)
+
+    def feed(self, data):
+        "Handle one uevent."
+        properties = parse_uevent(data)
+        if properties is None:
+            return
+        subsystem = properties.get('SUBSYSTEM')
+        devpath = properties['DEVPATH']
+        if subsystem == 'usb' and properties.get('DEVTYPE') == 'usb_device':
+            for port in self.ports:
+                if devpath.endswith('/' + port):
+                    if properties['ACTION'] == 'add':
+                        self._set_port(port, True)
+                    elif properties['ACTION'] == 'remove':
+                        self._set_port(port, False)
+                    else:
+                        self._set_port(port, self._port_present(port))
+        elif subsystem == 'drm':
+            # Hotplug is announced on the card (or, by some drivers,
+            # on the connector itself); either way, the connector's
+            # status says what happened.
+            device = devpath.rpartition('/')[2]
+            for connector in self.connectors:
+                if device == connector or device == connector.partition('-')[0]:
+                    self._set_connector(connector, self._connector_status(connector))
@@ -1,23 +1,25 @@
-from typing import Union
-import os
-import json
+from cricket import catalogue
 from cricket.singleton import SingletonMeta, singleton
 
 @singleton
 class SimpleLang(object):
-    def __init__(self, file = None):
-        file = file if file else 'languages.json'
-        self._load_from_file(file)
+    "The GUI's text in the current language, from the shared catalogue."
+    def __init__(self):
         self._current_lang = 'zh'
 
-    def _load_from_file(self, file: str):
-        path = os.path.dirname(os.path.abspath(__file__)) + '/' + file
-        with open(path) as f:
-            self.lang_dict = json.load(f)
+    @property
+    def catalogue(self):
+        return catalogue.current()
 
     @property
     def current_lang(self):
         return self._current_lang
 
+    @current_lang.setter
+    def current_lang(self, lang):
+        if lang not in self.catalogue.languages:
+            raise ValueError('No text for language %r' % lang)
+        self._current_lang = lang
+
     def get_text(self, key):
-        return self.lang_dict[self._current_lang][key]
\ No newline at end of file
+        return self.catalogue.text(self._current_lang, key)
@@ -0,0 +1,53 @@
+"""Putting off the expensive parts of the GUI until they are used.
+
+Some subsystems, such as multimedia, QR codes and the peripheral test
+dialog, take a noticeable part of startup but aren't needed to show the
+tests, and some aren't needed at all on a given board. A `LazyModule`
+is imported when one of its attributes is first used, and a `lazy`
+attribute is built when it is first read.
+"""
+from __future__ import absolute_import
+
+from importlib import import_module
+
+from cricket.profiler import profiler
+
+
+class LazyModule(object):
+    "A module that is imported when one of its attributes is first used."
+    def __init__(self, name):
+        self._name = name
+        self._module = None
+
+    def __getattr__(self, attr):
+        if self._module is None:
+            self._module = import_module(self._name)
+        return getattr(self._module, attr)
+
+    def __repr__(self):
+        return '<lazy module %r%s>' % (self._name, '' if self._module is None else ' (imported)')
+
+
+class lazy(object):
+    """An attribute built by a method the first time it is read.
+
+    The result replaces the attribute on the instance, so the method
+    runs once. The time it takes shows in the startup profile.
+    """
+    def __init__(self, method):
+        self.method = method
+        self.name = method.__name__
+        self.__doc__ = method.__doc__
+
+    def __get__(self, instance, owner):
+        if instance is None:
+            return self
+        with profiler.phase(self.name.replace('_', ' ')):
+            value = self.method(instance)
+        instance.__dict__[self.name] = value
+        return value
+
+    @staticmethod
+    def built(instance, name):
+        "Has the lazy attribute `name` of `instance` been built yet?"
+        return name in instance.__dict__
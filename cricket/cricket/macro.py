@@ -48,6 +48,12 @@ STATUS = {
         'tag': 'error',
         'color': '#E4742C'
     },
+    TestMethod.STATUS_TIMEOUT: {
+        'description': u'超时',
+        'symbol': u'T',
+        'tag': 'timeout',
+        'color': '#B8336A'
+    },
 }
 
 STATUS_DEFAULT = {
@@ -4,7 +4,6 @@ load a "project" for discovering and executing tests, and
 to initiate the GUI main loop.
 '''
 from argparse import ArgumentParser
-import subprocess
 import sys
 
 # try:
@@ -20,6 +19,8 @@ import sys
 
 from PyQt5.QtWidgets import QApplication, QMessageBox
 
+from cricket.discovery import Discovery, DiscoveryCache
+from cricket.profiler import PROFILE_ENV, profiler
 from cricket.qtview import MainWindow
 from cricket.model import ModelLoadError
 
@@ -33,6 +34,11 @@ def main(Model):
     parser = ArgumentParser()
 
     parser.add_argument("--version", help="Display version number and exit", action="store_true")
+    parser.add_argument(
+        "--profile", metavar="FILE",
+        help="Time each phase of startup, and write a report to FILE when the first test starts "
+             "(or set %s)" % PROFILE_ENV
+    )
 
     Model.add_arguments(parser)
     options = parser.parse_args()
@@ -53,33 +59,26 @@ def main(Model):
     # project load, show an error dialog
     # project = None
     # while project is None:
+    if options.profile:
+        profiler.enable(options.profile)
+
     try:
         # Create the project objects
         project = Model(options)
 
-        runner = subprocess.Popen(
-            project.discover_commandline(),
-            stdin=None,
-            stdout=subprocess.PIPE,
-            stderr=subprocess.PIPE,
-            shell=False,
-        )
-
-        test_list = []
-        for line in runner.stdout:
-            test = line.strip().decode('utf-8')
-            if test.startswith('unittest.loader._FailedTest.'):
-                print('Load failed:', test.replace('unittest.loader._FailedTest.', ''))
-                sys.exit(1)
-            test_list.append(line.strip().decode('utf-8'))
-
-        errors = []
-        for line in runner.stderr:
-            errors.append(line.strip().decode('utf-8'))
-        if errors and not test_list:
-            raise ModelLoadError('\n'.join(errors))
-
-        project.refresh(test_list, errors)
+        # Show the tests found last time, if there are any. If there
+        # aren't, or the tree has changed since, look for them while
+        # the GUI starts up; the tables fill in as they are found.
+        with profiler.phase('discovery cache'):
+            cache = DiscoveryCache()
+            current = cache.fingerprint()
+            cached = cache.load()
+            if cached is not None:
+                project.refresh(cached['tests'], cached['errors'], cached['metadata'])
+        if cached is None or cached['fingerprint'] != current:
+            discovery = Discovery(project, cache, current)
+        else:
+            discovery = None
     except ModelLoadError as e:
         # Load failed; destroy the project and show an error dialog.
         # If the user selects cancel, quit.
@@ -95,15 +94,23 @@ def main(Model):
         #     sys.exit(1)
 
     # Set up the root Tk context
-    app = QApplication([])
+    with profiler.phase('QApplication'):
+        app = QApplication([])
 
-    # Construct an empty window
-    view = MainWindow(app)
+    # Construct an empty window. Any discovery carries on in its own
+    # process while the hardware details are read and the window built.
+    with profiler.phase('main window'):
+        view = MainWindow(app)
 
     # Set the project for the main window.
     # This populates the tree, and sets listeners for
     # future tree modifications.
-    view.project = project
+    with profiler.phase('show tests'):
+        view.project = project
+
+    # Follow the discovery, if there is one.
+    if discovery is not None:
+        view.discover(discovery)
 
     # Run the main loop
     try:
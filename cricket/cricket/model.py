@@ -16,23 +16,80 @@ class ModelLoadError(Exception):
         self.trace = trace
 
 
+def _count(node, tests=0, active=0, status=None, previous=None):
+    """Update the counts of test methods held by a node and every node above it.
+
+    `tests` and `active` are added to the counts of all and of active
+    test methods. A test method whose status changes from `previous`
+    to `status` is moved from one status count to the other; either
+    may be None.
+    """
+    while node is not None:
+        node.test_count += tests
+        node.active_count += active
+        if previous is not None:
+            node.status_count[previous] -= 1
+        if status is not None:
+            node.status_count[status] = node.status_count.get(status, 0) + 1
+        node = node.parent
+
+
+# The output and error of a test that printed nothing.
+_NO_TEXT = ('', '')
+
+
+class _Counted(object):
+    """The counts kept by a node holding test methods.
+
+    * test_count: the test methods below the node
+    * active_count: the active test methods below the node
+    * status_count: the test methods below the node with each status
+
+    They are kept up to date as test methods are added, removed,
+    activated and run, so they never need to be worked out.
+    """
+    def _init_counts(self):
+        self.test_count = 0
+        self.active_count = 0
+        self.status_count = {}
+
+        # The children that are active.
+        self._active_children = 0
+
+    def count_status(self, status):
+        "The number of test methods below this node with one of the given statuses."
+        return sum(self.status_count.get(state, 0) for state in status)
+
+
 class TestMethod(EventSource):
     """A data representation of an individual test method.
 
+    There can be thousands of test methods, so they are kept small:
+    their attributes are slots, and the result of the last run is held
+    in fixed fields (status, duration and output_file are None until
+    the test has run). The output and error text, which is usually
+    empty, is kept apart from the rest of the result.
+
     Emits:
         * 'new' when a new node is added
         * 'inactive' when the test method is made inactive in the suite.
         * 'active' when the test method is made active in the suite.
         * 'status_update' when the pass/fail status of the method is updated.
     """
+    __slots__ = (
+        'name', 'parent', 'description', 'timestamp', '_active',
+        'status', 'duration', 'output_file', '_text', '_subscriptions',
+    )
+
     STATUS_PASS = 100
     STATUS_SKIP = 200
     STATUS_FAIL = 300
     STATUS_EXPECTED_FAIL = 310
     STATUS_UNEXPECTED_SUCCESS = 320
     STATUS_ERROR = 400
+    STATUS_TIMEOUT = 410
 
-    FAILING_STATES = (STATUS_FAIL, STATUS_UNEXPECTED_SUCCESS, STATUS_ERROR)
+    FAILING_STATES = (STATUS_FAIL, STATUS_UNEXPECTED_SUCCESS, STATUS_ERROR, STATUS_TIMEOUT)
 
     STATUS_LABELS = {
         STATUS_PASS: 'passed',
@@ -41,17 +98,28 @@ class TestMethod(EventSource):
         STATUS_EXPECTED_FAIL: 'expected failures',
         STATUS_UNEXPECTED_SUCCESS: 'unexpected successes',
         STATUS_ERROR: 'errors',
+        STATUS_TIMEOUT: 'timeouts',
     }
 
     def __init__(self, name, testCase):
         self.name = name
         self.description = ''
+        self.timestamp = None
         self._active = True
-        self._result = None
+
+        # The result of the last run.
+        self.status = None
+        self.duration = None
+        self.output_file = None
+        self._text = None
+
+        self._subscriptions = None
 
         # Set the parent of the TestMethod
         self.parent = testCase
         self.parent[name] = self
+        self.parent._active_children += 1
+        _count(self.parent, tests=1, active=1)
         self.parent._update_active()
 
         # Announce that there is a new test method
@@ -79,12 +147,16 @@ class TestMethod(EventSource):
         if self._active:
             if not is_active:
                 self._active = False
+                self.parent._active_children -= 1
+                _count(self.parent, active=-1)
                 self.emit('inactive')
                 if cascade:
                     self.parent._update_active()
         else:
             if is_active:
                 self._active = True
+                self.parent._active_children += 1
+                _count(self.parent, active=1)
                 self.emit('active')
                 if cascade:
                     self.parent._update_active()
@@ -93,45 +165,32 @@ class TestMethod(EventSource):
         "Toggle the current active status of this test method"
         self.set_active(not self.active)
 
-    @property
-    def status(self):
-        try:
-            return self._result['status']
-        except TypeError:
-            return None
-
     @property
     def output(self):
-        try:
-            return self._result['output']
-        except TypeError:
-            return None
+        "The output of the last run, or None if it hasn't run."
+        return None if self._text is None else self._text[0]
 
     @property
     def error(self):
-        try:
-            return self._result['error']
-        except TypeError:
-            return None
+        "The error of the last run, or None if it hasn't run."
+        return None if self._text is None else self._text[1]
 
-    @property
-    def duration(self):
-        try:
-            return self._result['duration']
-        except TypeError:
-            return None
-
-    def set_result(self, status, output, error, duration):
-        self._result = {
-            'status': status,
-            'output': output,
-            'error': error,
-            'duration': duration,
-        }
+    def set_result(self, status, output, error, duration, output_file=None):
+        """Record the result of a run.
+
+        output_file is the file holding the full output, if it was too
+        large to keep.
+        """
+        _count(self.parent, status=status, previous=self.status)
+        self.status = status
+        self.duration = duration
+        self.output_file = output_file
+        # Most tests have nothing to say; they share one record of that.
+        self._text = _NO_TEXT if (output, error) == _NO_TEXT else (output, error)
         self.emit('status_update')
 
 
-class TestCase(dict, EventSource):
+class TestCase(dict, EventSource, _Counted):
     """A data representation of a test case, wrapping multiple test methods.
 
     Emits:
@@ -143,10 +202,12 @@ class TestCase(dict, EventSource):
         super(TestCase, self).__init__()
         self.name = name
         self._active = True
+        self._init_counts()
 
         # Set the parent of the TestCase
         self.parent = testApp
         self.parent[name] = self
+        self.parent._active_children += 1
         self.parent._update_active()
 
         # Announce that there is a new TestCase
@@ -177,6 +238,7 @@ class TestCase(dict, EventSource):
         if self._active:
             if not is_active:
                 self._active = False
+                self.parent._active_children -= 1
                 self.emit('inactive')
                 if cascade:
                     self.parent._update_active()
@@ -185,6 +247,7 @@ class TestCase(dict, EventSource):
         else:
             if is_active:
                 self._active = True
+                self.parent._active_children += 1
                 self.emit('active')
                 if cascade:
                     self.parent._update_active()
@@ -206,6 +269,10 @@ class TestCase(dict, EventSource):
         Returns a count of tests found, plus the labels needed to
         execute those tests.
         """
+        if status and self and not self.count_status(status):
+            # None of the test methods has one of the statuses.
+            return 0, []
+
         tests = []
         count = 0
 
@@ -236,25 +303,29 @@ class TestCase(dict, EventSource):
 
         return count, tests
 
-    def _purge(self, timestamp):
-        "Purge any test method that isn't current as of the timestamp"
-        for testMethod_name, testMethod in self.items():
+    def _purge(self, timestamp, index=None):
+        """Purge any test method that isn't current as of the timestamp.
+
+        Purged test methods are removed from the project's index, if given.
+        """
+        for testMethod_name, testMethod in list(self.items()):
             if testMethod.timestamp != timestamp:
                 self.pop(testMethod_name)
+                if testMethod.active:
+                    self._active_children -= 1
+                _count(self, tests=-1, active=-1 if testMethod.active else 0, previous=testMethod.status)
+                if index is not None:
+                    index.pop(testMethod.path, None)
+        # The purged methods may have been the only active ones.
+        self._update_active()
 
     def _update_active(self):
         "Check the active status of all child nodes, and update the status of this node accordingly"
-        for testMethod_name, testMethod in self.items():
-            if testMethod.active:
-                # As soon as we find an active child, this node
-                # must be marked active, and no other checks are
-                # required.
-                self.set_active(True)
-                return
-        self.set_active(False)
+        # The node is active if any of its children are.
+        self.set_active(self._active_children > 0)
 
 
-class TestModule(dict, EventSource):
+class TestModule(dict, EventSource, _Counted):
     """A data representation of a module. It may contain test cases, or other modules.
 
     Emits:
@@ -266,10 +337,12 @@ class TestModule(dict, EventSource):
         super(TestModule, self).__init__()
         self.name = name
         self._active = True
+        self._init_counts()
 
         # Set the parent of the TestModule.
         self.parent = parent
         self.parent[name] = self
+        self.parent._active_children += 1
 
         # Announce that there is a new test case
         self.emit('new')
@@ -301,6 +374,7 @@ class TestModule(dict, EventSource):
         if self._active:
             if not is_active:
                 self._active = False
+                self.parent._active_children -= 1
                 self.emit('inactive')
                 if cascade:
                     self.parent._update_active()
@@ -309,6 +383,7 @@ class TestModule(dict, EventSource):
         else:
             if is_active:
                 self._active = True
+                self.parent._active_children += 1
                 self.emit('active')
                 if cascade:
                     self.parent._update_active()
@@ -330,6 +405,10 @@ class TestModule(dict, EventSource):
         Returns a count of tests found, plus the labels needed to
         execute those tests.
         """
+        if status and not active and not labels and self.test_count and not self.count_status(status):
+            # None of the test methods has one of the statuses.
+            return 0, []
+
         tests = []
         count = 0
 
@@ -371,34 +450,55 @@ class TestModule(dict, EventSource):
 
         return count, tests
 
-    def _purge(self, timestamp):
+    def _purge(self, timestamp, index=None):
         """Search all submodules and test cases looking for stale test methods.
 
         Purge any test module without any test cases, and any test Case with no
-        test methods.
+        test methods. Purged nodes are removed from the project's index, if given.
         """
-        for testModule_name, testModule in self.items():
-            testModule._purge(timestamp)
+        for testModule_name, testModule in list(self.items()):
+            testModule._purge(timestamp, index)
             if len(testModule) == 0:
                 self.pop(testModule_name)
+                if testModule.active:
+                    self._active_children -= 1
+                if index is not None:
+                    index.pop(testModule.path, None)
+        self._update_active()
 
     def _update_active(self):
         "Check the active status of all child nodes, and update the status of this node accordingly"
-        for subModule_name, subModule in self.items():
-            if subModule.active:
-                self.set_active(True)
-                return
-        self.set_active(False)
+        # The node is active if any of its children are.
+        self.set_active(self._active_children > 0)
 
 
-class Project(dict, EventSource):
+class Project(dict, EventSource, _Counted):
     """A data representation of an project, containing 1+ test apps.
     """
+    # Can the backend's executor stream results using the framed
+    # protocol (see cricket.pipes)?
+    supports_framed_protocol = False
+
+    # The Executor subclass used to run the tests; None for the default.
+    executor_class = None
+
+    # The project is the root of the tree.
+    parent = None
+
     def __init__(self):
         super(Project, self).__init__()
+        self._init_counts()
         self.errors = []
         self.coverage = False
 
+        # A description of each test case, keyed by path, if the
+        # discoverer provided one.
+        self.metadata = {}
+
+        # Every module, test case and test method, keyed by path.
+        # Kept up to date by confirm_exists() and refresh().
+        self._index = {}
+
     def __repr__(self):
         return u'Project'
 
@@ -414,12 +514,19 @@ class Project(dict, EventSource):
         "The dotted-path name that identifies this project to the test runner"
         return ''
 
+    def find(self, path):
+        "The module, test case or test method with a dotted path, or None."
+        return self._index.get(path)
+
     def find_tests(self, active=True, status=None, labels=None):
         """Find the test labels matching the search criteria.
 
         Returns a count of tests found, plus the labels needed to
         execute those tests.
         """
+        if labels:
+            return self._find_labelled_tests(active, status, set(labels))
+
         tests = []
         count = 0
 
@@ -432,19 +539,7 @@ class Project(dict, EventSource):
             if active and not testApp.active:
                 include = False
 
-            # If a list of test labels has been provided, either the
-            # module, or a test *in* the module, must be named explicitly.
-            if labels:
-                if testApp.path in labels:
-                    # The module is named explicitly. Include all active
-                    # subtests of this module
-                    subcount, subtests = testApp.find_tests(True, status)
-                else:
-                    # The module isn't named. Look for all subtests.
-                    # Search for subtests that match.
-                    subcount, subtests = testApp.find_tests(active, status, labels)
-            else:
-                subcount, subtests = testApp.find_tests(active, status)
+            subcount, subtests = testApp.find_tests(active, status)
 
             if include:
                 count = count + subcount
@@ -461,40 +556,109 @@ class Project(dict, EventSource):
 
         return count, tests
 
+    def _find_labelled_tests(self, active, status, labels):
+        """find_tests() for a set of labels.
+
+        Gives the same answer as walking the whole project, but only
+        visits the named nodes and the modules and test cases that
+        contain them.
+        """
+        # The nodes containing a named node, by id (as they are dicts).
+        containing = set()
+        for label in labels:
+            node = self._index.get(label)
+            if node is None:
+                continue
+            node = node.parent
+            while node is not self and id(node) not in containing:
+                containing.add(id(node))
+                node = node.parent
+
+        def find(parent):
+            tests = []
+            count = 0
+
+            found_partial = False
+            for node in parent.values():
+                # If only active tests have been requested, the node
+                # must be active.
+                if active and not node.active:
+                    continue
+
+                if node.path in labels:
+                    # The node is named explicitly. Include all active
+                    # subtests of this node.
+                    subcount, subtests = node.find_tests(True, status)
+                elif id(node) not in containing:
+                    # Nothing in this node is named.
+                    found_partial = True
+                    continue
+                elif isinstance(node, TestCase):
+                    subcount, subtests = node.find_tests(active, status, labels)
+                else:
+                    subcount, subtests = find(node)
+
+                count = count + subcount
+                if isinstance(subtests, list):
+                    found_partial = True
+                    tests.extend(subtests)
+                else:
+                    tests.append(subtests)
+
+            # No partials found; just reference the node.
+            if not found_partial:
+                return count, parent.path
+
+            return count, tests
+
+        count, tests = find(self)
+        if not isinstance(tests, list):
+            return count, []
+        return count, tests
+
     def confirm_exists(self, test_label, timestamp=None):
         """Confirm that the given test label exists in the current data model.
 
         If it doesn't, create a representation for it.
         """
+        testMethod = self._index.get(test_label)
+        if isinstance(testMethod, TestMethod):
+            testMethod.timestamp = timestamp
+            return testMethod
+
         parts = test_label.split('.')
         if len(parts) < 2:
             return
 
         parentModule = self
-        for testModule_name in parts[:-2]:
+        for depth, testModule_name in enumerate(parts[:-2]):
             try:
                 testModule = parentModule[testModule_name]
             except KeyError:
                 testModule = TestModule(testModule_name, parentModule)
+                self._index['.'.join(parts[:depth + 1])] = testModule
             parentModule = testModule
 
         try:
             testCase = parentModule[parts[-2]]
         except KeyError:
             testCase = TestCase(parts[-2], parentModule)
+            self._index['.'.join(parts[:-1])] = testCase
 
         try:
             testMethod = testCase[parts[-1]]
         except KeyError:
             testMethod = TestMethod(parts[-1], testCase)
+            self._index[test_label] = testMethod
 
         testMethod.timestamp = timestamp
         return testMethod
 
-    def refresh(self, test_list, errors=None):
+    def refresh(self, test_list, errors=None, metadata=None):
         """Refresh the project representation so that it contains only the tests in test_list
 
-        test_list should be a list of dotted-path test names.
+        test_list should be a list of dotted-path test names. Tests
+        that are already in the project keep their results.
         """
         timestamp = datetime.now()
 
@@ -502,12 +666,17 @@ class Project(dict, EventSource):
         for test_label in test_list:
             self.confirm_exists(test_label, timestamp)
 
-        for testModule_name, testModule in self.items():
-            testModule._purge(timestamp)
+        for testModule_name, testModule in list(self.items()):
+            testModule._purge(timestamp, self._index)
             if len(testModule) == 0:
                 self.pop(testModule_name)
+                if testModule.active:
+                    self._active_children -= 1
+                self._index.pop(testModule.path, None)
 
         self.errors = errors if errors is not None else []
+        if metadata is not None:
+            self.metadata = metadata
 
     def _update_active(self):
         "Exists for API consistency"
@@ -1,11 +1,31 @@
+"""The protocol used to stream test results from a runner to the GUI.
+
+Two versions of the protocol exist:
+
+* The line protocol. Each test is written as a marker line (STX for
+  the first test, US for the others), a JSON line describing the test
+  that started, and a JSON line with its outcome and output. ETX marks
+  the end of the run.
+
+* The framed protocol. Each frame is a 4 byte big-endian payload
+  length, a 1 byte frame type and the payload. Test output travels in
+  its own raw frames rather than inside the JSON, so it can't be
+  confused with the protocol, and a reader never has to rescan data.
+
+The reading side asks for the framed protocol by setting
+CRICKET_PIPE_PROTOCOL=framed in the runner's environment. A runner that
+understands the request writes FRAMED_HANDSHAKE as a line, then switches
+to frames. A runner that doesn't keeps using the line protocol, which
+the reader still understands.
+"""
 from __future__ import absolute_import
 
+import itertools
 import json
-try:
-    from StringIO import StringIO
-except ImportError:
-    from io import StringIO
+import os
+import struct
 import sys
+import threading
 import time
 import traceback
 
@@ -14,6 +34,9 @@ if sys.version_info < (2, 7):
 else:
     import unittest
 
+from cricket.capture import CapturedOutput, SpillFile, output_limit
+from cricket.watchdog import Watchdog
+
 
 def trim_docstring(docstring):
     """Trim leading spaces in docstring indentation.
@@ -44,6 +67,51 @@ def trim_docstring(docstring):
     return '\n'.join(trimmed)
 
 
+PROTOCOL_ENV = 'CRICKET_PIPE_PROTOCOL'
+LINE_PROTOCOL = 'line'
+FRAMED_PROTOCOL = 'framed'
+
+FRAMED_HANDSHAKE = '\x16CRICKET/FRAMED/1'  # ASCII SYN (Synchronous Idle)
+
+# Frame types
+FRAME_START = 1      # JSON: id, path, start_time
+FRAME_END = 2        # JSON: id, status, end_time, description, error
+FRAME_OUTPUT = 3     # 4 byte test id, then raw output bytes
+FRAME_METRIC = 4     # JSON: id, name, value
+FRAME_HEARTBEAT = 5  # JSON: time
+FRAME_FINISH = 6     # JSON: end of the test run
+
+FRAME_HEADER = struct.Struct('>IB')
+FRAME_TOKEN = struct.Struct('>I')
+
+HEARTBEAT_INTERVAL = 5
+
+# How long a partial line of test output may wait before it is sent.
+OUTPUT_FLUSH_INTERVAL = 0.25
+
+# Record streams used by the tests running in each thread, so that
+# report_metric knows where to write.
+_context = threading.local()
+
+
+def encode_frame(kind, payload):
+    "Encode a single frame. Payloads that aren't bytes are sent as compact JSON."
+    if not isinstance(payload, bytes):
+        payload = json.dumps(payload, separators=(',', ':')).encode('utf-8')
+    return FRAME_HEADER.pack(len(payload), kind) + payload
+
+
+def report_metric(name, value):
+    """Report a measurement made by the test that is currently running.
+
+    Metrics are only carried by the framed protocol; with the line
+    protocol, this does nothing.
+    """
+    records = getattr(_context, 'records', None)
+    if records is not None:
+        records.write_metric(_context.token, name, value)
+
+
 class PipedTestResult(unittest.result.TestResult):
     """A test result class that can print test results in a machine-parseable format.
 
@@ -51,15 +119,16 @@ class PipedTestResult(unittest.result.TestResult):
     """
     RESULT_SEPARATOR = '\x1f'  # ASCII US (Unit Separator)
 
-    def __init__(self, stream, use_old_discovery=True):
+    def __init__(self, stream, use_old_discovery=True, records=None, watchdog=None):
         super(PipedTestResult, self).__init__()
         self.stream = stream
         self.use_old_discovery = use_old_discovery
-        self._first = True
+        self.records = records if records is not None else PipedRecordStream(stream)
+        self.watchdog = watchdog if watchdog is not None else Watchdog()
+        self._token = None
 
-        # Create a clean buffer for stdout content.
-        self._stdout = StringIO()
-        sys.stdout = self._stdout
+        # The watch of the current test, if it overran its limit.
+        self._overrun = None
 
         # The test runner is very lightly stateful. It's possible
         # for a test to raise an error before the test has actually
@@ -67,6 +136,9 @@ class PipedTestResult(unittest.result.TestResult):
         # for the misbehaving test.
         self._current_test = None
 
+        # Create a clean buffer for stdout content.
+        self._capture_output()
+
     def description(self, test):
         try:
             # Wrapped _ErrorHolder objects have their own description
@@ -78,12 +150,60 @@ class PipedTestResult(unittest.result.TestResult):
             else:
                 return 'No description'
 
+    def _capture_output(self):
+        "Redirect stdout into a clean buffer for the test about to run."
+        self._stdout = self.records.open_output(self._token, self._output_name())
+        sys.stdout = self._stdout
+
+    def _output_name(self):
+        "The name the current test's output is spilled under."
+        if self._current_test is None:
+            return 'output'
+        return self._current_test.id()
+
+    def _write_start(self, body):
+        "Write the header of a test result to the stream."
+        self._token = self.records.write_start(body)
+        _context.records = self.records
+        _context.token = self._token
+
+    def _stop_watching(self):
+        """Stop watching the current test, before anything is reported.
+
+        Whatever runs after this can't be interrupted by the watchdog.
+        """
+        watch = self.watchdog.disarm()
+        if watch is not None:
+            self._overrun = watch
+
+    def _check_timeout(self, body):
+        "Report the current test as timed out if it overran."
+        watch, self._overrun = self._overrun, None
+        if watch is not None:
+            message = 'Test timed out after %s seconds' % watch.limit
+            if body.get('error'):
+                message = message + '\n\n' + body['error']
+            body['status'] = 'T'
+            body['error'] = message
+
+    def _complete(self, body):
+        "Finish the outcome of the current test, before it is written."
+        self._check_timeout(body)
+        output_file = self.records.close_output(self._stdout)
+        if output_file:
+            body['output_file'] = output_file
+
+    def _write_end(self, body):
+        "Write the outcome of the current test to the stream."
+        self._complete(body)
+        _context.records = None
+        self.records.write_end(self._token, body)
+        self._token = None
+
     def startTest(self, test):
         super(PipedTestResult, self).startTest(test)
         # We know we're starting a new test - record it.
         self._current_test = test
-        self._stdout = StringIO()
-        sys.stdout = self._stdout
 
         if self.use_old_discovery:
             parts = test.id().split('.')
@@ -96,15 +216,17 @@ class PipedTestResult(unittest.result.TestResult):
             'path': path,
             'start_time': time.time()
         }
-        if self._first:
-            self.stream.write(PipedTestRunner.START_TEST_RESULTS + '\n')
-            self._first = False
-        else:
-            self.stream.write(self.RESULT_SEPARATOR + '\n')
-        self.stream.write('%s\n' % json.dumps(body))
-        self.stream.flush()
+        self._write_start(body)
+        self._capture_output()
+        self._overrun = None
+        self.watchdog.arm(test)
+
+    def stopTest(self, test):
+        self._stop_watching()
+        super(PipedTestResult, self).stopTest(test)
 
     def addSuccess(self, test):
+        self._stop_watching()
         super(PipedTestResult, self).addSuccess(test)
         body = {
             'status': 'OK',
@@ -112,8 +234,7 @@ class PipedTestResult(unittest.result.TestResult):
             'description': self.description(test),
             'output': self._stdout.getvalue(),
         }
-        self.stream.write('%s\n' % json.dumps(body))
-        self.stream.flush()
+        self._write_end(body)
         self._current_test = None
 
     def addError(self, test, err):
@@ -121,6 +242,7 @@ class PipedTestResult(unittest.result.TestResult):
         # setup. Output a test start line so the protocol isn't confused.
         if self._current_test is None:
             self.startTest(test)
+        self._stop_watching()
 
         super(PipedTestResult, self).addError(test, err)
         body = {
@@ -130,11 +252,11 @@ class PipedTestResult(unittest.result.TestResult):
             'error': ''.join(traceback.format_exception(*err)),
             'output': self._stdout.getvalue(),
         }
-        self.stream.write('%s\n' % json.dumps(body))
-        self.stream.flush()
+        self._write_end(body)
         self._current_test = None
 
     def addFailure(self, test, err):
+        self._stop_watching()
         super(PipedTestResult, self).addFailure(test, err)
         body = {
             'status': 'F',
@@ -143,11 +265,11 @@ class PipedTestResult(unittest.result.TestResult):
             'error': ''.join(traceback.format_exception(*err)),
             'output': self._stdout.getvalue(),
         }
-        self.stream.write('%s\n' % json.dumps(body))
-        self.stream.flush()
+        self._write_end(body)
         self._current_test = None
 
     def addSkip(self, test, reason):
+        self._stop_watching()
         super(PipedTestResult, self).addSkip(test, reason)
         body = {
             'status': 's',
@@ -156,11 +278,11 @@ class PipedTestResult(unittest.result.TestResult):
             'error': reason,
             'output': self._stdout.getvalue(),
         }
-        self.stream.write('%s\n' % json.dumps(body))
-        self.stream.flush()
+        self._write_end(body)
         self._current_test = None
 
     def addExpectedFailure(self, test, err):
+        self._stop_watching()
         super(PipedTestResult, self).addExpectedFailure(test, err)
         body = {
             'status': 'x',
@@ -169,11 +291,11 @@ class PipedTestResult(unittest.result.TestResult):
             'error': ''.join(traceback.format_exception(*err)),
             'output': self._stdout.getvalue(),
         }
-        self.stream.write('%s\n' % json.dumps(body))
-        self.stream.flush()
+        self._write_end(body)
         self._current_test = None
 
     def addUnexpectedSuccess(self, test):
+        self._stop_watching()
         super(PipedTestResult, self).addUnexpectedSuccess(test)
         body = {
             'status': 'u',
@@ -181,8 +303,7 @@ class PipedTestResult(unittest.result.TestResult):
             'description': self.description(test),
             'output': self._stdout.getvalue(),
         }
-        self.stream.write('%s\n' % json.dumps(body))
-        self.stream.flush()
+        self._write_end(body)
         self._current_test = None
 
 
@@ -195,9 +316,10 @@ class PipedTestRunner(unittest.TextTestRunner):
     START_TEST_RESULTS = '\x02'  # ASCII STX (Start of Text)
     END_TEST_RESULTS = '\x03'    # ASCII ETX (End of Text)
 
-    def __init__(self, stream=sys.stdout, use_old_discovery=False):
+    def __init__(self, stream=sys.stdout, use_old_discovery=False, protocol=None):
         self.stream = stream
         self.use_old_discovery = use_old_discovery
+        self.protocol = protocol
 
     def run(self, test):
         "Run the given test case or test suite."
@@ -205,16 +327,473 @@ class PipedTestRunner(unittest.TextTestRunner):
         old_stdout = sys.stdout
 
         # Create the result pipe, and run the tests with it.
-        result = PipedTestResult(self.stream, self.use_old_discovery)
+        records = open_record_stream(self.stream, self.protocol)
+        records.start_heartbeat()
+        result = PipedTestResult(self.stream, self.use_old_discovery, records)
         # test is TestSuite, as TestSuite.run(result)
         # via BaseTestSuite.__call__
         test(result)
 
         # Report end of test run
-        self.stream.write(self.END_TEST_RESULTS + '\n')
-        self.stream.flush()
+        records.close()
 
         # Restore the stdout reference
         sys.stdout = old_stdout
 
         return result
+
+
+def open_record_stream(stream, protocol=None):
+    """Open a record stream using the protocol the reading side asked for.
+
+    If no protocol is given, it is taken from the environment.
+    """
+    if protocol is None:
+        protocol = os.environ.get(PROTOCOL_ENV, LINE_PROTOCOL)
+    if protocol == FRAMED_PROTOCOL:
+        return FramedRecordStream(stream)
+    return PipedRecordStream(stream)
+
+
+class PipedRecordStream(object):
+    """Write test records onto a result stream using the line protocol.
+
+    The reading side expects each test's header and outcome to be
+    adjacent, so tests can't be interleaved (see `interleaved`). Tests
+    produced concurrently (by scheduler threads, or by separate worker
+    processes) must be written with `write_record`, one whole test at a
+    time.
+    """
+    # Can the start and end of different tests be interleaved?
+    interleaved = False
+
+    def __init__(self, stream):
+        self.stream = stream
+        self._lock = threading.Lock()
+        self._first = True
+
+    def _marker(self):
+        if self._first:
+            self._first = False
+            return PipedTestRunner.START_TEST_RESULTS
+        return PipedTestResult.RESULT_SEPARATOR
+
+    def write_start(self, pre):
+        """Write the header of a test.
+
+        Returns a token identifying the test in later calls.
+        """
+        with self._lock:
+            self.stream.write('%s\n%s\n' % (self._marker(), json.dumps(pre)))
+            self.stream.flush()
+        return 0
+
+    def write_end(self, token, post):
+        "Write the outcome of a test."
+        with self._lock:
+            self.stream.write('%s\n' % json.dumps(post))
+            self.stream.flush()
+
+    def open_output(self, token, name):
+        """Return a stdout replacement to capture the output of a test.
+
+        With the line protocol, output can only be sent with the
+        outcome of the test, so the most recent output is kept until
+        the test ends; earlier output is spilled to a file.
+        """
+        return CapturedOutput(name, output_limit())
+
+    def close_output(self, output):
+        """The test has finished writing output.
+
+        Returns the path of the file its output was spilled to, or None.
+        """
+        return output.close()
+
+    def write_metric(self, token, name, value):
+        "Metrics can't be expressed in the line protocol."
+        pass
+
+    def write_heartbeat(self):
+        "Heartbeats can't be expressed in the line protocol."
+        pass
+
+    def start_heartbeat(self, interval=HEARTBEAT_INTERVAL):
+        "Heartbeats can't be expressed in the line protocol."
+        pass
+
+    def write_preamble(self, line):
+        """Pass through a line of output from before the test run.
+
+        Once the first record has been written, the stream only carries
+        test records, so late preamble lines are dropped.
+        """
+        with self._lock:
+            if self._first:
+                self.stream.write('%s\n' % line)
+                self.stream.flush()
+
+    def write_record(self, pre, post):
+        "Write the header and outcome of a single test as one unit."
+        with self._lock:
+            self.stream.write('%s\n%s\n%s\n' % (self._marker(), json.dumps(pre), json.dumps(post)))
+            self.stream.flush()
+
+    def close(self):
+        "Report the end of the test run."
+        with self._lock:
+            self.stream.write(PipedTestRunner.END_TEST_RESULTS + '\n')
+            self.stream.flush()
+
+
+class FramedRecordStream(PipedRecordStream):
+    """Write test records onto a result stream using the framed protocol.
+
+    Every frame after the test header carries the id of its test, so
+    tests can be interleaved freely.
+    """
+    interleaved = True
+
+    # The largest amount of output carried by a single frame.
+    CHUNK_SIZE = 65536
+
+    def __init__(self, stream):
+        super(FramedRecordStream, self).__init__(stream)
+        # Announce the switch on the text stream; everything after
+        # this line is written as frames.
+        stream.write(FRAMED_HANDSHAKE + '\n')
+        stream.flush()
+        self.raw = getattr(stream, 'buffer', stream)
+        self._ids = itertools.count(1)
+        self._closed = threading.Event()
+        self._outputs = set()
+        self._outputs_lock = threading.Lock()
+        self._flusher = None
+
+    def _write(self, data):
+        with self._lock:
+            self.raw.write(data)
+            self.raw.flush()
+
+    def write_preamble(self, line):
+        "Output from outside any test travels as output for test id 0."
+        self.write_output(0, line + '\n')
+
+    def write_start(self, pre):
+        token = next(self._ids)
+        body = dict(pre, id=token)
+        self._write(encode_frame(FRAME_START, body))
+        return token
+
+    def write_output(self, token, data):
+        "Write some output produced by a test."
+        if not isinstance(data, bytes):
+            data = data.encode('utf-8')
+        prefix = FRAME_TOKEN.pack(token)
+        self._write(b''.join(
+            encode_frame(FRAME_OUTPUT, prefix + data[i:i + self.CHUNK_SIZE])
+            for i in range(0, len(data), self.CHUNK_SIZE)
+        ))
+
+    def open_output(self, token, name):
+        "Output is forwarded as the test writes it."
+        if token is None:
+            return CapturedOutput(name, output_limit())
+        output = TestOutput(self, token, name)
+        with self._outputs_lock:
+            self._outputs.add(output)
+            if self._flusher is None:
+                self._flusher = threading.Thread(target=self._flush_outputs)
+                self._flusher.daemon = True
+                self._flusher.start()
+        return output
+
+    def close_output(self, output):
+        with self._outputs_lock:
+            self._outputs.discard(output)
+        return output.close()
+
+    def _flush_outputs(self):
+        "Send partial lines of output that have been waiting for a while."
+        while not self._closed.wait(OUTPUT_FLUSH_INTERVAL):
+            with self._outputs_lock:
+                outputs = list(self._outputs)
+            for output in outputs:
+                output.flush()
+
+    def write_end(self, token, post):
+        body = dict(post, id=token)
+        output = body.pop('output', None)
+        if output:
+            self.write_output(token, output)
+        self._write(encode_frame(FRAME_END, body))
+
+    def write_record(self, pre, post):
+        self.write_end(self.write_start(pre), post)
+
+    def write_metric(self, token, name, value):
+        self._write(encode_frame(FRAME_METRIC, {'id': token, 'name': name, 'value': value}))
+
+    def write_heartbeat(self):
+        self._write(encode_frame(FRAME_HEARTBEAT, {'time': time.time()}))
+
+    def start_heartbeat(self, interval=HEARTBEAT_INTERVAL):
+        "Write a heartbeat frame every `interval` seconds until the stream is closed."
+        def beat():
+            while not self._closed.wait(interval):
+                self.write_heartbeat()
+        t = threading.Thread(target=beat)
+        t.daemon = True
+        t.start()
+
+    def close(self):
+        self._closed.set()
+        self._write(encode_frame(FRAME_FINISH, {'time': time.time()}))
+
+
+class TestOutput(object):
+    """Stands in for stdout while a test runs, forwarding what the test
+    writes to the record stream as it is produced.
+
+    Complete lines are sent straight away; a partial line is sent when
+    the record stream next flushes its outputs. Once `limit` bytes have
+    been sent, further output is written to a spill file instead, and a
+    note saying where it went is sent when the test ends.
+    """
+    encoding = 'utf-8'
+
+    def __init__(self, records, token, name, limit=None):
+        self.records = records
+        self.token = token
+        self.name = name
+        self.limit = output_limit() if limit is None else limit
+        self.sent = 0
+        self.overflow = 0
+        self.spill = None
+        self.closed = False
+        self._pending = []
+        self._lock = threading.Lock()
+
+    def write(self, text):
+        with self._lock:
+            if not self.closed:
+                self._pending.append(text)
+                if '\n' in text:
+                    self._send()
+        return len(text)
+
+    def writelines(self, lines):
+        for line in lines:
+            self.write(line)
+
+    def flush(self):
+        with self._lock:
+            self._send()
+
+    def isatty(self):
+        return False
+
+    def getvalue(self):
+        "Output has been sent as it was written; there's none left for the outcome."
+        return ''
+
+    def _send(self):
+        if not self._pending:
+            return
+        data = ''.join(self._pending).encode('utf-8', 'replace')
+        self._pending = []
+        room = max(self.limit - self.sent, 0)
+        if len(data) > room:
+            if self.spill is None:
+                self.spill = SpillFile(self.name)
+            self.spill.write(data[room:])
+            self.overflow += len(data) - room
+            data = data[:room]
+        if data:
+            self.sent += len(data)
+            self.records.write_output(self.token, data)
+
+    def close(self):
+        """Send anything still waiting. Output written after this is dropped.
+
+        Returns the path of the spill file, if output had to be spilled.
+        """
+        with self._lock:
+            self._send()
+            self.closed = True
+            if self.spill is None:
+                return None
+            self.spill.close()
+            if self.spill.path is None:
+                note = '\n[%d bytes of output dropped]\n' % self.overflow
+            else:
+                note = '\n[%d more bytes of output in %s]\n' % (self.overflow, self.spill.path)
+            self.records.write_output(self.token, note)
+            return self.spill.path
+
+
+class PipedRecordReader(object):
+    """Parse a piped result stream one line at a time.
+
+    `feed` returns a tuple describing what the line meant:
+        * ('output', line) for content outside the test results
+        * ('start', pre) when a test has started
+        * ('result', (pre, post)) when a test has finished
+        * ('finish', None) at the end of the test run
+    """
+    def __init__(self):
+        self.started = False
+        self.finished = False
+        self.pre = None
+
+    def feed(self, line):
+        if line in (PipedTestRunner.START_TEST_RESULTS, PipedTestResult.RESULT_SEPARATOR):
+            self.started = True
+            return None
+        elif line == PipedTestRunner.END_TEST_RESULTS:
+            self.finished = True
+            return ('finish', None)
+        elif not self.started or self.finished:
+            return ('output', line)
+
+        # Doctest (and some other tools) output invisible escape sequences.
+        # Strip these if they exist.
+        if line.startswith('\x1b'):
+            line = line[line.find('{'):]
+
+        if self.pre is None:
+            self.pre = json.loads(line)
+            return ('start', self.pre)
+
+        pre, self.pre = self.pre, None
+        return ('result', (pre, json.loads(line)))
+
+
+class FrameParser(object):
+    """Incrementally split a byte stream into frames.
+
+    Data is appended to a buffer once; complete frames are sliced off the
+    front, and a partial frame waits for the rest of its bytes without
+    being rescanned.
+    """
+    def __init__(self):
+        self._buffer = bytearray()
+
+    def feed(self, data):
+        "Add data to the buffer. Returns a list of complete (type, payload) frames."
+        buffer = self._buffer
+        buffer.extend(data)
+        frames = []
+        offset = 0
+        while len(buffer) - offset >= FRAME_HEADER.size:
+            length, kind = FRAME_HEADER.unpack_from(buffer, offset)
+            end = offset + FRAME_HEADER.size + length
+            if end > len(buffer):
+                break
+            frames.append((kind, bytes(buffer[offset + FRAME_HEADER.size:end])))
+            offset = end
+        del buffer[:offset]
+        return frames
+
+
+class PipedStreamDecoder(object):
+    """Decode the raw output of a piped test runner, in either protocol.
+
+    `feed` takes bytes as they are read from the pipe, and returns a
+    list of (event, test id, data) tuples:
+        * ('output', None, line) for content outside the test results
+        * ('start', id, pre) when a test has started
+        * ('chunk', id, bytes) for output produced by a test
+          (id 0 is output from outside any test)
+        * ('metric', id, body) for a measurement reported by a test
+        * ('end', id, post) when a test has finished
+        * ('heartbeat', None, body) while the runner is alive
+        * ('finish', None, body) at the end of the test run
+
+    With the line protocol, only one test runs at a time, and its id is
+    always 0; its output is in post['output'].
+    """
+    def __init__(self):
+        self.framed = False
+        self.finished = False
+        self._lines = PipedRecordReader()
+        self._frames = FrameParser()
+        self._partial = bytearray()
+        self._scan = 0
+
+    def feed(self, data):
+        events = []
+        if not self.framed:
+            data = self._feed_lines(data, events)
+        if self.framed and data:
+            for kind, payload in self._frames.feed(data):
+                self._frame_event(kind, payload, events)
+        return events
+
+    def _feed_lines(self, data, events):
+        """Consume complete lines until the handshake is seen.
+
+        Returns any data that followed the handshake.
+        """
+        buffer = self._partial
+        buffer.extend(data)
+        start = 0
+        while not self.framed:
+            end = buffer.find(b'\n', self._scan)
+            if end == -1:
+                self._scan = len(buffer)
+                break
+            line = bytes(buffer[start:end]).strip().decode('utf-8', 'replace')
+            start = self._scan = end + 1
+            if line == FRAMED_HANDSHAKE:
+                self.framed = True
+            else:
+                self._line_event(line, events)
+        del buffer[:start]
+        self._scan -= start
+
+        if self.framed:
+            data = bytes(buffer)
+            del buffer[:]
+            self._scan = 0
+            return data
+        return b''
+
+    def _line_event(self, line, events):
+        try:
+            event = self._lines.feed(line)
+        except ValueError:
+            # Not the JSON we expected; treat it as plain output.
+            events.append(('output', None, line))
+            return
+        if event is None:
+            return
+        kind, data = event
+        if kind == 'start':
+            events.append(('start', 0, data))
+        elif kind == 'result':
+            events.append(('end', 0, data[1]))
+        elif kind == 'finish':
+            self.finished = True
+            events.append(('finish', None, None))
+        else:
+            events.append(('output', None, data))
+
+    def _frame_event(self, kind, payload, events):
+        if kind == FRAME_OUTPUT:
+            token, = FRAME_TOKEN.unpack_from(payload)
+            events.append(('chunk', token, payload[FRAME_TOKEN.size:]))
+            return
+
+        body = json.loads(payload.decode('utf-8'))
+        if kind == FRAME_START:
+            events.append(('start', body['id'], body))
+        elif kind == FRAME_END:
+            events.append(('end', body['id'], body))
+        elif kind == FRAME_METRIC:
+            events.append(('metric', body['id'], body))
+        elif kind == FRAME_HEARTBEAT:
+            events.append(('heartbeat', None, body))
+        elif kind == FRAME_FINISH:
+            self.finished = True
+            events.append(('finish', None, body))
@@ -0,0 +1,204 @@
+"""Answering simple questions about the system, without starting processes.
+
+The GUI and the tests used to ask ifconfig for a MAC address, lsmod if
+a driver is loaded, ps or pidof if a daemon is running, and edid-decode
+who made the display: a process (and often a shell) for each answer.
+The same answers are in the kernel's own interfaces:
+
+- network interfaces: the SIOCGIF* ioctls, on any socket;
+- kernel modules: /proc/modules;
+- processes: /proc/<pid>/comm;
+- displays: the EDID in /sys/class/drm/<connector>/edid, parsed here.
+
+Answers that are asked for often are remembered for a while, each for
+its own time to live (the *_TTL constants); `cache_clear()` on a probe
+forgets them. A question with no answer (None) is asked again the next
+time, so a probe waiting for something to appear sees it at once.
+"""
+from __future__ import absolute_import
+
+import collections
+import fcntl
+import functools
+import os
+import socket
+import struct
+import time
+
+PROC = '/proc'
+SYSFS = '/sys'
+
+# How long answers are remembered, in seconds.
+INTERFACE_TTL = 1.0
+MAC_TTL = 60.0
+MODULES_TTL = 5.0
+PROCESSES_TTL = 1.0
+
+# The ioctls, from <linux/sockios.h>, and interface flags, from <net/if.h>.
+SIOCGIFFLAGS = 0x8913
+SIOCGIFADDR = 0x8915
+SIOCGIFHWADDR = 0x8927
+IFF_UP = 0x1
+IFF_RUNNING = 0x40
+
+EDID_HEADER = b'\x00\xff\xff\xff\xff\xff\xff\x00'
+EDID_LENGTH = 128
+
+Edid = collections.namedtuple('Edid', 'manufacturer model serial name')
+
+_clock = time.monotonic
+
+
+def cached(ttl):
+    "Decorator: remember a probe's answers, by arguments, for `ttl` seconds."
+    def decorator(function):
+        answers = {}
+
+        @functools.wraps(function)
+        def probe(*args):
+            now = _clock()
+            try:
+                expires, answer = answers[args]
+                if expires > now:
+                    return answer
+            except KeyError:
+                pass
+            answer = function(*args)
+            if answer is not None:
+                answers[args] = (now + ttl, answer)
+            return answer
+
+        probe.ttl = ttl
+        probe.cache_clear = answers.clear
+        return probe
+    return decorator
+
+
+def _ifreq(ifname, request):
+    "The struct ifreq an interface ioctl answers with, or None."
+    sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
+    try:
+        return fcntl.ioctl(sock.fileno(), request, struct.pack('256s', ifname[:15].encode('utf-8')))
+    except OSError:
+        # No such interface, or (for an address) it hasn't got one.
+        return None
+    finally:
+        sock.close()
+
+
+@cached(MAC_TTL)
+def interface_mac(ifname):
+    "The MAC address of a network interface (e.g. '0c:fa:22:31:5e:01'), or None."
+    ifreq = _ifreq(ifname, SIOCGIFHWADDR)
+    if ifreq is None:
+        return None
+    return ':'.join('%02x' % byte for byte in bytearray(ifreq[18:24]))
+
+
+@cached(INTERFACE_TTL)
+def interface_flags(ifname):
+    "The IFF_* flags of a network interface, or None if there is no such interface."
+    ifreq = _ifreq(ifname, SIOCGIFFLAGS)
+    if ifreq is None:
+        return None
+    return struct.unpack('H', ifreq[16:18])[0]
+
+
+def interface_up(ifname):
+    "Is a network interface there, and up?"
+    return bool((interface_flags(ifname) or 0) & IFF_UP)
+
+
+@cached(INTERFACE_TTL)
+def interface_address(ifname):
+    "The IPv4 address of a network interface, or None."
+    ifreq = _ifreq(ifname, SIOCGIFADDR)
+    if ifreq is None:
+        return None
+    return socket.inet_ntoa(ifreq[20:24])
+
+
+@cached(MODULES_TTL)
+def loaded_modules(proc=PROC):
+    "The names of the kernel modules loaded, as a frozenset."
+    try:
+        with open(os.path.join(proc, 'modules')) as f:
+            return frozenset(line.split(' ', 1)[0] for line in f if line.strip())
+    except (IOError, OSError):
+        # No /proc/modules: a kernel without loadable modules.
+        return frozenset()
+
+
+def module_loaded(name, proc=PROC):
+    "Is a kernel module loaded?"
+    return name in loaded_modules(proc)
+
+
+@cached(PROCESSES_TTL)
+def processes(proc=PROC):
+    """The processes running, as a dict of their pids by command name.
+
+    Command names are those in /proc/<pid>/comm, which the kernel cuts
+    to 15 characters.
+    """
+    by_name = {}
+    for entry in os.listdir(proc):
+        if not entry.isdigit():
+            continue
+        try:
+            with open(os.path.join(proc, entry, 'comm')) as f:
+                name = f.read().rstrip('\n')
+        except (IOError, OSError):
+            # Gone since the directory was listed.
+            continue
+        by_name.setdefault(name, []).append(int(entry))
+    for pids in by_name.values():
+        pids.sort()
+    return by_name
+
+
+def pidof(name, proc=PROC):
+    "The pids of the processes with a command name, as a list."
+    return processes(proc).get(name[:15], [])
+
+
+def process_running(name, proc=PROC):
+    "Is a process with a command name running?"
+    return bool(pidof(name, proc))
+
+
+def parse_edid(data):
+    """The manufacturer and model of a display, from its EDID.
+
+    `manufacturer` is the three letter PNP ID (e.g. 'SAM'); `model` and
+    `serial` are the product code and serial number, as numbers (edid-
+    decode shows the same); `name` is the display's own name for itself,
+    or None. Returns None if `data` isn't an EDID.
+    """
+    data = bytearray(data)
+    if len(data) < EDID_LENGTH or bytes(data[:8]) != EDID_HEADER:
+        return None
+    letters = (data[8] << 8) | data[9]
+    manufacturer = ''.join(chr(ord('A') - 1 + ((letters >> shift) & 0x1f)) for shift in (10, 5, 0))
+    model, serial = struct.unpack('<HI', bytes(data[10:16]))
+
+    name = None
+    for offset in range(54, 126, 18):
+        descriptor = data[offset:offset + 18]
+        # A display descriptor (not a timing), of the display name.
+        if descriptor[0] == 0 and descriptor[1] == 0 and descriptor[3] == 0xfc:
+            name = bytes(descriptor[5:18]).split(b'\n')[0].decode('latin1').strip()
+    return Edid(manufacturer, model, serial, name)
+
+
+def read_edid(connector, sysfs=SYSFS):
+    """The EDID of the display on a DRM connector (e.g. 'card2-HDMI-A-1'), parsed.
+
+    Returns None if nothing is connected. This isn't remembered: it is
+    read when the connector changes.
+    """
+    try:
+        with open(os.path.join(sysfs, 'class', 'drm', connector, 'edid'), 'rb') as f:
+            return parse_edid(f.read())
+    except (IOError, OSError):
+        return None
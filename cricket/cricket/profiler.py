@@ -0,0 +1,251 @@
+"""Where the time goes while the GUI starts up.
+
+Set CRICKET_PROFILE to the name of a report file (or pass
+``--profile FILE``) to time each phase of startup, from the start of
+the process to the first test starting, and the import of every
+module. When the first test starts, the report is written as JSON and
+a summary is printed.
+
+If CRICKET_PROFILE_BUDGET is set to a number of seconds, the summary
+(and the report) say whether startup took longer than that.
+
+All times are in seconds, measured on the monotonic clock from the
+start of the process.
+"""
+from __future__ import absolute_import
+
+import atexit
+import json
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+PROFILE_ENV = 'CRICKET_PROFILE'
+BUDGET_ENV = 'CRICKET_PROFILE_BUDGET'
+
+# How many of the slowest imports the summary lists.
+SUMMARY_IMPORTS = 10
+
+
+def process_start():
+    "When this process started, on the monotonic clock."
+    try:
+        with open('/proc/self/stat') as f:
+            # The command name may contain spaces; skip past it.
+            fields = f.read().rpartition(')')[2].split()
+        started = int(fields[19]) / os.sysconf('SC_CLK_TCK')
+        return time.monotonic() - (time.clock_gettime(time.CLOCK_BOOTTIME) - started)
+    except (OSError, ValueError, IndexError, AttributeError):
+        return time.monotonic()
+
+
+class _TimedLoader(object):
+    "Wraps a module loader to time the execution of the module."
+    def __init__(self, loader, profiler):
+        self.loader = loader
+        self.profiler = profiler
+
+    def __getattr__(self, name):
+        return getattr(self.loader, name)
+
+    def create_module(self, spec):
+        return self.loader.create_module(spec)
+
+    def exec_module(self, module):
+        # Let the module see its real loader.
+        module.__loader__ = self.loader
+        if module.__spec__ is not None:
+            module.__spec__.loader = self.loader
+        with self.profiler._importing(module.__name__):
+            self.loader.exec_module(module)
+
+
+class _ImportTimer(object):
+    "A meta path finder that times the imports found by the finders after it."
+    def __init__(self, profiler):
+        self.profiler = profiler
+
+    def find_spec(self, name, path=None, target=None):
+        for finder in sys.meta_path:
+            if finder is self or not hasattr(finder, 'find_spec'):
+                continue
+            spec = finder.find_spec(name, path, target)
+            if spec is not None:
+                if spec.loader is not None and hasattr(spec.loader, 'exec_module'):
+                    spec.loader = _TimedLoader(spec.loader, self.profiler)
+                return spec
+        return None
+
+
+class StartupProfiler(object):
+    """Records the phases of startup.
+
+    Until it is enabled, recording does nothing, so the calls can stay
+    in place. The process has one, `profiler`.
+    """
+    def __init__(self):
+        self.enabled = False
+        self.path = None
+        self.origin = None
+        self.phases = []
+        self.marks = []
+        self.imports = {}
+        self.written = False
+        self._depth = 0
+        self._import_stack = []
+        self._open = {}
+
+    def configure(self, argv=None, environ=None):
+        "Enable profiling if CRICKET_PROFILE or --profile asks for it."
+        argv = sys.argv if argv is None else argv
+        environ = os.environ if environ is None else environ
+        path = environ.get(PROFILE_ENV)
+        for index, arg in enumerate(argv):
+            if arg == '--profile' and index + 1 < len(argv):
+                path = argv[index + 1]
+            elif arg.startswith('--profile='):
+                path = arg.partition('=')[2]
+        if path:
+            self.enable(path)
+
+    def enable(self, path):
+        "Start recording, to write a report to `path`."
+        if self.enabled:
+            return
+        self.enabled = True
+        self.path = path
+        self.origin = process_start()
+        self.phases.append({'name': 'interpreter', 'start': 0.0, 'end': self.now(), 'depth': 0})
+        sys.meta_path.insert(0, _ImportTimer(self))
+        atexit.register(self.finish)
+
+    def now(self):
+        "The time since the process started."
+        return time.monotonic() - self.origin
+
+    @contextmanager
+    def phase(self, name):
+        "Time a phase of startup."
+        if not self.enabled:
+            yield
+            return
+        entry = self._start(name)
+        self._depth += 1
+        try:
+            yield
+        finally:
+            self._depth -= 1
+            entry['end'] = self.now()
+
+    def begin(self, name):
+        """Start a phase that ends somewhere else (see `end`).
+
+        Other phases may start and end while it runs.
+        """
+        if self.enabled:
+            self._open[name] = self._start(name)
+
+    def end(self, name):
+        "End a phase started with `begin`."
+        entry = self._open.pop(name, None)
+        if entry is not None:
+            entry['end'] = self.now()
+
+    def _start(self, name):
+        entry = {'name': name, 'start': self.now(), 'end': None, 'depth': self._depth}
+        self.phases.append(entry)
+        return entry
+
+    def mark(self, name):
+        "Note when something happened."
+        if self.enabled:
+            self.marks.append({'name': name, 'time': self.now()})
+
+    @contextmanager
+    def _importing(self, name):
+        start = time.monotonic()
+        self._import_stack.append(0.0)
+        try:
+            yield
+        finally:
+            elapsed = time.monotonic() - start
+            children = self._import_stack.pop()
+            if self._import_stack:
+                self._import_stack[-1] += elapsed
+            self.imports[name] = {'cumulative': elapsed, 'self': elapsed - children}
+
+    def ready(self):
+        "Startup is over: the first test has started. Write the report."
+        if self.enabled and not self.written:
+            self.mark('first test started')
+            self.finish()
+
+    def report(self):
+        "The report, as a JSON-ready dict."
+        ready = [mark['time'] for mark in self.marks if mark['name'] == 'first test started']
+        total = ready[0] if ready else self.now()
+        report = {
+            'version': 1,
+            'total': total,
+            'ready': bool(ready),
+            'phases': [
+                dict(entry, duration=None if entry['end'] is None else entry['end'] - entry['start'])
+                for entry in self.phases
+            ],
+            'marks': self.marks,
+            'imports': sorted(
+                (dict(timing, module=name) for name, timing in self.imports.items()),
+                key=lambda timing: timing['self'], reverse=True,
+            ),
+        }
+        try:
+            report['budget'] = float(os.environ[BUDGET_ENV])
+            report['over_budget'] = total > report['budget']
+        except (KeyError, ValueError):
+            pass
+        return report
+
+    def summary(self, report):
+        "Describe a report in a few lines."
+        lines = ['Startup profile (%s):' % self.path]
+        for entry in report['phases']:
+            if entry['duration'] is None:
+                duration = 'unfinished'
+            else:
+                duration = '%7.3fs' % entry['duration']
+            lines.append('  %-32s %10s  (at %.3fs)' % ('  ' * entry['depth'] + entry['name'], duration, entry['start']))
+        for mark in report['marks']:
+            lines.append('  %-32s at %.3fs' % (mark['name'], mark['time']))
+        if report['imports']:
+            lines.append('  slowest imports (own time):')
+            for timing in report['imports'][:SUMMARY_IMPORTS]:
+                lines.append('    %-30s %7.3fs' % (timing['module'], timing['self']))
+        if not report['ready']:
+            lines.append('  no test started; exited after %.3fs' % report['total'])
+        elif 'budget' in report:
+            lines.append('  ready after %.3fs: %s the %.3fs budget' % (
+                report['total'],
+                'OVER' if report['over_budget'] else 'within',
+                report['budget'],
+            ))
+        else:
+            lines.append('  ready after %.3fs' % report['total'])
+        return '\n'.join(lines)
+
+    def finish(self):
+        "Write the report and print its summary, once."
+        if not self.enabled or self.written:
+            return
+        self.written = True
+        report = self.report()
+        try:
+            with open(self.path, 'w') as f:
+                json.dump(report, f, indent=2)
+        except (IOError, OSError) as e:
+            print('Could not write startup profile to %s: %s' % (self.path, e))
+        print(self.summary(report))
+
+
+# The profiler of this process.
+profiler = StartupProfiler()
@@ -3,8 +3,8 @@
 This is the "View" of the MVC world.
 """
 
-from PyQt5.QtCore import Qt, QTimer, QUrl
-from PyQt5.QtGui import QColor, QPixmap, QImage, QPalette
+from PyQt5.QtCore import Qt, QTimer, QUrl, QSocketNotifier
+from PyQt5.QtGui import QColor, QPalette
 from PyQt5.QtWidgets import (
     QMainWindow,
     QFrame,
@@ -14,49 +14,72 @@ from PyQt5.QtWidgets import (
     QLabel,
     QCheckBox,
     QComboBox,
-    QProgressBar,
     QProgressDialog,
     QPushButton,
     QGroupBox,
-    QTableWidget,
+    QTableView,
     QAbstractItemView,
     QStatusBar,
-    QTableWidgetItem,
     QHeaderView,
     QSlider
 )
-from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
-from PyQt5.QtMultimediaWidgets import QVideoWidget
-
-import qrcode
-from PIL.ImageQt import ImageQt
 
 import os
 import time
 import threading
 import subprocess
-from importlib import import_module
 
-from cricket.model import TestMethod, TestCase, TestModule
-from cricket.executor import Executor
+from cricket import catalogue, probe
+from cricket.model import TestMethod, TestModule
+from cricket.discovery import FAILED_TEST_PREFIX, Discovery
+from cricket.events import Coalescer
+from cricket.executor import EXIT_POLL_INTERVAL, Executor, EventDrivenExecutor
+from cricket.history import format_duration, load_history
+from cricket.hotplug import HotplugMonitor
 from cricket.lang import SimpleLang
+from cricket.lazy import LazyModule, lazy
+from cricket.profiler import profiler
+from cricket.sampler import Sampler, find_thermal_zone, proc_field
 from cricket.macro import *
 from cricket.statusview import StatusView
-from cricket.peripheraltestview import PeripheralTestWindow
+from cricket.testtable import TestTableModel
+from cricket.utils import create_qrcode
 from cricket.wifimacview import WifiMacView
 
+# The connector the HDMI output is on.
+HDMI_CONNECTOR = 'card2-HDMI-A-1'
+
+# The camera view starts after the tests do.
+QtMultimedia = LazyModule('PyQt5.QtMultimedia')
+QtMultimediaWidgets = LazyModule('PyQt5.QtMultimediaWidgets')
+
 
 class MainWindow(QMainWindow):
     def __init__(self, root):
         super().__init__()
         self.sl = SimpleLang()
         self._project = None
+        self.test_box = {}
         self.test_table = {}
+        self.test_model = {}
         self.test_list = {}
         self.run_status = {}
+        self.run_summary = {}
         self.executor = {}
+        self.notifiers = {}
+
+        # Modules whose tests are still being discovered, and those
+        # that should run as soon as they have been.
+        self.discovering = set()
+        self.pending_runs = set()
+
+        # Delivers model events in batches, once per turn of the event loop.
+        self.coalescer = Coalescer(lambda flush: QTimer.singleShot(0, flush))
 
         self.usb_list = []
+        # The label of each USB port, by its place under /sys/bus/usb/devices.
+        self.usb_ports = {}
+        self.hotplug = None
 
         self.set_brightness()
 
@@ -71,14 +94,23 @@ class MainWindow(QMainWindow):
         # Set up the main content for the window.
         self._setup_main_content()
 
-        self.peripheral_test_view = PeripheralTestWindow(self)
-
         # Set up listeners for runner events.
-        Executor.bind('test_status_update', self.on_executorStatusUpdate)
-        Executor.bind('test_start', self.on_executorTestStart)
-        Executor.bind('test_end', self.on_executorTestEnd)
-        Executor.bind('suite_end', self.on_executorSuiteEnd)
-        Executor.bind('suite_error', self.on_executorSuiteError)
+        Executor.bind('test_status_update', self.on_executorStatusUpdate, subclasses=True)
+        Executor.bind('test_start', self.on_executorTestStart, subclasses=True)
+        Executor.bind('test_output', self.on_executorTestOutput, subclasses=True)
+        Executor.bind('test_end', self.on_executorTestEnd, subclasses=True)
+        Executor.bind('suite_end', self.on_executorSuiteEnd, subclasses=True)
+        Executor.bind('suite_error', self.on_executorSuiteError, subclasses=True)
+
+        # Set up listeners for discovery events.
+        Discovery.bind('tests_found', self.on_discoveryTestsFound)
+        Discovery.bind('module_found', self.on_discoveryModuleFound)
+        Discovery.bind('discovery_end', self.on_discoveryEnd)
+
+        # Set up listeners for hotplug events.
+        HotplugMonitor.bind('usb_port', self.on_hotplugUsbPort)
+        HotplugMonitor.bind('connector', self.on_hotplugConnector)
+        Sampler.bind('sample', self.on_samplerSample)
 
     ######################################################
     # Internal GUI layout methods.
@@ -96,7 +128,8 @@ class MainWindow(QMainWindow):
         self.content_layout = QVBoxLayout(self.content)
 
         # Information
-        self._setup_info()
+        with profiler.phase('hardware info'):
+            self._setup_info()
 
         # toolbar
         toolbar = QFrame(self.content)
@@ -144,17 +177,14 @@ class MainWindow(QMainWindow):
         self._setup_usb_frame(5, 0, 1, 1)
         self._setup_test_table('manual', 6, 0, 4, 1)
 
-        camera_box = QGroupBox(self.sl.get_text('camera'), self.tests)
-        camera_box_layout = QVBoxLayout(camera_box)
-        video_widget = QVideoWidget(camera_box)
-        self.media_player = QMediaPlayer()
-        self.media_player.setVideoOutput(video_widget)
-        camera_box_layout.addWidget(video_widget)
+        # The video itself is added when the camera starts.
+        self.camera_box = QGroupBox(self.sl.get_text('camera'), self.tests)
+        self.camera_box_layout = QVBoxLayout(self.camera_box)
 
         # others
         self._setup_others()
 
-        self.tests_layout.addWidget(camera_box, 0, 1, 6, 1)
+        self.tests_layout.addWidget(self.camera_box, 0, 1, 6, 1)
         self.tests_layout.addWidget(self.others_box, 6, 1, 4, 1)
 
         self.tests_layout.setRowStretch(0, 6)
@@ -181,64 +211,104 @@ class MainWindow(QMainWindow):
         info = QFrame(self.content)
         info_layout = QGridLayout(info)
 
-        cpu_model = QLabel(f'{self.sl.get_text("cpu_model")}: {self._get_CPU_model()}', info)
-        info_layout.addWidget(cpu_model, 0, 0)
-
-        cpu_freq = QLabel(f'{self.sl.get_text("cpu_freq")}: {self._get_CPU_freq()} GHz', info)
-        info_layout.addWidget(cpu_freq, 0, 1)
-
-        self.cpu_temp = QLabel(f'{self.sl.get_text("cpu_temp")}: {self._get_CPU_Temp()} °C', info)
-        self._cpu_temp_timer = QTimer(self)
-        self._cpu_temp_timer.timeout.connect(self.on_cpuTempUpdate)
-        self._cpu_temp_timer.start(1000)
-        info_layout.addWidget(self.cpu_temp, 0, 2)
-
-        ddr_size = QLabel(f'{self.sl.get_text("ddr_size")}: {self._get_DDR_size()} GB', info)
-        info_layout.addWidget(ddr_size, 0, 3)
-
-        emmc_size = QLabel(f'{self.sl.get_text("emmc_size")}: {self._get_eMMC_size()} GB', info)
-        info_layout.addWidget(emmc_size, 0, 4)
-
-        ssd_size = QLabel(f'{self.sl.get_text("ssd_size")}: {self._get_SSD_size()} GB', info)
-        info_layout.addWidget(ssd_size, 0, 5)
+        # Labels of the details read by the sampler, by sensor name, with
+        # their text key and unit. They show '-' until the first reading.
+        self.info_labels = {}
+        for column, (name, unit) in enumerate([
+            ('cpu_model', ''),
+            ('cpu_freq', ' GHz'),
+            ('cpu_temp', ' °C'),
+            ('ddr_size', ' GB'),
+            ('emmc_size', ' GB'),
+            ('ssd_size', ' GB'),
+        ]):
+            label = QLabel(f'{self.sl.get_text(name)}: -', info)
+            info_layout.addWidget(label, 0, column)
+            self.info_labels[name] = (label, unit)
 
         self.hdmi_model = QLabel(f'{self.sl.get_text("hdmi_model")}: None', info)
         info_layout.addWidget(self.hdmi_model, 0, 6)
 
-        product_name = QLabel(f'{self.sl.get_text("product_name")}: {self._get_product_name()}', info)
-        info_layout.addWidget(product_name, 0, 7)
+        for column, name in enumerate(['product_name', 'fw_version'], 7):
+            label = QLabel(f'{self.sl.get_text(name)}: -', info)
+            info_layout.addWidget(label, 0, column)
+            self.info_labels[name] = (label, '')
 
-        fw_version = QLabel(f'{self.sl.get_text("fw_version")}: {self._get_fw_version()}', info)
-        info_layout.addWidget(fw_version, 0, 8)
+        self.cycle_time = QLabel(f'{self.sl.get_text("cycle_time")}: -', info)
+        info_layout.addWidget(self.cycle_time, 0, 9)
 
         self.content_layout.addWidget(info)
 
-    def _setup_test_table(self, name, row, column, row_span, column_span):
-        module = import_module(name)
+        self._start_sampler()
+
+    def _start_sampler(self):
+        "Read the hardware details, and follow the CPU temperature, off the GUI thread."
+        self.sampler = Sampler()
+        self.sampler.add('cpu_model', '/proc/cpuinfo', lambda text: proc_field(text, 'model name'), interval=None)
+        self.sampler.add('cpu_freq', '/sys/devices/system/cpu/cpu0/cpufreq/scaling_max_freq',
+                         lambda text: round(int(text) / 1000 / 1000, 1), interval=None)
+        temp = find_thermal_zone('cluster0_thermal')
+        if temp:
+            self.sampler.add('cpu_temp', temp, lambda text: int(text) // 1000, interval=1.0, max_interval=4.0)
+        self.sampler.add('ddr_size', '/proc/meminfo',
+                         lambda text: round(int(proc_field(text, 'MemTotal').split()[0]) / 1024 / 1024, 0),
+                         interval=None)
+        self.sampler.add('emmc_size', '/sys/block/mmcblk2/size',
+                         lambda text: round(int(text) / 1000 / 1000 / 2, 1), interval=None)
+        self.sampler.add('ssd_size', '/sys/class/nvme/nvme0/nvme0n1/size',
+                         lambda text: round(int(text) / 1000 / 1000 / 2, 0), interval=None)
+        self.sampler.add('product_name', '/proc/device-tree/model',
+                         lambda text: text.rstrip('\0').replace('spacemit', '').replace('board', '').strip(),
+                         interval=None)
+        self.sampler.add('fw_version', '/etc/bianbu_version', lambda text: text.splitlines()[0].strip(),
+                         interval=None)
+
+        notifier = QSocketNotifier(self.sampler.fileno(), QSocketNotifier.Read, self)
+        notifier.activated.connect(lambda fd: self.sampler.poll())
+        self.notifiers[self.sampler] = [notifier]
+        self.sampler.start()
 
-        box = QGroupBox(module.MODULE_NAME[self.sl.current_lang], self.tests)
+    def _setup_test_table(self, name, row, column, row_span, column_span):
+        box = QGroupBox(self._label(name), self.tests)
         box.setStyleSheet("QGroupBox::title { font-weight: bold; }")
         layout = QVBoxLayout(box)
 
         columns = self.sl.get_text('test_table_head')
 
-        table = QTableWidget(box)
-        table.setStyleSheet('QTableWidget { background-color: black; color: white; }')
+        # A manual test that passed still needs someone to judge it.
+        model = TestTableModel(
+            columns,
+            self._label,
+            pass_text='人工判断' if name == 'manual' else None,
+            parent=self,
+        )
+
+        table = QTableView(box)
+        table.setModel(model)
+        table.setStyleSheet('QTableView { background-color: black; color: white; }')
         table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-        table.setColumnCount(len(columns))
-        table.setHorizontalHeaderLabels(columns)
         for i in range(len(columns)):
             table.horizontalHeader().setSectionResizeMode(i, QHeaderView.Stretch)
         table.verticalHeader().setStyleSheet('QHeaderView::section { width: 32px; }')
-        table.setSelectionBehavior(QTableWidget.SelectRows)
-        table.itemSelectionChanged.connect(self.on_testMethodSelected)
+        # Every row is the same height, so it is set once for the table.
+        font_pixel = self.font_size * table.logicalDpiY() / 72
+        table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        table.verticalHeader().setDefaultSectionSize(int(font_pixel * 2))
+        table.setSelectionBehavior(QAbstractItemView.SelectRows)
+        table.selectionModel().selectionChanged.connect(lambda selected, deselected: self.on_testMethodSelected())
         layout.addWidget(table)
+        self.test_box[name] = box
         self.test_table[name] = table
+        self.test_model[name] = model
 
         status = QStatusBar(box)
         status.showMessage('Not running')
+        summary = QLabel(status)
+        status.addPermanentWidget(summary)
         layout.addWidget(status)
         self.run_status[name] = status
+        self.run_summary[name] = summary
+        self.executor[name] = None
 
         self.tests_layout.addWidget(box, row, column, row_span, column_span)
 
@@ -261,12 +331,14 @@ class MainWindow(QMainWindow):
 
         self._setup_others_test()
 
-        self.wifi_mac_view = WifiMacView(self.others_item)
+        with profiler.phase('wifi MAC'):
+            self.wifi_mac_view = WifiMacView(self.others_item)
         self.others_item_layout.addWidget(self.wifi_mac_view)
 
-        sn = self._get_sn()
-        if sn:
-            self._setup_sn_qrcode(sn)
+        with profiler.phase('SN QR code'):
+            sn = self._get_sn()
+            if sn:
+                self._setup_sn_qrcode(sn)
 
     def _setup_others_test(self):
         others_test = QFrame(self.others_item)
@@ -362,74 +434,41 @@ class MainWindow(QMainWindow):
         self.others_box_layout.addWidget(self.others_status_view)
 
     # [start] Check the usb to see if the device is inserted
-    def usb_loop(self, label, usb_path):
-        while True:
-            if os.path.exists(usb_path):
-                label.setPalette(QPalette(QColor(PASS_COLOR)))
-            else:
-                label.setPalette(QPalette(QColor(255, 255,255)))
-
-            time.sleep(1)
-
-    def _add_usb_test(self, text: str, row: int, column: int, path: str):
+    def _add_usb_test(self, text: str, row: int, column: int, port: str):
         label = QLabel(text, self.usb_frame)
         label.setAutoFillBackground(True)
         label.setPalette(QPalette(QColor('white')))
         label.setAlignment(Qt.AlignCenter)
         self.usb_frame_layout.addWidget(label, row, column)
         self.usb_list.append(label)
-
-        thread = threading.Thread(target=self.usb_loop, args=(label, path))
-        thread.start()
+        self.usb_ports[port] = label
 
     def _setup_usb_frame(self, row, column, row_span, column_span):
         self.usb_frame = QFrame(self.tests)
         self.usb_frame_layout = QGridLayout(self.usb_frame)
 
-        self._add_usb_test('USB A口 (左上) 2.0', 0, 0,
-                           '/sys/bus/usb/devices/usb2/2-1/2-1.1/product')
-        self._add_usb_test('USB A口 (左上) 3.0', 1, 0,
-                           '/sys/bus/usb/devices/usb3/3-1/3-1.1/product')
+        self._add_usb_test('USB A口 (左上) 2.0', 0, 0, 'usb2/2-1/2-1.1')
+        self._add_usb_test('USB A口 (左上) 3.0', 1, 0, 'usb3/3-1/3-1.1')
 
-        self._add_usb_test('USB A口 (左下) 2.0', 0, 1,
-                           '/sys/bus/usb/devices/usb2/2-1/2-1.4/product')
-        self._add_usb_test('USB A口 (左下) 3.0', 1, 1,
-                           '/sys/bus/usb/devices/usb3/3-1/3-1.4/product')
+        self._add_usb_test('USB A口 (左下) 2.0', 0, 1, 'usb2/2-1/2-1.4')
+        self._add_usb_test('USB A口 (左下) 3.0', 1, 1, 'usb3/3-1/3-1.4')
 
-        self._add_usb_test('USB A口 (右上) 2.0', 0, 2,
-                           '/sys/bus/usb/devices/usb2/2-1/2-1.3/product')
-        self._add_usb_test('USB A口 (右上) 3.0', 1, 2,
-                           '/sys/bus/usb/devices/usb3/3-1/3-1.3/product')
+        self._add_usb_test('USB A口 (右上) 2.0', 0, 2, 'usb2/2-1/2-1.3')
+        self._add_usb_test('USB A口 (右上) 3.0', 1, 2, 'usb3/3-1/3-1.3')
 
-        self._add_usb_test('USB A口 (右下) 2.0', 0, 3,
-                           '/sys/bus/usb/devices/usb2/2-1/2-1.2/product')
-        self._add_usb_test('USB A口 (右下) 3.0', 1, 3,
-                           '/sys/bus/usb/devices/usb3/3-1/3-1.2/product')
+        self._add_usb_test('USB A口 (右下) 2.0', 0, 3, 'usb2/2-1/2-1.2')
+        self._add_usb_test('USB A口 (右下) 3.0', 1, 3, 'usb3/3-1/3-1.2')
 
         self.tests_layout.addWidget(self.usb_frame, row, column, row_span, column_span)
     # [end] Check the usb to see if the device is inserted
 
-    def _create_qrcode(self, data):
-        qr = qrcode.QRCode(
-            version=1,
-            error_correction=qrcode.constants.ERROR_CORRECT_L,
-            box_size=8,
-            border=0,
-        )
-        qr.add_data(data)
-        qr.make(fit=True)
-
-        img = qr.make_image(fill='black', back_color='white')
-        qt_image = ImageQt(img).convertToFormat(QImage.Format_RGB32)
-        return QPixmap.fromImage(qt_image)
-
     def _setup_sn_qrcode(self, sn):
         sn_qrcode = QFrame(self.others_item)
         sn_qrcode_layout = QVBoxLayout(sn_qrcode)
 
         qr_label = QLabel(sn_qrcode)
         qr_label.setAlignment(Qt.AlignCenter)
-        qr_label.setPixmap(self._create_qrcode(sn))
+        qr_label.setPixmap(create_qrcode(sn))
         sn_qrcode_layout.addWidget(qr_label)
 
         sn_label = QLabel(f'{self.sl.get_text("sn")}: {sn}', sn_qrcode)
@@ -447,43 +486,57 @@ class MainWindow(QMainWindow):
     def project(self):
         return self._project
 
-    def _get_text(self, subModuleName, subModule, key):
-        module = import_module(subModule.parent.path)
-        testcase = getattr(module, subModuleName)
-        if hasattr(testcase, 'LANGUAGES'):
-            langs = getattr(testcase, 'LANGUAGES')
-            lang = langs.get(self.sl.current_lang)
-            if lang is not None:
-                text = lang.get(key)
-                if text is not None:
-                    return text
-
-        return key
+    def _label(self, path):
+        "The name of a test package, case or method in the current language."
+        return catalogue.current().get(self.sl.current_lang, path, path.rpartition('.')[2])
 
-    def _add_test_module(self, parentNode, testModule):
+    def set_language(self, lang):
+        "Show the tests in another language."
+        self.sl.current_lang = lang
+        columns = self.sl.get_text('test_table_head')
+        for name, model in self.test_model.items():
+            self.test_box[name].setTitle(self._label(name))
+            model.relabel(columns)
+        for sensor in self.info_labels:
+            self._show_info(sensor, self.sampler.value(sensor) if sensor in self.sampler.sensors else None)
+
+    def _test_methods(self, testModule):
+        "The test methods in a test module, in the order they are shown."
+        testMethods = []
         for subModuleName, subModule in sorted(testModule.items()):
             if isinstance(subModule, TestModule):
-                self._add_test_module(parentNode, subModule)
+                testMethods.extend(self._test_methods(subModule))
             else:
-                for testMethod_name, testMethod in sorted(subModule.items()):
-                    self.test_list.setdefault(parentNode, []).append(testMethod.path)
-
-                    table = self.test_table[parentNode]
-                    row = table.rowCount()
-                    table.insertRow(row)
-                    item = QTableWidgetItem(self._get_text(subModuleName, subModule, subModuleName))
-                    table.setItem(row, 0, item)
-                    item = QTableWidgetItem(self._get_text(subModuleName, subModule, testMethod_name))
-                    table.setItem(row, 1, item)
-                    item = QTableWidgetItem('')
-                    item.setTextAlignment(Qt.AlignCenter)
-                    item.setData(Qt.UserRole, testMethod.path)
-                    table.setItem(row, 2, item)
-
-                    logical_dpi = table.logicalDpiY()
-                    font_pixel = self.font_size * logical_dpi / 72
-                    row_height = int(font_pixel * 2)
-                    table.setRowHeight(row, row_height)
+                testMethods.extend(testMethod for testMethod_name, testMethod in sorted(subModule.items()))
+        return testMethods
+
+    def _add_test_methods(self, parentNode, testMethods):
+        "Add rows for test methods to the table of a top-level module."
+        self.test_list.setdefault(parentNode, []).extend(testMethod.path for testMethod in testMethods)
+        self.test_model[parentNode].add(testMethods)
+
+    def _add_tests(self):
+        "Fill the test tables from the project."
+        self.test_list = {}
+        for testModule_name, testModule in sorted(self.project.items()):
+            if testModule_name in self.test_table:
+                self.test_model[testModule_name].clear()
+                self._add_test_methods(testModule_name, self._test_methods(testModule))
+                self._update_summary(testModule_name)
+            self.executor.setdefault(testModule_name, None)
+
+    def _update_summary(self, module):
+        "Show the results so far of the tests in a module."
+        node = self.project.get(module)
+        if node is None or module not in self.run_summary:
+            return
+        # The model keeps the counts, so this costs nothing to work out.
+        self.run_summary[module].setText('T:%s P:%s F:%s E:%s' % (
+            node.test_count,
+            node.count_status([TestMethod.STATUS_PASS]),
+            node.count_status([TestMethod.STATUS_FAIL, TestMethod.STATUS_UNEXPECTED_SUCCESS]),
+            node.count_status([TestMethod.STATUS_ERROR, TestMethod.STATUS_TIMEOUT]),
+        ))
 
     @project.setter
     def project(self, project):
@@ -495,13 +548,24 @@ class MainWindow(QMainWindow):
 
         # Populate the initial tree nodes. This is recursive, because
         # the tree could be of arbitrary depth.
-        for testModule_name, testModule in sorted(project.items()):
-            self._add_test_module(testModule_name, testModule)
-            self.executor[testModule_name] = None
+        self._add_tests()
+
+        self._update_cycle_time()
 
         self.showFullScreen()
 
-        TestMethod.bind('status_update', self.on_nodeStatusUpdate)
+        # Results arrive in bursts; show each burst in one pass over the tables.
+        TestMethod.bind('status_update', self.on_nodesStatusUpdate, self.coalescer)
+
+        # Pick up any runs left in progress by an earlier session.
+        executor_class = project.executor_class or EventDrivenExecutor
+        for executor in executor_class.attach_running(project):
+            if executor.module in self.executor:
+                self.run_status[executor.module].showMessage('Running...')
+                self.run_all_button.setDisabled(True)
+                self.run_selected_button.setDisabled(True)
+                self.stop_button.setDisabled(False)
+                self._watch(executor)
 
     ######################################################
     # TK Main loop
@@ -509,40 +573,64 @@ class MainWindow(QMainWindow):
 
     def mainloop(self):
         pipeline = 'gst-pipeline: spacemitsrc location=/opt/factorytest/res/camtest_sensor0_mode0.json close-dmabuf=1 ! videoconvert ! video/x-raw,format=BGRx ! autovideosink sync=0'
-        self.media_player.setMedia(QMediaContent(QUrl(pipeline)))
-        self.media_player.play()
+        with profiler.phase('run all'):
+            self.cmd_run_all()
 
-        self.hdmi_thread = threading.Thread(target=self.hdmi_loop)
-        self.hdmi_thread.start()
+        with profiler.phase('camera'):
+            self.media_player.setMedia(QtMultimedia.QMediaContent(QUrl(pipeline)))
+            self.media_player.play()
+
+        with profiler.phase('hotplug'):
+            self._start_hotplug()
 
         self.audio_thread = threading.Thread(target=lambda: self.audio_loop())
         self.audio_thread.start()
 
-        self.cmd_run_all()
-
         self.root.exec_()
 
-    def hdmi_loop(self):
-        card = '/sys/class/drm/card2-HDMI-A-1'
-        if os.path.exists(card):
-            while True:
-                with open(f'{card}/status', 'r') as f:
-                    status = f.readline().strip()
-                    if status == 'connected':
-                        break
-
-                time.sleep(1)
-
-            cmd = f'cat {card}/edid | edid-decode'
-            edid_proc = subprocess.run(cmd, shell=True, capture_output=True, text=True)
-            for line in edid_proc.stdout.splitlines():
-                if line.strip().startswith('Manufacturer'):
-                    manufacturer = line.strip().split(':')[1].strip()
+    def _start_hotplug(self):
+        "Follow the USB ports and the HDMI connector as devices come and go."
+        try:
+            self.hotplug = HotplugMonitor()
+        except OSError as e:
+            print(f'Hotplug events are not available: {e}')
+            return
+        for port in self.usb_ports:
+            self.hotplug.watch_usb_port(port)
+        self.hotplug.watch_connector(HDMI_CONNECTOR)
+
+        notifier = QSocketNotifier(self.hotplug.fileno(), QSocketNotifier.Read, self)
+        notifier.activated.connect(lambda fd: self.hotplug.poll())
+        self.notifiers[self.hotplug] = [notifier]
+
+        # Show what is plugged in already; from now on, only changes are read.
+        self.hotplug.scan()
+
+    def on_samplerSample(self, sampler, sensor, value):
+        "Event handler: a hardware detail has been read, or has changed"
+        self._show_info(sensor, value)
+
+    def _show_info(self, sensor, value):
+        label, unit = self.info_labels[sensor]
+        text = '-' if value is None else f'{value}{unit}'
+        label.setText(f'{self.sl.get_text(sensor)}: {text}')
+
+    def on_hotplugUsbPort(self, monitor, port, present):
+        "Event handler: a device has been plugged into or taken out of a USB port"
+        label = self.usb_ports[port]
+        if present:
+            label.setPalette(QPalette(QColor(PASS_COLOR)))
+        else:
+            label.setPalette(QPalette(QColor(255, 255,255)))
 
-                if line.strip().startswith('Model'):
-                    model = line.strip().split(':')[1].strip()
+    def on_hotplugConnector(self, monitor, connector, status):
+        "Event handler: a display has been connected or disconnected"
+        if status != 'connected':
+            return
 
-            self.hdmi_model.setText(f'{self.sl.get_text("hdmi_model")}: {manufacturer} {model}')
+        edid = probe.read_edid(connector)
+        manufacturer, model = (edid.manufacturer, edid.model) if edid else ('', '')
+        self.hdmi_model.setText(f'{self.sl.get_text("hdmi_model")}: {manufacturer} {model}')
 
     def _play_wav(self, device, volume, path):
         cmd = f'amixer -c 1 cset numid=1,iface=MIXER,name="DAC Playback Volume" {volume}'
@@ -617,13 +705,15 @@ class MainWindow(QMainWindow):
     #     self.update_lcd_color()
 
     def cmd_poweroff(self):
-        self.media_player.stop()
+        if lazy.built(self, 'media_player'):
+            self.media_player.stop()
         self.stop()
         # self.root.quit()
         os.system('poweroff')
 
     def cmd_reboot(self):
-        self.media_player.stop()
+        if lazy.built(self, 'media_player'):
+            self.media_player.stop()
         self.stop()
         # self.root.quit()
         os.system('reboot')
@@ -644,7 +734,10 @@ class MainWindow(QMainWindow):
         # If the executor isn't currently running, we can
         # start a test run.
         for module, executor in self.executor.items():
-            if not executor or not executor.is_running:
+            if module in self.discovering:
+                # Start as soon as all of its tests have been found.
+                self.pending_runs.add(module)
+            elif self.test_list.get(module) and (not executor or not executor.is_running):
                 self.run(module)
 
     def cmd_run_selected(self, event=None):
@@ -652,11 +745,8 @@ class MainWindow(QMainWindow):
         for module, table in self.test_table.items():
             # If the executor isn't currently running, we can
             # start a test run.
-            labels = []
-            for item in table.selectedItems():
-                data = item.data(Qt.UserRole)
-                if data is not None:
-                    labels.append(data)
+            model = self.test_model[module]
+            labels = [model.path(row) for row in sorted(index.row() for index in table.selectionModel().selectedRows())]
 
             if labels and (not self.executor[module] or
                            not self.executor[module].is_running):
@@ -829,6 +919,25 @@ class MainWindow(QMainWindow):
     def cmd_peripheral_test(self):
         self.peripheral_test_view.exec_()
 
+    ######################################################
+    # Parts of the GUI built when first used
+    ######################################################
+
+    @lazy
+    def media_player(self):
+        "The player showing the camera, in the camera box."
+        video_widget = QtMultimediaWidgets.QVideoWidget(self.camera_box)
+        media_player = QtMultimedia.QMediaPlayer()
+        media_player.setVideoOutput(video_widget)
+        self.camera_box_layout.addWidget(video_widget)
+        return media_player
+
+    @lazy
+    def peripheral_test_view(self):
+        "The peripheral test dialog."
+        from cricket.peripheraltestview import PeripheralTestWindow
+        return PeripheralTestWindow(self)
+
     ######################################################
     # GUI Callbacks
     ######################################################
@@ -844,104 +953,40 @@ class MainWindow(QMainWindow):
             with open(path, 'r') as f:
                 return f.readline().strip()
 
-    def _get_fw_version(self):
-        path = '/etc/bianbu_version'
-        if os.path.exists(path):
-            with open(path, 'r') as f:
-                return f.readline().strip()
-
-    def _get_product_name(self):
-        path = '/proc/device-tree/model'
-        if os.path.exists(path):
-            with open(path, 'r') as f:
-                return f.readline().replace('spacemit', '').replace('board', '').strip()
-
-    def _get_SSD_size(self):
-        path = '/sys/class/nvme/nvme0/nvme0n1/size'
-        if os.path.exists(path):
-            with open(path, 'r') as f:
-                return round(int(f.readline().strip()) / 1000 / 1000 / 2, 0)
-
-    def _get_eMMC_size(self):
-        path = '/sys/block/mmcblk2/size'
-        if os.path.exists(path):
-            with open(path, 'r') as f:
-                return round(int(f.readline().strip()) / 1000 / 1000 / 2, 1)
-
-    def _get_DDR_size(self):
-        with open('/proc/meminfo', 'r') as f:
-            for line in f.readlines():
-                if line.startswith('MemTotal:'):
-                    return round(int(line.split()[1]) / 1024 / 1024, 0)
-
-    def _get_CPU_model(self):
-        with open('/proc/cpuinfo', 'r') as f:
-            for line in f.readlines():
-                if line.startswith('model name'):
-                    return line.split(':')[1].strip()
+    def on_nodesStatusUpdate(self, nodes):
+        "Event handler: a batch of nodes on the tree have received status updates"
+        by_module = {}
+        for node in nodes:
+            by_module.setdefault(node.path.split('.')[0], {})[node.path] = node
 
-    def _get_CPU_freq(self):
-        with open('/sys/devices/system/cpu/cpu0/cpufreq/scaling_max_freq', 'r') as f:
-            return round(int(f.readline().strip()) / 1000 / 1000, 1)
+        for module, updated in by_module.items():
+            self._update_summary(module)
+            if module in self.test_model:
+                self.test_model[module].update(updated.values())
 
-    # cpu temp part
-    def on_cpuTempUpdate(self):
-        self.cpu_temp.setText(f'{self.sl.get_text("cpu_temp")}: {self._get_CPU_Temp()} °C')
-
-    def _get_CPU_Temp(self):
-        thermal_base_path = "/sys/class/thermal/"
-        ret = "None"
+    def on_testProgress(self, executor):
+        "Event handler: the runner has produced output; process it, generating GUI updates"
+        if executor.poll():
+            # Stop watching any pipe the runner has closed.
+            open_fds = executor.filenos()
+            for notifier in self.notifiers.get(executor.module, []):
+                if notifier.socket() not in open_fds:
+                    notifier.setEnabled(False)
+            if not open_fds:
+                # The runner hasn't exited yet; look again shortly.
+                QTimer.singleShot(int(EXIT_POLL_INTERVAL * 1000), lambda: self._poll_again(executor))
+        else:
+            self._stop_notifiers(executor.module)
 
-        try:
-            # Traverse the thermal_zone* directory
-            for zone in os.listdir(thermal_base_path):
-                zone_path = os.path.join(thermal_base_path, zone)
-                type_path = os.path.join(zone_path, "type")
-
-                # Check whether the type file exists
-                if os.path.isfile(type_path):
-                    with open(type_path, 'r') as type_file:
-                        type_content = type_file.read().strip()
-
-                        # Check whether the type file content matches
-                        if type_content == "cluster0_thermal":
-                            temp_path = os.path.join(zone_path, "temp")
-
-                            if os.path.isfile(temp_path):
-                                with open(temp_path, 'r') as temp_file:
-                                    temp_content = temp_file.read().strip()
-                                    temp_content = int(temp_content)//1000
-                                    ret = str(temp_content)
-        except Exception as e:
-            print(f"An error occurred when getting cpu temperature: {e}")
-
-        return ret
-
-    def on_nodeStatusUpdate(self, node):
-        "Event handler: a node on the tree has received a status update"
-        module = node.path.split('.')[0]
-        table = self.test_table[module]
-        columnCount = table.columnCount()
-        for row in range(table.rowCount()):
-            item = table.item(row, columnCount-1)
-            if item is not None:
-                if item.data(Qt.UserRole) == node.path:
-                    if module == 'manual' and node.status == TestMethod.STATUS_PASS:
-                        item.setText('人工判断')
-                        break
-
-                    for column in range(columnCount):
-                        _item = table.item(row, column)
-                        _item.setBackground(QColor(STATUS[node.status]['color']))
-
-                    item.setText(STATUS[node.status]['description'])
-
-                    break
+    def _poll_again(self, executor):
+        "Poll a runner that has closed its pipes, unless it has been replaced since."
+        if self.executor.get(executor.module) is executor:
+            self.on_testProgress(executor)
 
-    def on_testProgress(self, executor):
-        "Event handler: a periodic update to poll the runner for output, generating GUI updates"
-        if executor and executor.poll():
-            QTimer.singleShot(100, lambda: self.on_testProgress(executor))
+    def _stop_notifiers(self, module):
+        for notifier in self.notifiers.pop(module, []):
+            notifier.setEnabled(False)
+            notifier.deleteLater()
 
     def on_executorStatusUpdate(self, event, module, update):
         "The executor has some progress to report"
@@ -950,9 +995,18 @@ class MainWindow(QMainWindow):
 
     def on_executorTestStart(self, event, module, test_path):
         "The executor has started running a new test."
+        profiler.ready()
+
         # Update status line
         self.run_status[module].showMessage('Running %s...' % test_path)
 
+    def on_executorTestOutput(self, event, module, test_path, output):
+        "A running test has written some output."
+        # Show the latest line of output as progress.
+        lines = [line.strip() for line in output.splitlines() if line.strip()]
+        if lines:
+            self.run_status[module].showMessage(lines[-1])
+
     def on_executorTestEnd(self, event, module, test_path, result, remaining_time):
         "The executor has finished running a test."
         self.run_status[module].showMessage('')
@@ -1024,6 +1078,7 @@ class MainWindow(QMainWindow):
 
         # Drop the reference to the executor
         self.executor[module] = None
+        self._update_cycle_time()
 
         # Reset the buttons
         self.reset_button_states_on_end()
@@ -1036,6 +1091,21 @@ class MainWindow(QMainWindow):
 
         # Drop the reference to the executor
         self.executor[module] = None
+        self._update_cycle_time()
+
+    def _update_cycle_time(self):
+        "Show how long a full run of the station is expected to take."
+        history = load_history()
+        # Modules run side by side, so the slowest one sets the pace.
+        typical = [history.cycle_time(module, paths) for module, paths in self.test_list.items()]
+        slow = [history.cycle_time(module, paths, 0.9) for module, paths in self.test_list.items()]
+        typical = [estimate for estimate in typical if estimate is not None]
+        slow = [estimate for estimate in slow if estimate is not None]
+        if typical:
+            text = '%s (P90 %s)' % (format_duration(max(typical)), format_duration(max(slow)))
+        else:
+            text = '-'
+        self.cycle_time.setText(f'{self.sl.get_text("cycle_time")}: {text}')
 
     def reset_button_states_on_end(self):
         "A test run has ended and we should enable or disable buttons as appropriate."
@@ -1058,7 +1128,7 @@ class MainWindow(QMainWindow):
 
         is_selected = False
         for table in self.test_table.values():
-            if table.selectedItems():
+            if table.selectionModel().hasSelection():
                 is_selected = True
 
         if is_running:
@@ -1094,10 +1164,91 @@ class MainWindow(QMainWindow):
         # self.progress_value.set(0)
 
         # Create the runner
-        self.executor[module] = Executor(self.project, module, len(labels), labels)
+        executor_class = self.project.executor_class or EventDrivenExecutor
+        self._watch(executor_class(self.project, module, len(labels), labels))
+
+    def _watch(self, executor):
+        "Start handling the output of an executor as soon as it arrives."
+        module = executor.module
+        self.executor[module] = executor
+        self._stop_notifiers(module)
+        self.notifiers[module] = []
+        for fd in executor.filenos():
+            notifier = QSocketNotifier(fd, QSocketNotifier.Read, self)
+            notifier.activated.connect(lambda fd, executor=executor: self.on_testProgress(executor))
+            self.notifiers[module].append(notifier)
+
+    def discover(self, discovery):
+        """Follow a discovery running in the background.
+
+        If there are no tests to show yet, they are shown as they are
+        found; otherwise, the tables are brought up to date when
+        discovery is done.
+        """
+        if not self.test_list:
+            self.discovering = set(self.test_table)
+        self.notifiers[discovery] = []
+        for fd in discovery.filenos():
+            notifier = QSocketNotifier(fd, QSocketNotifier.Read, self)
+            notifier.activated.connect(lambda fd, discovery=discovery: self.on_discoveryProgress(discovery))
+            self.notifiers[discovery].append(notifier)
+
+    def on_discoveryProgress(self, discovery):
+        "Event handler: the discoverer has produced output."
+        if discovery.poll():
+            open_fds = discovery.filenos()
+            for notifier in self.notifiers.get(discovery, []):
+                if notifier.socket() not in open_fds:
+                    notifier.setEnabled(False)
+
+    def on_discoveryTestsFound(self, discovery, tests):
+        "Event handler: some tests have been found."
+        self.project.metadata.update(discovery.metadata)
+        catalogue.current().update(discovery.metadata)
+        found = {}
+        for test in tests:
+            module = test.split('.', 1)[0]
+            if module in self.discovering:
+                found.setdefault(module, []).append(self.project.confirm_exists(test))
+        for module, testMethods in found.items():
+            self.test_box[module].setTitle(self._label(module))
+            self._add_test_methods(module, testMethods)
+            self._update_summary(module)
+
+    def on_discoveryModuleFound(self, discovery, module):
+        "Event handler: all the tests of a module have been found."
+        self.discovering.discard(module)
+        if module in self.pending_runs:
+            self.pending_runs.discard(module)
+            if self.test_list.get(module):
+                self.run(module)
 
-        # Queue the first progress handling event
-        QTimer.singleShot(100, lambda: self.on_testProgress(self.executor[module]))
+    def on_discoveryEnd(self, discovery):
+        "Event handler: discovery is done."
+        self._stop_notifiers(discovery)
+        self.discovering.clear()
+        self.pending_runs.clear()
+
+        for module in discovery.failed:
+            print('Load failed:', module)
+            parentNode = module.split('.', 1)[0]
+            if parentNode in self.run_status:
+                self.run_status[parentNode].showMessage('Load failed: %s' % module)
+        if discovery.errors:
+            print('\n'.join(discovery.errors))
+
+        tests = [test for test in discovery.tests if not test.startswith(FAILED_TEST_PREFIX)]
+        if not tests:
+            # Keep the tests we have; the next start will look again.
+            return
+
+        old_tests = set(path for paths in self.test_list.values() for path in paths)
+        old_metadata = dict(self.project.metadata)
+        self.project.refresh(tests, discovery.errors, discovery.metadata)
+        catalogue.current().update(discovery.metadata)
+        if set(tests) != old_tests or discovery.metadata != old_metadata:
+            self._add_tests()
+        self._update_cycle_time()
 
     def stop(self):
         "Stop the test suite."
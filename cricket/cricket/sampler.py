@@ -0,0 +1,227 @@
+"""Reading sensors and device details from sysfs and /proc.
+
+A sensor is a file that is read again and again: a temperature, a
+frequency, a link's carrier. Its path is resolved once and the file is
+kept open; each reading is a `pread` at offset 0 of the same file
+descriptor, so there is no lookup or open per sample.
+
+A Sampler reads its sensors in a thread of its own, each at its own
+rate. A sensor whose reading hasn't changed is read less and less
+often (down to `max_interval`), and as often as asked for again as
+soon as it changes. A sensor with no interval is read once, for
+details that don't change, such as the size of a disk. The values, and
+a short history of each, are kept for anyone to look at. Changed
+values are announced when the sampler is polled, so a GUI never
+touches the filesystem itself.
+"""
+from __future__ import absolute_import
+
+import collections
+import os
+import threading
+import time
+
+from cricket.events import EventSource
+
+THERMAL_ROOT = '/sys/class/thermal'
+
+
+def find_thermal_zone(zone_type, root=THERMAL_ROOT):
+    "The temperature file of the thermal zone of a type, or None."
+    try:
+        zones = sorted(os.listdir(root))
+    except OSError:
+        return None
+    for zone in zones:
+        try:
+            with open(os.path.join(root, zone, 'type')) as f:
+                if f.read().strip() == zone_type:
+                    return os.path.join(root, zone, 'temp')
+        except (IOError, OSError):
+            continue
+    return None
+
+
+def proc_field(text, key):
+    """The value of a `key: value` line, as in /proc/cpuinfo and /proc/meminfo.
+
+    Raises ValueError if there is no such line.
+    """
+    for line in text.splitlines():
+        name, sep, value = line.partition(':')
+        if sep and name.strip() == key:
+            return value.strip()
+    raise ValueError('No %s in %r' % (key, text[:40]))
+
+
+class Sensor(object):
+    """A file that is read repeatedly, through a descriptor kept open.
+
+    `parse` turns the text of the file into a value. Readings are kept
+    in `history`, as (time, value), the latest last.
+    """
+    def __init__(self, name, path, parse=str.strip, interval=1.0, max_interval=None, history=60):
+        self.name = name
+        self.path = path
+        self.parse = parse
+        self.interval = interval
+        self.max_interval = max_interval if max_interval is not None else (interval or 0) * 8
+        self.history = collections.deque(maxlen=history)
+
+        # How long to wait for the next reading, and (on the clock of
+        # the sampler reading it) when that is due; None when the
+        # sensor won't be read again.
+        self.delay = interval
+        self.due = 0.0
+        self._fd = None
+
+    def __repr__(self):
+        return u'Sensor %s (%s)' % (self.name, self.path)
+
+    @property
+    def value(self):
+        "The latest reading, or None if there hasn't been one."
+        return self.history[-1][1] if self.history else None
+
+    def read(self):
+        """Read the file again, and return its value.
+
+        The value is None if the file can't be read or parsed; it is
+        opened again on the next reading.
+        """
+        try:
+            if self._fd is None:
+                self._fd = os.open(self.path, os.O_RDONLY)
+            chunks = []
+            offset = 0
+            while True:
+                chunk = os.pread(self._fd, 4096, offset)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+                offset += len(chunk)
+            value = self.parse(b''.join(chunks).decode('utf-8', 'replace'))
+        except (OSError, ValueError, IndexError):
+            self.close()
+            value = None
+        return value
+
+    def sample(self, now=None):
+        "Take a reading. Returns True if the value has changed."
+        return self.record(self.read(), now)
+
+    def record(self, value, now=None):
+        "Add a reading to the history. Returns True if the value has changed."
+        changed = not self.history or value != self.value
+        self.history.append((time.time() if now is None else now, value))
+        if self.interval:
+            # Back off while the value is steady.
+            self.delay = self.interval if changed else min(self.delay * 2, self.max_interval)
+        return changed
+
+    def close(self):
+        if self._fd is not None:
+            os.close(self._fd)
+            self._fd = None
+
+
+class Sampler(EventSource):
+    """Reads sensors at their own rates, in a thread of its own.
+
+    Emits:
+        * 'sample' with sensor (its name) and value, when a sensor's value has
+          changed (including its first reading).
+    """
+    def __init__(self):
+        self.sensors = {}
+        self._lock = threading.Lock()
+        self._wake = threading.Event()
+        self._thread = None
+        self._stopping = False
+
+        # The sensors whose value has changed since the last poll.
+        self._changed = {}
+        self._notify_read, self._notify_write = os.pipe()
+        os.set_blocking(self._notify_read, False)
+
+    def add(self, name, path, parse=str.strip, interval=1.0, max_interval=None, history=60):
+        "Add a sensor; see Sensor. Returns it."
+        sensor = Sensor(name, path, parse, interval, max_interval, history)
+        with self._lock:
+            self.sensors[name] = sensor
+        self._wake.set()
+        return sensor
+
+    def value(self, name):
+        "The latest value of a sensor, or None."
+        with self._lock:
+            return self.sensors[name].value
+
+    def history(self, name):
+        "The readings of a sensor, as a list of (time, value)."
+        with self._lock:
+            return list(self.sensors[name].history)
+
+    def fileno(self):
+        "Readable when there are changed values to poll."
+        return self._notify_read
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name='sampler')
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        "Stop sampling, and close everything the sampler has open."
+        self._stopping = True
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        for sensor in self.sensors.values():
+            sensor.close()
+        os.close(self._notify_read)
+        os.close(self._notify_write)
+
+    def sample(self, now=None):
+        """Read every sensor that is due, and return how long until the next one is.
+
+        Returns None if no sensor will need reading again.
+        """
+        now = time.monotonic() if now is None else now
+        with self._lock:
+            sensors = list(self.sensors.values())
+        changed = {}
+        for sensor in sensors:
+            if sensor.due is not None and sensor.due <= now:
+                value = sensor.read()
+                with self._lock:
+                    if sensor.record(value):
+                        changed[sensor.name] = value
+                sensor.due = now + sensor.delay if sensor.interval else None
+        if changed:
+            with self._lock:
+                notify = not self._changed
+                self._changed.update(changed)
+            if notify:
+                os.write(self._notify_write, b'.')
+        due = [sensor.due for sensor in sensors if sensor.due is not None]
+        return max(min(due) - now, 0.0) if due else None
+
+    def _run(self):
+        while not self._stopping:
+            delay = self.sample()
+            self._wake.wait(delay)
+            self._wake.clear()
+
+    def poll(self):
+        "Announce the values that have changed since the last poll."
+        try:
+            while os.read(self._notify_read, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        with self._lock:
+            changed, self._changed = self._changed, {}
+        for name, value in changed.items():
+            self.emit('sample', sensor=name, value=value)
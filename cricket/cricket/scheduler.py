@@ -0,0 +1,233 @@
+"""Resource-aware parallel execution of test suites.
+
+A TestCase can declare the hardware it needs through a ``RESOURCES``
+class attribute, e.g.::
+
+    class Eth0Test(TestCase):
+        RESOURCES = ('eth0',)
+
+Test cases whose resources don't overlap are run at the same time.
+A test case that declares nothing is treated as needing *everything*,
+so undeclared tests keep running one after another. Declare an empty
+tuple for tests that don't touch any shared resource.
+
+Results are merged back into the normal piped result stream. With the
+line protocol each test is written as one complete record once it has
+finished, so the reading side doesn't need to know the tests were run
+concurrently; the framed protocol lets tests interleave.
+"""
+from __future__ import absolute_import
+
+import sys
+import threading
+
+from cricket.compat import unittest
+from cricket.pipes import PipedTestResult, PipedTestRunner, open_record_stream
+from cricket.watchdog import Watchdog
+
+
+def flatten(suite):
+    "Flatten a (possibly nested) test suite into a list of tests, in run order."
+    tests = []
+    stack = [iter([suite])]
+    while stack:
+        try:
+            item = next(stack[-1])
+        except StopIteration:
+            stack.pop()
+            continue
+        if isinstance(item, unittest.TestSuite):
+            stack.append(iter(item))
+        else:
+            tests.append(item)
+    return tests
+
+
+def declared_resources(test_class):
+    """Return the set of resources declared by a test class.
+
+    Returns None if the class doesn't declare its resources; such a
+    class conflicts with every other test.
+    """
+    resources = getattr(test_class, 'RESOURCES', None)
+    if resources is None:
+        return None
+    if isinstance(resources, str):
+        return frozenset([resources])
+    return frozenset(resources)
+
+
+class SchedulingUnit(object):
+    """A group of tests from the same test case class.
+
+    Tests from one class share class-level fixtures, so a class is the
+    smallest unit that can be scheduled.
+    """
+    def __init__(self, test_class, tests):
+        self.test_class = test_class
+        self.tests = tests
+        self.resources = declared_resources(test_class)
+
+    def __repr__(self):
+        return u'SchedulingUnit %s.%s' % (self.test_class.__module__, self.test_class.__name__)
+
+    def conflicts(self, other):
+        "Can this unit run at the same time as the other unit?"
+        if self.resources is None or other.resources is None:
+            return True
+        return bool(self.resources & other.resources)
+
+
+def build_units(suite):
+    "Split a suite into schedulable units, grouping consecutive tests by class."
+    units = []
+    for test in flatten(suite):
+        if units and units[-1].test_class is test.__class__:
+            units[-1].tests.append(test)
+        else:
+            units.append(SchedulingUnit(test.__class__, [test]))
+    return units
+
+
+def build_conflict_graph(units):
+    """Build the conflict graph between units.
+
+    Returns a list containing, for each unit, the set of indices
+    of the units it can't run alongside.
+    """
+    graph = [set() for unit in units]
+    for i, unit in enumerate(units):
+        for j in range(i + 1, len(units)):
+            if unit.conflicts(units[j]):
+                graph[i].add(j)
+                graph[j].add(i)
+    return graph
+
+
+class ThreadedStdout(object):
+    """A stdout replacement that routes writes to a per-thread buffer.
+
+    Threads that haven't registered a buffer write to the original stream.
+    """
+    def __init__(self, default):
+        self._default = default
+        self._local = threading.local()
+
+    def capture(self, buffer):
+        self._local.buffer = buffer
+
+    def release(self):
+        self._local.buffer = None
+
+    @property
+    def _target(self):
+        buffer = getattr(self._local, 'buffer', None)
+        return self._default if buffer is None else buffer
+
+    def write(self, data):
+        return self._target.write(data)
+
+    def flush(self):
+        return self._target.flush()
+
+    def __getattr__(self, name):
+        return getattr(self._target, name)
+
+
+class ScheduledTestResult(PipedTestResult):
+    """A piped test result that can run alongside other results.
+
+    Output is captured per thread. Unless the protocol allows tests to
+    be interleaved, each test is written to the shared record stream as
+    a single unit once it has finished.
+    """
+    def __init__(self, records, stdout, use_old_discovery=False, watchdog=None):
+        self.threaded_stdout = stdout
+        self._pending = None
+        super(ScheduledTestResult, self).__init__(records.stream, use_old_discovery, records, watchdog)
+
+    def _capture_output(self):
+        self._stdout = self.records.open_output(self._token, self._output_name())
+        self.threaded_stdout.capture(self._stdout)
+
+    def _write_start(self, body):
+        if self.records.interleaved:
+            super(ScheduledTestResult, self)._write_start(body)
+        else:
+            self._pending = body
+
+    def _write_end(self, body):
+        if self.records.interleaved:
+            super(ScheduledTestResult, self)._write_end(body)
+        else:
+            self._complete(body)
+            self.records.write_record(self._pending, body)
+            self._pending = None
+
+
+class ScheduledTestRunner(PipedTestRunner):
+    """A piped test runner that runs non-conflicting test cases in parallel.
+
+    At most `jobs` test units are run at the same time. Units are
+    started in suite order; a unit that has to wait also holds back any
+    later unit it conflicts with, so a test that needs everything isn't
+    starved by tests that keep jumping the queue.
+    """
+    def __init__(self, stream=sys.stdout, use_old_discovery=False, protocol=None, jobs=2):
+        super(ScheduledTestRunner, self).__init__(stream, use_old_discovery, protocol)
+        self.jobs = max(jobs, 1)
+
+    def _run_unit(self, index, unit, records, stdout, watchdog, done):
+        result = ScheduledTestResult(records, stdout, self.use_old_discovery, watchdog)
+        try:
+            unittest.TestSuite(unit.tests)(result)
+        finally:
+            stdout.release()
+            done(index)
+
+    def run(self, test):
+        "Run the given test case or test suite."
+        old_stdout = sys.stdout
+        stdout = ThreadedStdout(old_stdout)
+        sys.stdout = stdout
+
+        records = open_record_stream(self.stream, self.protocol)
+        records.start_heartbeat()
+        units = build_units(test)
+        graph = build_conflict_graph(units)
+        watchdog = Watchdog()
+
+        pending = list(range(len(units)))
+        running = set()
+        condition = threading.Condition()
+
+        def done(index):
+            with condition:
+                running.discard(index)
+                condition.notify()
+
+        with condition:
+            while pending or running:
+                blocked = set()
+                for index in list(pending):
+                    if len(running) >= self.jobs:
+                        break
+                    if graph[index] & (running | blocked):
+                        blocked.add(index)
+                        continue
+                    pending.remove(index)
+                    running.add(index)
+                    thread = threading.Thread(
+                        target=self._run_unit,
+                        args=(index, units[index], records, stdout, watchdog, done)
+                    )
+                    thread.daemon = True
+                    thread.start()
+                if running:
+                    condition.wait()
+
+        # Report end of test run
+        records.close()
+
+        # Restore the stdout reference
+        sys.stdout = old_stdout
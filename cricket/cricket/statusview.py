@@ -1,11 +1,18 @@
-from PyQt5.QtCore import Qt, QTimer
+from PyQt5.QtCore import Qt, QTimer, QSocketNotifier
 from PyQt5.QtGui import QColor, QKeyEvent, QMouseEvent, QPixmap, QImage, QPalette
 from PyQt5.QtWidgets import QFrame, QHBoxLayout, QVBoxLayout, QGridLayout, QLabel, QProgressBar, QSlider
-import subprocess
+from cricket import probe
 from cricket.lang import SimpleLang
 from cricket.loggermanager import LoggerManager
 from cricket.macro import *
 from cricket.utils import *
+from cricket.wpa import WpaControl
+
+WIFI_INTERFACE = 'wlan0'
+WIFI_MODULE = '8852bs'
+
+# How often to ask wpa_supplicant for a scan, in ms.
+SCAN_INTERVAL = 2000
 
 class StatusView(QFrame):
     def __init__(self, parent):
@@ -51,68 +58,64 @@ class WifiSignalView(QFrame):
         self.wifi_signal_level.setValue(0)
 
     def start_to_scan(self):
-        self.on_wifiStatusUpdate()
-
-    def on_wifiStatusUpdate(self):
-        interface = 'wlan0'
-        status = self.check_interface_status(interface)
-        wifi_module_name = '8852bs'
-        kernel_module_wifi_status = self.check_module_loaded(wifi_module_name)
-        wpa_supplicant_status = self.check_process_running('wpa_supplicant')
-        if status and kernel_module_wifi_status and wpa_supplicant_status:
+        self.wpa = WpaControl(WIFI_INTERFACE)
+        self.wpa.subscribe('scan_results', self.on_wpaScanResults)
+        self.wpa.subscribe('closed', self.on_wpaClosed)
+        self.notifier = None
+        self.wpa_error = None
+
+        self.scan_timer = QTimer(self)
+        self.scan_timer.timeout.connect(self.on_scanTimer)
+        self.scan_timer.start(SCAN_INTERVAL)
+        self.on_scanTimer()
+
+    def on_scanTimer(self):
+        "Start a scan, connecting to wpa_supplicant first if need be."
+        if not self.wpa.connected:
+            try:
+                self.wpa.open()
+            except OSError as e:
+                # Retried on every tick; say why only when that changes.
+                if str(e) != self.wpa_error:
+                    self.wpa_error = str(e)
+                    self.logger.info(
+                        f'fail wifi: {WIFI_INTERFACE}:{probe.interface_flags(WIFI_INTERFACE) is not None}, '
+                        f'{WIFI_MODULE}:{probe.module_loaded(WIFI_MODULE)}, '
+                        f'wpa_supplicant:{probe.process_running("wpa_supplicant")} ({e})')
+                return
+            self.wpa_error = None
             self.wifi_ready = True
-            pr = f"Interface {interface} is {status}"
-            self.set_wifi_signal_level()
-        else:
-            pr = f"fail wifi: {interface}:{status}, {wifi_module_name}:{kernel_module_wifi_status}, wpa_supplicant:{wpa_supplicant_status}"
-            self.logger.info(pr)
-            self.wifi_signal_level.setFormat(f'{self.sl.get_text("wifi_signal_init")}')
-            self.wifi_signal_level.setValue(0)
+            self.logger.info(f'Interface {WIFI_INTERFACE} is managed by wpa_supplicant')
+            self.notifier = QSocketNotifier(self.wpa.fileno(), QSocketNotifier.Read, self)
+            self.notifier.activated.connect(lambda fd: self.wpa.poll())
+        # A scan already running answers FAIL-BUSY, which is harmless.
+        self.wpa.scan()
+
+    def on_wpaClosed(self, wpa):
+        "Event handler: wpa_supplicant has gone away"
+        self.logger.info(f'fail wifi: wpa_supplicant on {WIFI_INTERFACE} has gone away')
+        if self.notifier is not None:
+            self.notifier.setEnabled(False)
+            self.notifier = None
+        self.wifi_ready = False
+        self.set_wifi_signal_level([])
 
-        QTimer.singleShot(1000, lambda: self.on_wifiStatusUpdate())
-
-    def check_interface_status(self, interface):
-        try:
-            # Execute a command ip link show interface
-            result = subprocess.run(['ip', 'link', 'show', interface], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-
-            # Check the return code of the command execution
-            if result.returncode != 0:
-                print(f"Error: {result.stderr}")
-                return None
-
-            # Analytic output
-            output = result.stdout
-            if interface in output:
-                return True
-            else:
-                return False
-        except Exception as e:
-            print(f"Exception occurred: {e}")
-            return False
-
-    def check_module_loaded(self, module_name):
-        """Check whether the kernel module is loaded successfully"""
-        result = subprocess.run(['lsmod'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if module_name in result.stdout:
-            return True
-        return False
-
-    def check_process_running(self, process_name):
-        """Check whether the process is running"""
-        result = subprocess.run(['ps', 'aux'], stdout=subprocess.PIPE, stderr=subprocess.PIPE, text=True)
-        if process_name in result.stdout:
-            return True
-        return False
-
-    def set_wifi_signal_level(self):
-        ssid, signal_level = self._get_strongest_wifi()
-        if not ssid:
+    def on_wpaScanResults(self, wpa, results):
+        "Event handler: a scan has finished"
+        self.set_wifi_signal_level(results)
+
+    def set_wifi_signal_level(self, results):
+        # Hidden networks have no SSID to show.
+        results = [result for result in results if result.ssid]
+        if not results:
             self.wifi_signal_level.setFormat(f'{self.sl.get_text("wifi_signal_init")}')
             # self.wifi_signal_level.setStyleSheet('QProgressBar { text-align: center; } QProgressBar::chunk { background-color: %s; }' % FAIL_COLOR)
             self.wifi_signal_level.setValue(0)
             return
 
+        strongest = max(results, key=lambda result: result.signal)
+        ssid, signal_level = strongest.ssid, strongest.signal
+
         if signal_level <= -100:
             self.wifi_signal_level.setStyleSheet('QProgressBar { text-align: center; } QProgressBar::chunk { background-color: %s; }' % FAIL_COLOR)
             value = 20
@@ -129,42 +132,5 @@ class WifiSignalView(QFrame):
             self.wifi_signal_level.setStyleSheet('QProgressBar { text-align: center; } QProgressBar::chunk { background-color: %s; }' % PASS_COLOR)
             value = 100
 
-
-        # The value is a string encoded in UTF-8
-        byte_str = bytes(ssid, 'latin1').decode('unicode_escape').encode('latin1')
-        decoded_str = byte_str.decode('utf-8')
-        self.wifi_signal_level.setFormat(f'{decoded_str}: {signal_level}')
+        self.wifi_signal_level.setFormat(f'{ssid}: {signal_level}')
         self.wifi_signal_level.setValue(value)
-
-    def _get_strongest_wifi(self):
-        strongest_signal_level = -2147483648
-        strongest_ssid = None
-
-        timeout = 5
-        cmd = 'wpa_cli scan'
-        scan = subprocess.run(cmd, capture_output=True, text=True, shell=True, timeout=timeout)
-        # if scan.returncode != 0:
-        #     return strongest_ssid, strongest_signal_level
-
-        cmd = 'wpa_cli scan_results'
-        proc = subprocess.run(cmd, capture_output=True, text=True, shell=True, timeout=timeout)
-        if proc.returncode != 0:
-            return strongest_ssid, strongest_signal_level
-
-        for line in proc.stdout.splitlines():
-            if not line.strip() or line.startswith('Selected interface') or line.startswith('bssid'):
-                continue
-
-            parts = line.split('\t')
-            if len(parts) < 5:
-                continue
-
-            signal_level = int(parts[2])
-            ssid = parts[4]
-
-            if signal_level > strongest_signal_level:
-                strongest_signal_level = signal_level
-                strongest_ssid = ssid
-
-        return strongest_ssid, strongest_signal_level
-
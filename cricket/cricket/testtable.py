@@ -0,0 +1,127 @@
+"""The test tables of the main window.
+
+Each table shows the test methods of one top-level test module: the
+test case, the test method and the result of its last run. The rows
+are the model's TestMethod nodes themselves, so the table reads each
+result straight from its node; a map from test path to row finds the
+row of a node that has changed.
+"""
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+from PyQt5.QtGui import QColor
+
+from cricket.macro import STATUS
+from cricket.model import TestMethod
+
+
+class TestTableModel(QAbstractTableModel):
+    """The test methods shown in a test table.
+
+    `columns` are the column headings. `label` is called with the path
+    of a test case or test method for the name to show for it. A passed
+    test shows `pass_text`, if there is one, in place of its status,
+    and no colour.
+    """
+    CASE, METHOD, RESULT = range(3)
+
+    def __init__(self, columns, label, pass_text=None, parent=None):
+        super().__init__(parent)
+        self.columns = columns
+        self.label = label
+        self.pass_text = pass_text
+
+        self._tests = []
+        # The text of the case and method columns of each row.
+        self._names = []
+        self._rows = {}
+        self._colors = {status: QColor(info['color']) for status, info in STATUS.items()}
+
+    def rowCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self._tests)
+
+    def columnCount(self, parent=QModelIndex()):
+        return 0 if parent.isValid() else len(self.columns)
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role == Qt.DisplayRole and orientation == Qt.Horizontal:
+            return self.columns[section]
+        return super().headerData(section, orientation, role)
+
+    def data(self, index, role=Qt.DisplayRole):
+        testMethod = self._tests[index.row()]
+        column = index.column()
+        if role == Qt.DisplayRole:
+            if column != self.RESULT:
+                return self._names[index.row()][column]
+            if testMethod.status is None:
+                return ''
+            if self.pass_text is not None and testMethod.status == TestMethod.STATUS_PASS:
+                return self.pass_text
+            return STATUS[testMethod.status]['description']
+        elif role == Qt.BackgroundRole:
+            if testMethod.status is None:
+                return None
+            if self.pass_text is not None and testMethod.status == TestMethod.STATUS_PASS:
+                return None
+            return self._colors[testMethod.status]
+        elif role == Qt.TextAlignmentRole:
+            if column == self.RESULT:
+                return int(Qt.AlignCenter)
+        elif role == Qt.UserRole:
+            return testMethod.path
+        return None
+
+    def path(self, row):
+        "The path of the test method in a row."
+        return self._tests[row].path
+
+    def row(self, path):
+        "The row showing a test method, or None if it isn't in the table."
+        return self._rows.get(path)
+
+    def clear(self):
+        "Remove every row."
+        self.beginResetModel()
+        self._tests = []
+        self._names = []
+        self._rows = {}
+        self.endResetModel()
+
+    def add(self, testMethods):
+        "Add rows for test methods, after the existing rows."
+        testMethods = [testMethod for testMethod in testMethods if testMethod.path not in self._rows]
+        if not testMethods:
+            return
+        first = len(self._tests)
+        self.beginInsertRows(QModelIndex(), first, first + len(testMethods) - 1)
+        for row, testMethod in enumerate(testMethods, first):
+            self._tests.append(testMethod)
+            self._names.append(self._name(testMethod))
+            self._rows[testMethod.path] = row
+        self.endInsertRows()
+
+    def _name(self, testMethod):
+        "The text of the case and method columns of a row."
+        return (self.label(testMethod.parent.path), self.label(testMethod.path))
+
+    def relabel(self, columns):
+        "Show new column headings, and the names of the tests again."
+        self.columns = columns
+        self._names = [self._name(testMethod) for testMethod in self._tests]
+        self.headerDataChanged.emit(Qt.Horizontal, 0, len(columns) - 1)
+        if self._tests:
+            self.dataChanged.emit(
+                self.index(0, self.CASE),
+                self.index(len(self._tests) - 1, self.METHOD),
+                [Qt.DisplayRole],
+            )
+
+    def update(self, testMethods):
+        "Show the current results of test methods, as one change to the table."
+        rows = [self._rows.get(testMethod.path) for testMethod in testMethods]
+        rows = [row for row in rows if row is not None]
+        if rows:
+            self.dataChanged.emit(
+                self.index(min(rows), 0),
+                self.index(max(rows), len(self.columns) - 1),
+                [Qt.DisplayRole, Qt.BackgroundRole],
+            )
@@ -1,8 +1,14 @@
 '''
 This is the main entry point for running unittest test suites.
 '''
-from cricket.main import main as cricket_main
-from cricket.unittest.model import UnittestProject
+from cricket.profiler import profiler
+
+# Start profiling (if asked to) before the GUI libraries are imported.
+profiler.configure()
+
+with profiler.phase('import'):
+    from cricket.main import main as cricket_main
+    from cricket.unittest.model import UnittestProject
 
 
 def main():
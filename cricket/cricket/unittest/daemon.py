@@ -0,0 +1,842 @@
+'''
+A long-lived test runner that keeps the test modules imported.
+
+Starting `cricket.unittest.executor` for every run means paying for
+interpreter startup, and for importing every test module (and all
+they import), each time. The daemon does that once: it imports the
+tests in its working directory, then waits for run requests on a Unix
+socket. Each run is executed in a child forked from the daemon, so it
+starts with everything already imported, and can't leave any state
+behind for the next run.
+
+The daemon keeps the output of each run, so a client that goes away
+(e.g., because the GUI was restarted) can attach to the run again;
+everything the run has produced so far is replayed, then the output
+continues live. Only the most recent output of a run (as much as
+CRICKET_OUTPUT_LIMIT) is kept in memory; older frames are spilled to a
+file in the run's log directory, and replayed from there.
+
+Messages in both directions use the frame format of the framed pipe
+protocol (see cricket.pipes). The client sends a request:
+
+    {"run": [labels...], "module": "auto", "count": 10, "protocol": "framed",
+     "jobs": 1, "workers": 1, "run_dir": "/tmp/cricket-logs/..."}
+    {"attach": run_id}
+    {"runs": true}
+    {"cancel": run_id}
+
+and the daemon answers with a reply. After replying to "run" or
+"attach", the daemon sends the run's stdout and stderr, and finally
+its exit status.
+'''
+import argparse
+import collections
+import importlib
+import itertools
+import json
+import os
+import selectors
+import signal
+import socket
+import stat
+import subprocess
+import sys
+import tempfile
+import time
+import traceback
+import unittest
+from collections import OrderedDict
+from hashlib import sha1
+
+from cricket import bundle
+from cricket.capture import RUN_DIR_ENV, SpillFile, new_run_directory, output_limit
+from cricket.executor import EventDrivenExecutor
+from cricket.pipes import (
+    FRAME_HEADER, FRAMED_PROTOCOL, LINE_PROTOCOL, PROTOCOL_ENV,
+    FrameParser, PipedStreamDecoder, encode_frame,
+)
+from cricket.unittest.executor import PyTestExecutor, PyTestShardedExecutor
+
+MESSAGE_REQUEST = 1  # JSON: client to daemon
+MESSAGE_REPLY = 2    # JSON: daemon to client
+MESSAGE_STDOUT = 3   # raw output of a run
+MESSAGE_STDERR = 4   # raw error output of a run
+MESSAGE_EXIT = 5     # JSON: returncode; the last message of a run
+
+# The number of finished runs kept around for clients to attach to.
+KEEP_FINISHED = 8
+
+# How long to wait for a daemon to describe its runs.
+RUNS_TIMEOUT = 2.0
+
+
+class DaemonError(Exception):
+    pass
+
+
+def runtime_directory():
+    """A directory only this user can use, for daemon sockets.
+
+    XDG_RUNTIME_DIR is one; without it, a directory of our own (mode
+    0700) is made in the temporary directory. Raises DaemonError if that
+    belongs to someone else, or others can get into it.
+    """
+    runtime = os.environ.get('XDG_RUNTIME_DIR')
+    if runtime:
+        return runtime
+    runtime = os.path.join(tempfile.gettempdir(), 'cricket-%d' % os.getuid())
+    try:
+        os.mkdir(runtime, 0o700)
+    except FileExistsError:
+        pass
+    info = os.lstat(runtime)
+    if not stat.S_ISDIR(info.st_mode) or info.st_uid != os.getuid() or info.st_mode & 0o077:
+        raise DaemonError('%s is not a private directory; not using it for the runner daemon' % runtime)
+    return runtime
+
+
+def default_socket_path(directory=None):
+    "The socket used by the daemon serving the tests in a directory."
+    directory = os.path.abspath(directory or os.getcwd())
+    key = sha1((directory + '\0' + sys.executable).encode('utf-8')).hexdigest()[:12]
+    return os.path.join(runtime_directory(), 'cricket-%s.sock' % key)
+
+
+def is_listening(path):
+    "Is a daemon accepting connections on the socket?"
+    sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    try:
+        sock.connect(path)
+        return True
+    except OSError:
+        return False
+    finally:
+        sock.close()
+
+
+def _mtime(path):
+    "When a module's file was last changed; for a bundled module, the bundle's."
+    current = bundle.current()
+    if current is not None and path.startswith(current.path + os.sep):
+        path = current.path
+    try:
+        return os.stat(path).st_mtime
+    except OSError:
+        return None
+
+
+def exit_code(status):
+    "Convert a wait() status to a Popen style returncode."
+    if os.WIFSIGNALED(status):
+        return -os.WTERMSIG(status)
+    return os.WEXITSTATUS(status)
+
+
+######################################################################
+# The daemon
+######################################################################
+
+class RunLog(object):
+    """The frames a run has produced, for replaying to clients that attach.
+
+    The most recent `limit` bytes of frames are kept in memory. Older
+    frames are spilled, whole, to a file in `directory`. If that file
+    can't be written, they are lost, and the replay says so.
+    """
+    def __init__(self, name, limit, directory):
+        self.limit = limit
+        self.spill = SpillFile(name, directory)
+        self.frames = collections.deque()
+        self.size = 0
+        self.spilled = 0
+
+    def append(self, frame):
+        self.frames.append(frame)
+        self.size += len(frame)
+        while self.size > self.limit and len(self.frames) > 1:
+            frame = self.frames.popleft()
+            self.size -= len(frame)
+            self.spilled += len(frame)
+            self.spill.write(frame)
+
+    def replay(self):
+        "Every frame, as bytes."
+        spilled = self.spill.read() if self.spilled else b''
+        if spilled is None:
+            spilled = encode_frame(MESSAGE_STDERR, (
+                '[%d bytes of earlier output could not be kept]\n' % self.spilled).encode('utf-8'))
+        return spilled + b''.join(self.frames)
+
+    def remove(self):
+        "Delete the spilled frames."
+        self.spill.remove()
+
+
+class Run(object):
+    "A test run executed by the daemon, and everything it has produced."
+    def __init__(self, run_id, request):
+        self.id = run_id
+        self.labels = request['run']
+        self.module = request.get('module')
+        self.count = request.get('count', len(self.labels))
+        self.start_time = time.time()
+        self.pid = None
+        self.pipes = set()
+        self.clients = set()
+        self.log = RunLog('daemon-run-%d' % run_id, output_limit(),
+                          request.get('run_dir') or new_run_directory())
+        self.status = None
+        self.returncode = None
+
+    def __repr__(self):
+        return u'Run %s' % self.id
+
+    @property
+    def running(self):
+        return self.returncode is None
+
+    def describe(self):
+        return {
+            'id': self.id,
+            'module': self.module,
+            'labels': self.labels,
+            'count': self.count,
+            'start_time': self.start_time,
+            'running': self.running,
+        }
+
+    def cancel(self):
+        "Stop the run, and anything its tests have started."
+        if self.running:
+            try:
+                os.killpg(self.pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+class Connection(object):
+    "A client connected to the daemon."
+    def __init__(self, sock):
+        self.sock = sock
+        self.messages = FrameParser()
+        self.outbox = bytearray()
+        self.run = None
+
+    @property
+    def closed(self):
+        return self.sock.fileno() == -1
+
+
+class RunnerDaemon(object):
+    '''
+    Serve test runs over a Unix socket from a process that has
+    already imported the tests.
+
+    The daemon is single threaded, so it is always safe to fork.
+    '''
+    def __init__(self, path, keep=KEEP_FINISHED):
+        self.path = path
+        self.keep = keep
+        self.runs = OrderedDict()
+        self.run_ids = itertools.count(1)
+        self.selector = selectors.DefaultSelector()
+        self.listener = None
+        self.connections = {}
+        self.pipes = {}
+
+        # The modules imported from the test directory, and the
+        # modification time of each when it was imported.
+        self.modules = {}
+
+    def _local_modules(self):
+        current = bundle.current()
+        root = (current.path if current is not None else os.path.abspath('.')) + os.sep
+        found = {}
+        for name, module in list(sys.modules.items()):
+            if name == '__main__' or name == 'cricket' or name.startswith('cricket.'):
+                continue
+            path = getattr(module, '__file__', None)
+            if path and os.path.abspath(path).startswith(root):
+                found[name] = _mtime(path)
+        return found
+
+    def _is_stale(self):
+        "Has any imported test module been changed or removed since it was imported?"
+        for name, mtime in self.modules.items():
+            try:
+                path = sys.modules[name].__file__
+            except KeyError:
+                return True
+            if mtime is None or _mtime(path) != mtime:
+                return True
+        return False
+
+    def preload(self):
+        "Import (or re-import) every test module."
+        for name in self.modules:
+            sys.modules.pop(name, None)
+        importlib.invalidate_caches()
+        current = bundle.current()
+        try:
+            if current is not None:
+                current.load_tests(unittest.TestLoader())
+            else:
+                unittest.TestLoader().discover('.')
+        except Exception:
+            # The run will report the problem when it imports the tests.
+            traceback.print_exc()
+        self.modules = self._local_modules()
+
+    ######################################################
+    # Event loop
+    ######################################################
+
+    def listen(self, listener=None):
+        """Start listening on the socket, or take over a `listener` already listening on it.
+
+        Clients that connect before `serve()` wait in the backlog, so
+        this is done before the tests are imported.
+        """
+        if listener is None:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            listener.bind(self.path)
+            listener.listen(8)
+        self.listener = listener
+        self.listener.setblocking(False)
+        self.selector.register(self.listener, selectors.EVENT_READ, self._on_accept)
+
+    def serve(self):
+        "Accept and serve clients until the daemon is terminated."
+        def terminate(signum, frame):
+            raise SystemExit(0)
+        signal.signal(signal.SIGTERM, terminate)
+
+        if self.listener is None:
+            self.listen()
+
+        # Children are reaped when they exit, without blocking: the
+        # SIGCHLD handler only wakes the event loop up.
+        self.wakeup_r, self.wakeup_w = os.pipe()
+        os.set_blocking(self.wakeup_r, False)
+        os.set_blocking(self.wakeup_w, False)
+        signal.set_wakeup_fd(self.wakeup_w)
+        signal.signal(signal.SIGCHLD, lambda signum, frame: None)
+        self.selector.register(self.wakeup_r, selectors.EVENT_READ, self._on_wakeup)
+        try:
+            while True:
+                for key, events in self.selector.select():
+                    key.data(key.fileobj, events)
+        finally:
+            for run in self.runs.values():
+                run.cancel()
+            self.listener.close()
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+
+    def _on_accept(self, listener, events):
+        sock, address = listener.accept()
+        sock.setblocking(False)
+        connection = Connection(sock)
+        self.connections[sock.fileno()] = connection
+        self.selector.register(sock, selectors.EVENT_READ, self._on_client)
+
+    def _on_client(self, sock, events):
+        connection = self.connections.get(sock.fileno())
+        if connection is None:
+            # Dropped earlier in this batch of events.
+            return
+        if events & selectors.EVENT_WRITE and not self._flush(connection):
+            return
+        if events & selectors.EVENT_READ:
+            try:
+                data = sock.recv(65536)
+            except BlockingIOError:
+                return
+            except OSError:
+                data = b''
+            if not data:
+                self._drop(connection)
+                return
+            for kind, payload in connection.messages.feed(data):
+                if connection.closed:
+                    # Dropped while handling an earlier request.
+                    return
+                if kind != MESSAGE_REQUEST:
+                    continue
+                try:
+                    request = json.loads(payload.decode('utf-8'))
+                except ValueError:
+                    request = {}
+                self._handle(connection, request)
+
+    def _on_pipe(self, fd, events):
+        run, kind = self.pipes[fd]
+        try:
+            data = os.read(fd, 65536)
+        except BlockingIOError:
+            return
+        if data:
+            self._publish(run, encode_frame(kind, data))
+            return
+
+        # End of file.
+        self.selector.unregister(fd)
+        os.close(fd)
+        del self.pipes[fd]
+        run.pipes.discard(fd)
+        self._reap()
+
+    def _on_wakeup(self, fd, events):
+        try:
+            while os.read(fd, 4096):
+                pass
+        except BlockingIOError:
+            pass
+        self._reap()
+
+    def _reap(self):
+        "Collect the children that have exited, and finish their runs once all their output is in."
+        for run in self.runs.values():
+            if not run.running:
+                continue
+            if run.status is None:
+                try:
+                    pid, status = os.waitpid(run.pid, os.WNOHANG)
+                except ChildProcessError:
+                    pid, status = run.pid, 0
+                if pid == 0:
+                    continue
+                run.status = status
+            if not run.pipes:
+                run.returncode = exit_code(run.status)
+                self._publish(run, encode_frame(MESSAGE_EXIT, {'returncode': run.returncode}))
+
+    ######################################################
+    # Talking to clients
+    ######################################################
+
+    def _send(self, connection, data):
+        connection.outbox.extend(data)
+        self._flush(connection)
+
+    def _flush(self, connection):
+        "Send as much of the backlog as possible. Returns False if the client has gone."
+        try:
+            sent = connection.sock.send(connection.outbox)
+        except BlockingIOError:
+            sent = 0
+        except OSError:
+            self._drop(connection)
+            return False
+        del connection.outbox[:sent]
+        # Only ask to be told about room to write while there's a backlog.
+        events = selectors.EVENT_READ
+        if connection.outbox:
+            events |= selectors.EVENT_WRITE
+        self.selector.modify(connection.sock, events, self._on_client)
+        return True
+
+    def _drop(self, connection):
+        "Forget a client. Its run carries on. Dropping a client again does nothing."
+        if connection.closed:
+            return
+        if connection.run is not None:
+            connection.run.clients.discard(connection)
+        del self.connections[connection.sock.fileno()]
+        self.selector.unregister(connection.sock)
+        connection.sock.close()
+
+    def _publish(self, run, message):
+        run.log.append(message)
+        for connection in list(run.clients):
+            self._send(connection, message)
+
+    def _handle(self, connection, request):
+        if 'run' in request:
+            run = self.start_run(request)
+            self._attach(connection, run)
+        elif 'attach' in request:
+            run = self.runs.get(request['attach'])
+            if run is None:
+                self._send(connection, encode_frame(MESSAGE_REPLY, {'error': 'No run %s' % request['attach']}))
+            else:
+                self._attach(connection, run)
+        elif 'runs' in request:
+            runs = [run.describe() for run in self.runs.values()]
+            self._send(connection, encode_frame(MESSAGE_REPLY, {'runs': runs}))
+        elif 'cancel' in request:
+            run = self.runs.get(request['cancel'])
+            if run is not None:
+                run.cancel()
+        else:
+            self._send(connection, encode_frame(MESSAGE_REPLY, {'error': 'Unknown request'}))
+
+    def _attach(self, connection, run):
+        "Send a client everything the run has produced, then keep it up to date."
+        if connection.run is not None:
+            connection.run.clients.discard(connection)
+        connection.run = run
+        run.clients.add(connection)
+        self._send(connection, encode_frame(MESSAGE_REPLY, {'run': run.describe()}) + run.log.replay())
+
+    ######################################################
+    # Running tests
+    ######################################################
+
+    def start_run(self, request):
+        "Fork a child to execute the requested tests."
+        if self._is_stale():
+            self.preload()
+
+        run = Run(next(self.run_ids), request)
+        stdout_r, stdout_w = os.pipe()
+        stderr_r, stderr_w = os.pipe()
+        sys.stdout.flush()
+        sys.stderr.flush()
+
+        pid = os.fork()
+        if pid == 0:
+            try:
+                os.close(stdout_r)
+                os.close(stderr_r)
+                self._run_child(run, request, stdout_w, stderr_w)
+            finally:
+                os._exit(1)
+
+        os.close(stdout_w)
+        os.close(stderr_w)
+        run.pid = pid
+        for fd, kind in ((stdout_r, MESSAGE_STDOUT), (stderr_r, MESSAGE_STDERR)):
+            os.set_blocking(fd, False)
+            self.pipes[fd] = (run, kind)
+            run.pipes.add(fd)
+            self.selector.register(fd, selectors.EVENT_READ, self._on_pipe)
+
+        self.runs[run.id] = run
+        finished = [old for old in self.runs.values() if not old.running]
+        while len(finished) > self.keep:
+            old = finished.pop(0)
+            old.log.remove()
+            del self.runs[old.id]
+        return run
+
+    def _run_child(self, run, request, stdout, stderr):
+        "Execute a run in the forked child. Never returns."
+        # Let the daemon's connections and pipes be.
+        self.selector.close()
+        self.listener.close()
+        for connection in self.connections.values():
+            connection.sock.close()
+        for fd in self.pipes:
+            os.close(fd)
+        signal.set_wakeup_fd(-1)
+        signal.signal(signal.SIGCHLD, signal.SIG_DFL)
+        os.close(self.wakeup_r)
+        os.close(self.wakeup_w)
+
+        # Put the run in its own process group, so cancelling it also
+        # stops anything the tests have started.
+        os.setsid()
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        os.dup2(stdout, 1)
+        os.dup2(stderr, 2)
+        os.close(stdout)
+        os.close(stderr)
+        os.environ[PROTOCOL_ENV] = request.get('protocol', LINE_PROTOCOL)
+        if request.get('run_dir'):
+            os.environ[RUN_DIR_ENV] = request['run_dir']
+
+        code = 1
+        try:
+            jobs = request.get('jobs', 1)
+            workers = request.get('workers', 1)
+            if workers > 1:
+                executor = PyTestShardedExecutor(jobs=jobs, workers=workers)
+            else:
+                executor = PyTestExecutor(jobs=jobs)
+            executor.run_only(run.labels)
+            executor.stream_results()
+            code = 0
+        except BaseException:
+            traceback.print_exc()
+        finally:
+            sys.stdout.flush()
+            sys.stderr.flush()
+            os._exit(code)
+
+
+######################################################################
+# The client
+######################################################################
+
+def _recv_exactly(sock, size):
+    data = bytearray()
+    while len(data) < size:
+        chunk = sock.recv(size - len(data))
+        if not chunk:
+            raise DaemonError('The test runner daemon closed the connection')
+        data.extend(chunk)
+    return bytes(data)
+
+
+class DaemonClient(object):
+    "A connection to the runner daemon serving the current directory."
+    def __init__(self, path=None, start=True):
+        self.path = path or default_socket_path()
+        self.start = start
+        # The daemon this client started, if it had to.
+        self.daemon = None
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            sock.connect(self.path)
+            return sock
+        except (FileNotFoundError, ConnectionRefusedError):
+            if not self.start:
+                sock.close()
+                raise
+
+        # No daemon is running; start one. The socket is listened on
+        # here, and handed to the daemon, so connections wait in the
+        # backlog while it imports the tests, rather than being polled.
+        listener = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        try:
+            if os.path.exists(self.path):
+                os.unlink(self.path)
+            listener.bind(self.path)
+            listener.listen(8)
+            with open(self.path + '.log', 'ab') as log:
+                self.daemon = subprocess.Popen(
+                    [sys.executable, '-m', 'cricket.unittest.daemon',
+                     '--socket', self.path, '--fd', str(listener.fileno())],
+                    stdin=subprocess.DEVNULL,
+                    stdout=log,
+                    stderr=log,
+                    pass_fds=(listener.fileno(),),
+                    start_new_session=True,
+                )
+            sock.connect(self.path)
+        except BaseException:
+            sock.close()
+            raise
+        finally:
+            listener.close()
+        return sock
+
+    def send(self, message):
+        "Send a request; returns the connected socket, for the reply to be read from."
+        sock = self._connect()
+        try:
+            sock.sendall(encode_frame(MESSAGE_REQUEST, message))
+        except (BrokenPipeError, ConnectionResetError):
+            # The daemon has gone (or died starting); reading the reply
+            # will say so.
+            pass
+        except BaseException:
+            sock.close()
+            raise
+        return sock
+
+    def request(self, message, timeout=None):
+        "Send a request, and wait for the reply; returns the connected socket and the reply."
+        sock = self.send(message)
+        try:
+            sock.settimeout(timeout)
+            length, kind = FRAME_HEADER.unpack(_recv_exactly(sock, FRAME_HEADER.size))
+            reply = json.loads(_recv_exactly(sock, length).decode('utf-8'))
+            if 'error' in reply:
+                raise DaemonError(reply['error'])
+        except BaseException:
+            sock.close()
+            raise
+        return sock, reply
+
+    def runs(self):
+        """Describe the runs the daemon knows about.
+
+        Empty if no daemon is running, or it is too busy (e.g., importing
+        the tests) to answer.
+        """
+        try:
+            sock, reply = self.request({'runs': True}, RUNS_TIMEOUT)
+        except (FileNotFoundError, ConnectionRefusedError, socket.timeout):
+            return []
+        sock.close()
+        return reply['runs']
+
+    def run(self, labels, **options):
+        """Start a run of the given test labels.
+
+        Doesn't wait for the daemon: its reply arrives, and is handled,
+        with the run's output.
+        """
+        options['run'] = labels
+        return DaemonRun(self.send(options), self.path)
+
+    def attach(self, run_id):
+        "Attach to an earlier run; its output is replayed from the start."
+        return DaemonRun(self.send({'attach': run_id}), self.path)
+
+
+class DaemonRun(object):
+    '''
+    A run being executed by the daemon.
+
+    Stands in for the Popen object of a runner subprocess; the
+    connection carries the daemon's reply, then the run's output until
+    it is closed. Until the reply has arrived, the run has no id.
+    '''
+    def __init__(self, sock, path):
+        self.sock = sock
+        self.path = path
+        self.info = None
+        self.id = None
+        self.returncode = None
+        self.closed = False
+        self._cancel = False
+        sock.setblocking(False)
+
+    def started(self, info):
+        "The daemon has replied, describing the run."
+        self.info = info
+        self.id = info['id']
+        if self._cancel:
+            self.terminate()
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def close(self):
+        if not self.closed:
+            self.closed = True
+            self.sock.close()
+
+    def poll(self):
+        if self.closed and self.returncode is None:
+            # The daemon went away without reporting how the run ended.
+            self.returncode = -1
+        return self.returncode
+
+    def wait(self):
+        "Only called once the connection has closed, so there's nothing to wait for."
+        return self.poll()
+
+    def terminate(self):
+        if self.id is None:
+            # Cancelled once the daemon says which run it is.
+            self._cancel = True
+        elif not self.closed:
+            try:
+                self.sock.sendall(encode_frame(MESSAGE_REQUEST, {'cancel': self.id}))
+            except OSError:
+                pass
+
+
+class DaemonExecutor(EventDrivenExecutor):
+    '''
+    An executor that runs tests in the runner daemon, starting the
+    daemon if it isn't running.
+
+    If `run_id` is given, attaches to that run instead of starting a
+    new one.
+    '''
+    def __init__(self, project, module, count, labels, run_id=None):
+        self.run_id = run_id
+        self.total_count = count
+        super(DaemonExecutor, self).__init__(project, module, count, labels)
+
+    @classmethod
+    def attach_running(cls, project):
+        client = DaemonClient(project.daemon_socket, start=False)
+        return [
+            cls(project, run['module'], run['count'], run['labels'], run_id=run['id'])
+            for run in client.runs()
+            if run['running']
+        ]
+
+    def _launch(self, labels):
+        client = DaemonClient(self.project.daemon_socket)
+        if self.run_id is not None:
+            return client.attach(self.run_id)
+        return client.run(
+            labels,
+            module=self.module,
+            count=self.total_count,
+            protocol=FRAMED_PROTOCOL if self.project.supports_framed_protocol else LINE_PROTOCOL,
+            jobs=getattr(self.project, 'jobs', 1),
+            workers=getattr(self.project, 'workers', 1),
+            run_dir=self.run_dir,
+        )
+
+    def _start_readers(self):
+        self._decoder = PipedStreamDecoder()
+        self._messages = FrameParser()
+        self._errors = b''
+        self._error_partial = b''
+        self._open = {self.proc.fileno(): self.proc}
+        self._selector = None
+
+    def _read(self, pipe):
+        try:
+            return super(DaemonExecutor, self)._read(pipe)
+        except ConnectionResetError:
+            # The daemon went away with our request unread.
+            self._close(pipe)
+            return b''
+
+    def _read_events(self):
+        if self.proc.closed:
+            return []
+        events = []
+        for kind, payload in self._messages.feed(self._read(self.proc)):
+            if kind == MESSAGE_REPLY:
+                reply = json.loads(payload.decode('utf-8'))
+                if 'error' in reply:
+                    self._errors += ('%s\n' % reply['error']).encode('utf-8')
+                    self._close(self.proc)
+                else:
+                    self.proc.started(reply['run'])
+                    self.run_id = self.proc.id
+            elif kind == MESSAGE_STDOUT:
+                events.extend(self._decoder.feed(payload))
+            elif kind == MESSAGE_STDERR:
+                self._errors += payload
+            elif kind == MESSAGE_EXIT:
+                self.proc.returncode = json.loads(payload.decode('utf-8'))['returncode']
+                if not self.proc.closed:
+                    self._close(self.proc)
+        if self.proc.closed and self.proc.info is None and not self._errors:
+            self._errors = ('The test runner daemon failed to start; see %s.log\n' % self.proc.path).encode('utf-8')
+        return events
+
+    def _read_errors(self):
+        self._add_errors(self._errors, self.proc.closed)
+        self._errors = b''
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Serve test runs from a process that keeps the tests imported.')
+    parser.add_argument(
+        '--socket', default=None,
+        help='The Unix socket to listen on. Defaults to one derived from the current directory.'
+    )
+    parser.add_argument(
+        '--fd', type=int, default=None,
+        help='A socket already listening on --socket, inherited from the client starting the daemon.'
+    )
+    options = parser.parse_args()
+
+    path = options.socket or default_socket_path()
+    daemon = RunnerDaemon(path)
+    if options.fd is not None:
+        daemon.listen(socket.socket(fileno=options.fd))
+    elif is_listening(path):
+        sys.exit('A test runner daemon is already listening on %s' % path)
+    else:
+        daemon.listen()
+    # Connections wait in the backlog while the tests are imported.
+    daemon.preload()
+    daemon.serve()
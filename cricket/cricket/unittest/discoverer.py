@@ -10,27 +10,258 @@ etc
 
 Its primary API is the command-line, but it can
 just as easily be called programmatically (see __main__)
+
+Tests are printed as soon as each module has been read, so the GUI
+can show them while discovery carries on.
+
+If CRICKET_METADATA_FILE is set, a description of each test case
+(currently, its LANGUAGES) is written to that file as JSON, one test
+case per line, before its tests are printed. Test packages are
+described too (currently, by their MODULE_NAME) when they are read.
+
+Test modules are read with `ast` rather than imported, so listing the
+tests doesn't run their imports. A module is only imported if its test
+cases can't be worked out from the source alone: for example, if they
+inherit from a class defined in another module, or their test methods
+are made at run time. Modules that fail to import are only noticed
+when they are run. Pass --import to import every module, as unittest
+discovery does.
+
+When cricket runs from a bundle (see cricket.bundle), the test modules
+are listed by the bundle's index and read from the archive.
 '''
 
+import ast
+import fnmatch
+import json
+import os
+import sys
 import unittest
+from unittest.loader import VALID_MODULE_NAME
+
+from cricket import bundle
+from cricket.discovery import METADATA_FILE_ENV
+
+# The names unittest gives its own test case classes.
+UNITTEST_CASES = {'TestCase', 'IsolatedAsyncioTestCase'}
 
 
 def consume(iterable):
-    input = list(iterable)
-    while input:
-        item = input.pop(0)
-        try:
-            data = iter(item)
-            input = list(data) + input
-        except:
-            yield item
+    "Flatten a test suite into the tests it contains, in order."
+    stack = [iter(iterable)]
+    while stack:
+        for item in stack[-1]:
+            try:
+                data = iter(item)
+            except TypeError:
+                yield item
+            else:
+                stack.append(data)
+                break
+        else:
+            stack.pop()
+
+
+class Unresolved(Exception):
+    "The test cases of a module can't be found without importing it."
+
+
+def find_test_modules(start_dir='.', pattern='test*.py', package=''):
+    '''
+    Yield (module name, path) for the test modules under a directory,
+    in the order unittest discovery loads them. Packages are yielded
+    too, as their __init__ may define test cases.
+    '''
+
+    for name in sorted(os.listdir(start_dir)):
+        path = os.path.join(start_dir, name)
+        if os.path.isfile(path):
+            if VALID_MODULE_NAME.match(name) and fnmatch.fnmatch(name, pattern):
+                yield package + name[:-3], path
+        elif os.path.isfile(os.path.join(path, '__init__.py')):
+            yield package + name, os.path.join(path, '__init__.py')
+            for found in find_test_modules(path, pattern, package + name + '.'):
+                yield found
+
+
+def _is_main_guard(node):
+    "Is a statement `if __name__ == '__main__':`?"
+    return (
+        isinstance(node, ast.If)
+        and isinstance(node.test, ast.Compare)
+        and isinstance(node.test.left, ast.Name)
+        and node.test.left.id == '__name__'
+    )
+
+
+def _names(node):
+    "The names bound by an assignment target."
+    if isinstance(node, ast.Name):
+        return [node.id]
+    elif isinstance(node, (ast.Tuple, ast.List)):
+        return [name for element in node.elts for name in _names(element)]
+    return []
+
+
+def scan_module(path, source=None):
+    '''
+    Read the test cases of a module from its source, which is read
+    from path unless it is given.
+
+    Returns a list of (class name, test method names, LANGUAGES) in the
+    order unittest loads them. Raises Unresolved if that can't be
+    worked out without importing the module.
+    '''
+
+    try:
+        if source is None:
+            with open(path, 'rb') as f:
+                source = f.read()
+        tree = ast.parse(source, path)
+    except (SyntaxError, ValueError):
+        # Let the import report the error.
+        raise Unresolved(path)
+
+    # What the names used as base classes refer to.
+    testcase_names = set()
+    unittest_names = set()
+    classes = {}
+
+    def visit(statements, nested=False):
+        "Record the classes and imports of some module-level statements."
+        for node in statements:
+            if isinstance(node, ast.ImportFrom):
+                for alias in node.names:
+                    if node.module == 'unittest' and alias.name in UNITTEST_CASES:
+                        testcase_names.add(alias.asname or alias.name)
+                    elif alias.name == '*':
+                        raise Unresolved(path)
+            elif isinstance(node, ast.Import):
+                for alias in node.names:
+                    if alias.name == 'unittest':
+                        unittest_names.add(alias.asname or alias.name)
+            elif isinstance(node, ast.ClassDef) and not nested:
+                classes[node.name] = node
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                if node.name == 'load_tests':
+                    raise Unresolved(path)
+            elif isinstance(node, (ast.Assign, ast.AugAssign, ast.AnnAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                for target in targets:
+                    names = _names(target)
+                    # Assigning to an attribute might add a test to a class.
+                    if not names or set(names) & (set(classes) | testcase_names | {'load_tests'}):
+                        raise Unresolved(path)
+            elif isinstance(node, ast.Expr) and isinstance(node.value, ast.Constant):
+                pass
+            elif isinstance(node, ast.Pass) or (_is_main_guard(node) and not nested):
+                pass
+            elif isinstance(node, ast.Try):
+                # Usually a choice between imports.
+                visit(node.body, True)
+                for handler in node.handlers:
+                    visit(handler.body, True)
+                visit(node.orelse, True)
+                visit(node.finalbody, True)
+            elif isinstance(node, ast.If):
+                visit(node.body, True)
+                visit(node.orelse, True)
+            else:
+                # Anything else might define or change test cases.
+                raise Unresolved(path)
+
+    visit(tree.body)
+
+    resolved = {}
+
+    def resolve(name):
+        "Return (is a test case, test methods, LANGUAGES) for a class in the module."
+        if name not in resolved:
+            node = classes[name]
+            if node.keywords or node.decorator_list:
+                raise Unresolved(path)
+            is_testcase = False
+            methods = set()
+            languages = None
+            for base in node.bases:
+                if isinstance(base, ast.Name) and base.id in testcase_names:
+                    is_testcase = True
+                elif (isinstance(base, ast.Attribute) and isinstance(base.value, ast.Name)
+                        and base.value.id in unittest_names and base.attr in UNITTEST_CASES):
+                    is_testcase = True
+                elif isinstance(base, ast.Name) and base.id in classes and base.id != name:
+                    base_testcase, base_methods, base_languages = resolve(base.id)
+                    is_testcase = is_testcase or base_testcase
+                    methods |= base_methods
+                    if languages is None:
+                        languages = base_languages
+                elif isinstance(base, ast.Name) and base.id == 'object':
+                    pass
+                else:
+                    raise Unresolved(path)
+
+            for statement in node.body:
+                if isinstance(statement, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                    methods.add(statement.name)
+                elif isinstance(statement, (ast.Assign, ast.AnnAssign)):
+                    targets = statement.targets if isinstance(statement, ast.Assign) else [statement.target]
+                    names = [name for target in targets for name in _names(target)]
+                    if any(name.startswith('test') for name in names):
+                        raise Unresolved(path)
+                    if 'LANGUAGES' in names:
+                        try:
+                            languages = ast.literal_eval(statement.value)
+                        except ValueError:
+                            raise Unresolved(path)
+                elif isinstance(statement, (ast.Expr, ast.Pass, ast.ClassDef)):
+                    pass
+                else:
+                    raise Unresolved(path)
+            resolved[name] = (is_testcase, methods, languages)
+        return resolved[name]
+
+    found = []
+    for name in sorted(classes):
+        is_testcase, methods, languages = resolve(name)
+        if is_testcase:
+            tests = sorted(method for method in methods if method.startswith('test'))
+            if not tests and 'runTest' in methods:
+                tests = ['runTest']
+            found.append((name, tests, languages))
+    return found
+
+
+def read_module_name(path, source):
+    '''
+    Return the MODULE_NAME a package's __init__ assigns (its name in
+    each language), or None.
+    '''
+
+    try:
+        tree = ast.parse(source, path)
+    except (SyntaxError, ValueError):
+        return None
+    for node in tree.body:
+        if isinstance(node, ast.Assign) and 'MODULE_NAME' in [name for target in node.targets for name in _names(target)]:
+            try:
+                return ast.literal_eval(node.value)
+            except ValueError:
+                return None
+    return None
 
 
 class PyTestDiscoverer:
 
-    def __init__(self):
+    def __init__(self, stream=None, metadata_stream=None):
 
         self.collected_tests = []
+        self.metadata = {}
+
+        # If given, tests are written to stream as soon as each module
+        # has been read, and the metadata of their test cases (as JSON,
+        # one test case per line) to metadata_stream just before them.
+        self.stream = stream
+        self.metadata_stream = metadata_stream
 
     def __str__(self):
         '''
@@ -41,20 +272,108 @@ class PyTestDiscoverer:
 
         return resultstr.strip()
 
-    def collect_tests(self):
+    def collect_tests(self, static=True):
         '''
         Collect a list of potentially runnable tests
+
+        If static is True, test modules are read rather than imported
+        wherever possible.
         '''
 
+        self.collected_tests = []
+        self.metadata = {}
         loader = unittest.TestLoader()
-        suite = loader.discover('.')
+        current = bundle.current()
+        modules = current.tests if current is not None else list(find_test_modules('.'))
+        if any(path.endswith('__init__.py') and self._defines_load_tests(path) for module_name, path in modules):
+            # A package chooses its own tests; only unittest discovery
+            # knows how to ask it.
+            static = False
+        if not static:
+            self._add_imported(current.load_tests(loader) if current is not None else loader.discover('.'))
+            return
+
+        for module_name, path in modules:
+            try:
+                source = self._read(path)
+                if path.endswith('__init__.py'):
+                    module_names = read_module_name(path, source)
+                    if module_names is not None:
+                        self._add([], {module_name: {'MODULE_NAME': module_names}})
+                found = scan_module(path, source)
+            except (Unresolved, IOError, OSError):
+                if current is not None:
+                    self._add_imported(current.load_tests(loader, [module_name]))
+                elif path.endswith('__init__.py'):
+                    self._add_imported(loader.loadTestsFromName(module_name))
+                else:
+                    # Discover just this file, so it is named (and any
+                    # import error reported) as full discovery would.
+                    self._add_imported(loader.discover(os.path.dirname(path), os.path.basename(path), '.'))
+                continue
+
+            tests = []
+            metadata = {}
+            for testcase_name, methods, languages in found:
+                testcase_path = '%s.%s' % (module_name, testcase_name)
+                tests.extend('%s.%s' % (testcase_path, method) for method in methods)
+                if methods:
+                    metadata[testcase_path] = {}
+                    if languages is not None:
+                        metadata[testcase_path]['LANGUAGES'] = languages
+            self._add(tests, metadata)
+
+    def _read(self, path):
+        current = bundle.current()
+        if current is not None:
+            return current.read(path)
+        with open(path, 'rb') as f:
+            return f.read()
+
+    def _defines_load_tests(self, path):
+        try:
+            return b'load_tests' in self._read(path)
+        except (IOError, OSError):
+            return False
+
+    def _add_imported(self, suite):
+        '''
+        Add the tests of a suite loaded by importing their modules
+        '''
+
         flatresults = list(consume(suite))
-        named = [r.id() for r in flatresults]
-        self.collected_tests = named
+        metadata = {}
+        for test in flatresults:
+            testcase_path = test.id().rsplit('.', 1)[0]
+            if testcase_path not in metadata:
+                metadata[testcase_path] = {}
+                languages = getattr(test.__class__, 'LANGUAGES', None)
+                if languages is not None:
+                    metadata[testcase_path]['LANGUAGES'] = languages
+        self._add([r.id() for r in flatresults], metadata)
+
+    def _add(self, tests, metadata):
+        '''
+        Add some tests, and the metadata of their test cases
+        '''
+
+        self.collected_tests.extend(tests)
+        self.metadata.update(metadata)
+        if self.metadata_stream is not None and metadata:
+            for testcase_path, data in metadata.items():
+                self.metadata_stream.write(json.dumps(dict(data, path=testcase_path)) + '\n')
+            self.metadata_stream.flush()
+        if self.stream is not None and tests:
+            self.stream.write(''.join(test + '\n' for test in tests))
+            self.stream.flush()
 
 
 if __name__ == '__main__':
 
-    PTD = PyTestDiscoverer()
-    PTD.collect_tests()
-    print(str(PTD))
+    metadata_file = None
+    if os.environ.get(METADATA_FILE_ENV):
+        metadata_file = open(os.environ[METADATA_FILE_ENV], 'w')
+    PTD = PyTestDiscoverer(sys.stdout, metadata_file)
+    PTD.collect_tests(static='--import' not in sys.argv[1:])
+    if metadata_file is not None:
+        metadata_file.close()
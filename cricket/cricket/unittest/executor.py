@@ -7,6 +7,10 @@ Its main API is the command line, but it's just as sensible to
 call into it. See __main__ for usage
 '''
 import argparse
+import subprocess
+import sys
+import threading
+import time
 import unittest
 
 try:
@@ -15,6 +19,7 @@ except ImportError:
     coverage = None
 
 from cricket import pipes
+from cricket import scheduler
 
 
 class PyTestExecutor(object):
@@ -24,17 +29,23 @@ class PyTestExecutor(object):
     initiated by the top-level Executor class
     '''
 
-    def __init__(self):
+    def __init__(self, jobs=1):
 
         # Allows the executor to run a specified list of tests
         self.specified_list = None
 
+        # The number of test cases that may run at the same time
+        self.jobs = jobs
+
     def run_only(self, specified_list):
         self.specified_list = specified_list
 
     def stream_suite(self, suite):
 
-        pipes.PipedTestRunner().run(suite)
+        if self.jobs > 1:
+            scheduler.ScheduledTestRunner(jobs=self.jobs).run(suite)
+        else:
+            pipes.PipedTestRunner().run(suite)
 
     def stream_results(self):
         '''
@@ -57,6 +68,147 @@ class PyTestExecutor(object):
         self.stream_suite(suite)
 
 
+def split_labels(labels, workers, loader=None):
+    """Split test labels into at most `workers` shards.
+
+    Labels naming methods of the same test case are kept in the same
+    shard, so class fixtures only run once. Each test case goes to the
+    shard with the fewest labels so far.
+
+    Module names start with 'test' as often as method names do, so each
+    label is loaded to see whether it names a single test method.
+    """
+    loader = loader or unittest.TestLoader()
+    groups = []
+    by_case = {}
+    for label in labels:
+        tests = scheduler.flatten(loader.loadTestsFromName(label))
+        if len(tests) == 1 and tests[0].id() == label:
+            key = label.rpartition('.')[0]
+        else:
+            key = label
+        if key not in by_case:
+            by_case[key] = []
+            groups.append(by_case[key])
+        by_case[key].append(label)
+
+    shards = [[] for i in range(min(workers, len(groups)))]
+    for group in groups:
+        min(shards, key=len).extend(group)
+    return shards
+
+
+class PyTestShardedExecutor(PyTestExecutor):
+    '''
+    A version of PyTestExecutor that splits the tests across several
+    child executors, and merges their results into a single stream.
+
+    A test that blocks only stalls its own shard. Each test header is
+    tagged with the shard that ran it.
+    '''
+    def __init__(self, jobs=1, workers=2):
+        super(PyTestShardedExecutor, self).__init__(jobs)
+        self.workers = workers
+
+    def shard_commandline(self, labels):
+        args = [sys.executable, '-m', 'cricket.unittest.executor']
+        if self.jobs > 1:
+            args.extend(['--jobs', str(self.jobs)])
+        return args + labels
+
+    def merge_shard(self, shard, proc, records):
+        "Copy the results of a single shard onto the merged stream."
+        decoder = pipes.PipedStreamDecoder()
+        # Tests the shard has started, keyed by the shard's test id:
+        # (our test id, pre) if the protocol allows interleaving,
+        # otherwise (None, pre, output chunks).
+        running = {}
+        for data in iter(lambda: proc.stdout.read1(65536), b''):
+            for kind, token, body in decoder.feed(data):
+                if kind == 'output':
+                    records.write_preamble(body)
+                elif kind == 'start':
+                    body['shard'] = shard
+                    body.pop('id', None)
+                    if records.interleaved:
+                        running[token] = (records.write_start(body), body, [])
+                    else:
+                        running[token] = (None, body, [])
+                elif kind == 'chunk':
+                    if token in running:
+                        if records.interleaved:
+                            records.write_output(running[token][0], body)
+                        else:
+                            running[token][2].append(body)
+                    elif token == 0:
+                        records.write_preamble(body.decode('utf-8', 'replace').rstrip('\n'))
+                elif kind == 'metric':
+                    if token in running:
+                        records.write_metric(running[token][0], body['name'], body['value'])
+                elif kind == 'end':
+                    if token not in running:
+                        # A garbled or truncated shard; report it with
+                        # the suite's errors, and carry on merging.
+                        sys.stderr.write('Test shard %s ended a test it never started: %s\n'
+                                         % (shard, body.get('path', token)))
+                        sys.stderr.flush()
+                        continue
+                    merged, pre, chunks = running.pop(token)
+                    body.pop('id', None)
+                    if chunks:
+                        body['output'] = b''.join(chunks).decode('utf-8', 'replace')
+                    if records.interleaved:
+                        records.write_end(merged, body)
+                    else:
+                        records.write_record(pre, body)
+        proc.stdout.close()
+        proc.wait()
+
+        if not decoder.finished:
+            # The shard died part way through; report any tests it
+            # was running as errors so the reading side isn't left waiting.
+            error = 'Test shard %s exited unexpectedly (return code %s)' % (shard, proc.returncode)
+            for merged, pre, chunks in running.values():
+                post = {
+                    'status': 'E',
+                    'end_time': time.time(),
+                    'description': 'No description',
+                    'error': error,
+                    'output': b''.join(chunks).decode('utf-8', 'replace'),
+                }
+                if records.interleaved:
+                    records.write_end(merged, post)
+                else:
+                    records.write_record(pre, post)
+            sys.stderr.write(error + '\n')
+            sys.stderr.flush()
+
+    def stream_results(self):
+        if not self.specified_list or self.workers < 2:
+            return super(PyTestShardedExecutor, self).stream_results()
+
+        records = pipes.open_record_stream(sys.stdout)
+        records.start_heartbeat()
+        threads = []
+        for shard, labels in enumerate(split_labels(self.specified_list, self.workers)):
+            proc = subprocess.Popen(
+                self.shard_commandline(labels),
+                stdin=None,
+                stdout=subprocess.PIPE,
+                stderr=None,
+                shell=False,
+                close_fds='posix' in sys.builtin_module_names
+            )
+            t = threading.Thread(target=self.merge_shard, args=(shard, proc, records))
+            t.daemon = True
+            t.start()
+            threads.append(t)
+
+        for t in threads:
+            t.join()
+        records.close()
+
+
 class PyTestCoverageExecutor(PyTestExecutor):
     '''
     A version of PyTestExecutor that gathers coverage data.
@@ -73,6 +225,14 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser()
 
     parser.add_argument("--coverage", help="Generate coverage data for the test run", action="store_true")
+    parser.add_argument(
+        "--jobs", type=int, default=1,
+        help="Run up to this many non-conflicting test cases at the same time"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=1,
+        help="Split the test labels across this many child processes"
+    )
     parser.add_argument(
         'labels', nargs=argparse.REMAINDER,
         help='Test labels to run.'
@@ -81,9 +241,12 @@ if __name__ == '__main__':
     options = parser.parse_args()
 
     if options.coverage:
-        PTE = PyTestCoverageExecutor()
+        # Coverage data can't be gathered from several processes at once.
+        PTE = PyTestCoverageExecutor(jobs=options.jobs)
+    elif options.workers > 1:
+        PTE = PyTestShardedExecutor(jobs=options.jobs, workers=options.workers)
     else:
-        PTE = PyTestExecutor()
+        PTE = PyTestExecutor(jobs=options.jobs)
 
     if options.labels:
         PTE.run_only(options.labels)
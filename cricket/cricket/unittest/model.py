@@ -4,9 +4,40 @@ from cricket.model import Project
 
 
 class UnittestProject(Project):
+    supports_framed_protocol = True
 
     def __init__(self, options=None):
         super(UnittestProject, self).__init__()
+        self.jobs = 1
+        self.workers = 1
+        self.daemon_socket = None
+        if options and hasattr(options, 'jobs'):
+            self.jobs = options.jobs
+        if options and hasattr(options, 'workers'):
+            self.workers = options.workers
+        if options and getattr(options, 'daemon', False):
+            from cricket.unittest.daemon import DaemonExecutor, default_socket_path
+            self.executor_class = DaemonExecutor
+            self.daemon_socket = default_socket_path()
+
+    @classmethod
+    def add_arguments(cls, parser):
+        """Add unittest-specific settings to the argument parser.
+        """
+        parser.add_argument(
+            '--jobs', type=int, default=1,
+            help="Run up to this many non-conflicting test cases at the same time. "
+                 "Test cases declare what they need with a RESOURCES attribute."
+        )
+        parser.add_argument(
+            '--workers', type=int, default=1,
+            help="Split each test run across this many executor processes."
+        )
+        parser.add_argument(
+            '--daemon', action='store_true',
+            help="Run tests in a background runner that keeps the test modules imported. "
+                 "Runs carry on if the GUI is restarted, and are picked up again."
+        )
 
     def discover_commandline(self):
         "Command line: Discover all available tests in a project."
@@ -17,4 +48,8 @@ class UnittestProject(Project):
         args = [sys.executable, '-m', 'cricket.unittest.executor']
         if self.coverage:
             args.append('--coverage')
+        if self.jobs > 1:
+            args.extend(['--jobs', str(self.jobs)])
+        if self.workers > 1:
+            args.extend(['--workers', str(self.workers)])
         return args + labels
@@ -1,8 +1,12 @@
 from PyQt5.QtGui import QPixmap, QImage
 from PyQt5.QtCore import Qt, QTimer, QObject
-from PIL.ImageQt import ImageQt
 import os
-import qrcode
+
+from cricket.lazy import LazyModule
+
+# Only needed once there is something to encode.
+qrcode = LazyModule('qrcode')
+PIL_ImageQt = LazyModule('PIL.ImageQt')
 
 def get_product_name():
     path = '/proc/device-tree/model'
@@ -22,6 +26,6 @@ def create_qrcode(data):
     qr.make(fit=True)
 
     img = qr.make_image(fill='black', back_color='white')
-    qt_image = ImageQt(img).convertToFormat(QImage.Format_RGB32)
+    qt_image = PIL_ImageQt.ImageQt(img).convertToFormat(QImage.Format_RGB32)
     return QPixmap.fromImage(qt_image)
 
@@ -70,6 +70,12 @@ STATUS = {
         'tag': 'error',
         'color': '#E4742C'
     },
+    TestMethod.STATUS_TIMEOUT: {
+        'description': 'Timed out',
+        'symbol': u'T',
+        'tag': 'timeout',
+        'color': '#B8336A'
+    },
 }
 
 STATUS_DEFAULT = {
@@ -684,9 +690,9 @@ class MainWindow(object):
             self.test_status_widget.config(foreground=config['color'])
             self.test_status.set(config['symbol'])
 
-            if testMethod._result:
+            if testMethod.status is not None:
                 # Test has been executed
-                self.duration.set('%0.2fs' % testMethod._result['duration'])
+                self.duration.set('%0.2fs' % testMethod.duration)
 
                 if testMethod.output:
                     self._show_test_output(testMethod.output)
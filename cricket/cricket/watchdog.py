@@ -0,0 +1,228 @@
+"""Time limits for tests.
+
+A test case can limit how long each of its tests may run with a
+``TIMEOUT`` class attribute, in seconds::
+
+    class WiFiTest(TestCase):
+        TIMEOUT = 60
+
+A single test can be given its own limit, which takes precedence over
+the class's, with the `timeout` decorator::
+
+        @timeout(10)
+        def test_scan(self):
+            ...
+
+When a test overruns, the watchdog kills every process the test has
+started, then interrupts the test by raising `TestTimeout` in the
+thread running it. The test is reported as timed out, and the rest of
+the suite carries on. The exception is raised once: a test that
+swallows it is left to finish, while anything it starts from then on
+is killed. The test result stops watching a test before it reports
+anything, so the exception never lands in the reporting code.
+
+Processes started through `subprocess` by a test with a time limit
+are put in a session of their own, so the whole tree they start can be
+killed. Which test started a process is decided by the thread that
+started it, so processes started by other threads are left alone.
+`subprocess.Popen` is only replaced while some test is being watched.
+
+Python code can only be interrupted between bytecodes; a test blocked
+in a call that never returns is interrupted when the call is ended by
+killing its processes, or not at all.
+"""
+from __future__ import absolute_import
+
+import ctypes
+import os
+import signal
+import subprocess
+import threading
+import time
+
+# How often to kill the processes of a test again, once it has overrun.
+RETRY_INTERVAL = 1.0
+
+
+class TestTimeout(BaseException):
+    """Raised in a test that has run for longer than its time limit.
+
+    Derived from BaseException, so ``except Exception`` in a test
+    doesn't swallow it.
+    """
+    __test__ = False
+
+
+def timeout(seconds):
+    "Decorator: limit how long a single test may run."
+    def decorator(test_method):
+        test_method.TIMEOUT = seconds
+        return test_method
+    return decorator
+
+
+def declared_timeout(test):
+    "Return the time limit declared for a test, or None if there isn't one."
+    method = getattr(test, getattr(test, '_testMethodName', ''), None)
+    limit = getattr(method, 'TIMEOUT', None)
+    if limit is None:
+        limit = getattr(test.__class__, 'TIMEOUT', None)
+    return limit
+
+
+def _interrupt(ident, exception):
+    "Raise an exception in another thread (or cancel it, if exception is None)."
+    ctypes.pythonapi.PyThreadState_SetAsyncExc(
+        ctypes.c_ulong(ident),
+        ctypes.py_object(exception) if exception is not None else None,
+    )
+
+
+def _descendants(tid):
+    "The pids of all processes started by a thread, and their children."
+    found = []
+    pending = []
+    try:
+        with open('/proc/self/task/%s/children' % tid) as f:
+            pending.extend(int(pid) for pid in f.read().split())
+    except (OSError, ValueError):
+        return found
+    while pending:
+        pid = pending.pop()
+        found.append(pid)
+        try:
+            with open('/proc/%s/task/%s/children' % (pid, pid)) as f:
+                pending.extend(int(child) for child in f.read().split())
+        except (OSError, ValueError):
+            pass
+    return found
+
+
+class Watch(object):
+    "The time limit of the test running in one thread."
+    def __init__(self, test, limit):
+        self.test = test
+        self.limit = limit
+        self.deadline = time.time() + limit
+        self.ident = threading.get_ident()
+        self.native_id = threading.get_native_id()
+        self.expired = False
+
+        # Process groups started by the test, and the processes that
+        # were already running before it started.
+        self.groups = []
+        self.existing = set(_descendants(self.native_id))
+
+    def kill(self):
+        "Kill everything the test has started."
+        for pgid in self.groups:
+            try:
+                os.killpg(pgid, signal.SIGKILL)
+            except OSError:
+                pass
+        for pid in _descendants(self.native_id):
+            if pid in self.existing:
+                continue
+            try:
+                os.kill(pid, signal.SIGKILL)
+            except OSError:
+                pass
+
+
+# The watches of every watchdog, by the ident of the thread running the
+# test; and subprocess.Popen as it was before any test was watched.
+_watched = {}
+_watched_lock = threading.Lock()
+_popen = None
+
+
+def _register(watch):
+    global _popen
+    with _watched_lock:
+        if not _watched and subprocess.Popen is not _WatchedPopen:
+            _popen = subprocess.Popen
+            subprocess.Popen = _WatchedPopen
+        _watched[watch.ident] = watch
+
+
+def _unregister(ident):
+    with _watched_lock:
+        _watched.pop(ident, None)
+        if not _watched and subprocess.Popen is _WatchedPopen:
+            # A call already in _WatchedPopen finishes as it started.
+            subprocess.Popen = _popen
+
+
+class _WatchedPopen(subprocess.Popen):
+    "Puts processes started by a test with a time limit in a session of their own."
+    def __init__(self, *args, **kwargs):
+        watch = _watched.get(threading.get_ident())
+        if watch is not None:
+            kwargs['start_new_session'] = True
+        super(_WatchedPopen, self).__init__(*args, **kwargs)
+        if watch is not None:
+            watch.groups.append(self.pid)
+
+
+class Watchdog(object):
+    """Enforces the time limits of the tests run by a test result.
+
+    Tests are watched in the thread that runs them, so tests run in
+    parallel by the scheduler each have their own limit.
+    """
+    def __init__(self):
+        self._condition = threading.Condition()
+        self._watches = {}
+        self._thread = None
+
+    def arm(self, test):
+        "Start watching a test that is about to run in this thread."
+        limit = declared_timeout(test)
+        if limit is None:
+            return
+
+        watch = Watch(test, limit)
+        _register(watch)
+        with self._condition:
+            self._watches[watch.ident] = watch
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='cricket-watchdog')
+                self._thread.daemon = True
+                self._thread.start()
+            self._condition.notify()
+
+    def disarm(self):
+        """Stop watching the test running in this thread.
+
+        Returns the watch if the test overran its limit, or None. It is
+        harmless to stop watching a test that isn't watched.
+        """
+        with self._condition:
+            watch = self._watches.pop(threading.get_ident(), None)
+        if watch is None:
+            return None
+        _unregister(watch.ident)
+        if watch.expired:
+            # Don't let an interruption that hasn't been delivered yet
+            # land in the code reporting the result.
+            _interrupt(watch.ident, None)
+            return watch
+
+    def _run(self):
+        with self._condition:
+            while True:
+                now = time.time()
+                for watch in self._watches.values():
+                    if now >= watch.deadline:
+                        watch.kill()
+                        if not watch.expired:
+                            # Only once: raised again, it could land
+                            # anywhere in the test's thread.
+                            watch.expired = True
+                            _interrupt(watch.ident, TestTimeout)
+                        watch.deadline = now + RETRY_INTERVAL
+                if self._watches:
+                    wait = min(watch.deadline for watch in self._watches.values()) - now
+                    self._condition.wait(max(wait, 0.01))
+                else:
+                    self._condition.wait()
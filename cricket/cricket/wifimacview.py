@@ -1,9 +1,8 @@
 from PyQt5.QtCore import Qt, QTimer
 from PyQt5.QtWidgets import QFrame,QVBoxLayout,QLabel
-import subprocess
+from cricket import probe
 from cricket.lang import SimpleLang
 from cricket.utils import *
-import re
 
 class WifiMacView(QFrame):
     def __init__(self, parent):
@@ -21,18 +20,9 @@ class WifiMacView(QFrame):
             QTimer.singleShot(2000, self.setup_wifi_mac_with_ui)
 
     def _get_wifi_mac(self):
-        cmd = 'ifconfig wlan0'
-        proc = subprocess.run(cmd, capture_output=True, text=True, shell=True, timeout=1)
-
-        text = proc.stdout
-        pattern = r"HWaddr\s+([0-9A-Fa-f:]{17})"
-
-        match = re.search(pattern, text)
-        if match:
-            mac_address = match.group(1)
-            return mac_address
-        else:
-            return None
+        mac = probe.interface_mac('wlan0')
+        # Shown (and encoded in the QR code) in upper case, as ifconfig did.
+        return mac.upper() if mac else None
 
     def _setup_wifi_mac_qrcode(self, mac):
         mac_qrcode_layout = QVBoxLayout(self)
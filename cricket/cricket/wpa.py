@@ -0,0 +1,220 @@
+"""Talking to wpa_supplicant through its control interface.
+
+wpa_supplicant listens on a Unix datagram socket per network interface
+(/var/run/wpa_supplicant/wlan0). A client binds a socket of its own,
+so it can be answered, and sends commands as text: 'SCAN' is answered
+'OK', 'SCAN_RESULTS' with a table of the access points found. A client
+that has sent 'ATTACH' is also sent events, as they happen, each
+prefixed with its priority: '<3>CTRL-EVENT-SCAN-RESULTS '. This is what
+wpa_cli does, without a process for each command.
+
+The client never waits for wpa_supplicant: events and replies are
+handled when it is polled. When a scan finishes, the client fetches
+the results itself and announces them. `request()` sends a command and
+waits for its answer, for scripts that have nothing else to do.
+"""
+from __future__ import absolute_import
+
+import collections
+import itertools
+import os
+import select
+import socket
+import tempfile
+import time
+
+from cricket.events import EventSource
+
+CTRL_DIR = '/var/run/wpa_supplicant'
+
+# Replies with many access points can be long.
+RECEIVE_BUFFER = 65536
+
+ScanResult = collections.namedtuple('ScanResult', 'bssid frequency signal flags ssid')
+
+# Client sockets are named like wpa_cli's.
+_counter = itertools.count()
+
+
+def decode_ssid(ssid):
+    """Undo the escaping of an SSID in scan results.
+
+    wpa_supplicant escapes the bytes of an SSID that aren't printable
+    ASCII as \\xNN; most SSIDs that aren't ASCII are UTF-8.
+    """
+    data = ssid.encode('latin1', 'backslashreplace').decode('unicode_escape').encode('latin1')
+    return data.decode('utf-8', 'replace')
+
+
+def parse_scan_results(text):
+    "The access points in a reply to SCAN_RESULTS, as ScanResults."
+    results = []
+    for line in text.splitlines()[1:]:
+        fields = line.split('\t')
+        if len(fields) < 5:
+            continue
+        try:
+            frequency, signal = int(fields[1]), int(fields[2])
+        except ValueError:
+            continue
+        results.append(ScanResult(fields[0], frequency, signal, fields[3], decode_ssid(fields[4])))
+    return results
+
+
+class WpaControl(EventSource):
+    """A client of the wpa_supplicant managing one network interface.
+
+    Emits:
+        * 'event' with name (e.g. 'CTRL-EVENT-SCAN-RESULTS') and text
+          (the rest of the message) for each event wpa_supplicant sends.
+        * 'reply' with command and reply, for each command sent.
+        * 'scan_results' with results (a list of ScanResults) when a
+          scan has finished.
+        * 'closed' when wpa_supplicant has gone away.
+    """
+    def __init__(self, interface='wlan0', ctrl_dir=CTRL_DIR):
+        self.interface = interface
+        self.path = os.path.join(ctrl_dir, interface)
+        self.sock = None
+        self.scan_results = []
+
+        # The commands sent and not yet answered, oldest first.
+        self.pending = collections.deque()
+
+    def __repr__(self):
+        return u'WpaControl %s' % self.path
+
+    def _connect(self):
+        sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        local = os.path.join(tempfile.gettempdir(), 'wpa_ctrl_%d-%d' % (os.getpid(), next(_counter)))
+        try:
+            if os.path.exists(local):
+                os.unlink(local)
+            sock.bind(local)
+            sock.connect(self.path)
+        except OSError:
+            self._close(sock)
+            raise
+        return sock
+
+    def _close(self, sock):
+        local = sock.getsockname()
+        sock.close()
+        if local:
+            try:
+                os.unlink(local)
+            except OSError:
+                pass
+
+    def open(self):
+        """Connect, and ask for events.
+
+        Raises OSError if wpa_supplicant isn't running for the interface.
+        """
+        self.sock = self._connect()
+        self.sock.setblocking(False)
+        self.pending.clear()
+        self.send('ATTACH')
+
+    def close(self):
+        if self.sock is not None:
+            try:
+                self.sock.send(b'DETACH')
+            except OSError:
+                pass
+            self._close(self.sock)
+            self.sock = None
+
+    @property
+    def connected(self):
+        return self.sock is not None
+
+    def fileno(self):
+        return self.sock.fileno()
+
+    def send(self, command):
+        """Send a command; its reply will be announced when polled.
+
+        Once wpa_supplicant has gone away, commands are dropped.
+        """
+        if self.sock is None:
+            return
+        try:
+            self.sock.send(command.encode('utf-8'))
+        except BlockingIOError:
+            # wpa_supplicant is too busy to take it; the command is
+            # dropped, as an unanswered one would be.
+            return
+        except OSError:
+            self._gone()
+            return
+        self.pending.append(command)
+
+    def scan(self):
+        "Start a scan. The results are announced when it has finished."
+        self.send('SCAN')
+
+    def poll(self):
+        "Handle the events and replies that have arrived."
+        while self.sock is not None:
+            try:
+                data = self.sock.recv(RECEIVE_BUFFER)
+            except BlockingIOError:
+                return
+            except OSError:
+                self._gone()
+                return
+            self.feed(data.decode('utf-8', 'replace'))
+
+    def feed(self, message):
+        "Handle one message from wpa_supplicant."
+        if message.startswith('<'):
+            # An event, after its priority.
+            name, _, text = message.partition('>')[2].partition(' ')
+            self.emit('event', name=name, text=text)
+            if name == 'CTRL-EVENT-SCAN-RESULTS':
+                self.send('SCAN_RESULTS')
+            elif name == 'CTRL-EVENT-TERMINATING':
+                self._gone()
+        elif self.pending:
+            command = self.pending.popleft()
+            if command == 'SCAN_RESULTS':
+                self.scan_results = parse_scan_results(message)
+                self.emit('scan_results', results=self.scan_results)
+            self.emit('reply', command=command, reply=message)
+
+    def _gone(self):
+        self.close()
+        self.pending.clear()
+        self.emit('closed')
+
+    def request(self, command, timeout=5.0):
+        """Send a command, and wait for the reply.
+
+        This uses a socket of its own, so it can't be confused with
+        events. Raises OSError if wpa_supplicant isn't running for the
+        interface, socket.timeout if it doesn't answer in time.
+        """
+        sock = self._connect()
+        try:
+            sock.settimeout(timeout)
+            sock.send(command.encode('utf-8'))
+            return sock.recv(RECEIVE_BUFFER).decode('utf-8', 'replace')
+        finally:
+            self._close(sock)
+
+    def wait(self, timeout):
+        """Poll until there is something to handle, or for at most `timeout` seconds.
+
+        For use outside an event loop. Returns False if the time ran out.
+        """
+        deadline = time.monotonic() + timeout
+        while self.sock is not None:
+            remaining = deadline - time.monotonic()
+            if remaining <= 0:
+                return False
+            readable, _, _ = select.select([self.sock], [], [], remaining)
+            if readable:
+                self.poll()
+                return True
+        return False
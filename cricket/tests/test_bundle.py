@@ -0,0 +1,108 @@
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import unittest as stdlib_unittest
+import zipfile
+
+from cricket.bundle import INDEX_NAME, Bundle, build
+from cricket.compat import unittest
+
+SAMPLE = '''
+import unittest
+
+
+class SampleTest(unittest.TestCase):
+    def test_first(self):
+        pass
+
+    def test_second(self):
+        pass
+'''
+
+
+class BundleTests(unittest.TestCase):
+    "Bundle a small checkout of our own."
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmpdir, 'checkout')
+        self._write('tests/__init__.py', '')
+        self._write('tests/auto/__init__.py', '')
+        self._write('tests/auto/test_sample.py', SAMPLE)
+        self._write('tests/auto/test_broken.py', 'import no_such_module\n' + SAMPLE.replace('SampleTest', 'BrokenTest'))
+        self._write('utils/helper.py', 'ANSWER = 42\n')
+        self.archive = os.path.join(self.tmpdir, 'factorytest.pyz')
+        build(self.root, self.archive, install_path='/opt/factorytest/factorytest.pyz')
+        self.modules = set(sys.modules)
+
+    def tearDown(self):
+        for name in set(sys.modules) - self.modules:
+            del sys.modules[name]
+        if self.archive in sys.path:
+            sys.path.remove(self.archive)
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, content):
+        path = os.path.join(self.root, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(path, 'w') as f:
+            f.write(content)
+
+    def test_contents(self):
+        "Every module is in the archive with its compiled code"
+        with zipfile.ZipFile(self.archive) as archive:
+            names = set(archive.namelist())
+        for name in [
+            '__main__.py',
+            INDEX_NAME,
+            'cricket/__init__.py',
+            'cricket/__init__.pyc',
+            'cricket/languages.json',
+            'auto/test_sample.py',
+            'auto/test_sample.pyc',
+            'utils/helper.pyc',
+        ]:
+            self.assertIn(name, names)
+        self.assertNotIn('__init__.py', names)
+
+    def test_index(self):
+        "The index lists the test modules in discovery order"
+        bundle = Bundle(self.archive)
+        self.assertEqual([name for name, path in bundle.tests], ['auto', 'auto.test_broken', 'auto.test_sample'])
+        self.assertEqual(bundle.read(dict(bundle.tests)['auto.test_sample']).decode('utf-8'), SAMPLE)
+
+    def test_load_tests(self):
+        "Test modules are imported from the bundle as unittest discovery would"
+        sys.path.insert(0, self.archive)
+        loader = stdlib_unittest.TestLoader()
+        suite = Bundle(self.archive).load_tests(loader)
+        ids = []
+        stack = [suite]
+        while stack:
+            item = stack.pop(0)
+            if isinstance(item, stdlib_unittest.TestSuite):
+                stack[:0] = list(item)
+            else:
+                ids.append(item.id())
+        self.assertEqual(ids, [
+            'unittest.loader._FailedTest.auto.test_broken',
+            'auto.test_sample.SampleTest.test_first',
+            'auto.test_sample.SampleTest.test_second',
+        ])
+        self.assertEqual(len(loader.errors), 1)
+        self.assertTrue(sys.modules['auto.test_sample'].__file__.startswith(self.archive + os.sep))
+
+    def test_discover(self):
+        "The discoverer finds the tests in the bundle"
+        env = dict(os.environ, PYTHONPATH=self.archive)
+        output = subprocess.check_output(
+            [sys.executable, '-m', 'cricket.unittest.discoverer'], cwd=self.tmpdir, env=env,
+        )
+        self.assertEqual(output.decode('utf-8').split(), [
+            'auto.test_broken.BrokenTest.test_first',
+            'auto.test_broken.BrokenTest.test_second',
+            'auto.test_sample.SampleTest.test_first',
+            'auto.test_sample.SampleTest.test_second',
+        ])
@@ -0,0 +1,53 @@
+import os
+import shutil
+import tempfile
+
+from cricket.compat import unittest
+from cricket.capture import CapturedOutput, LineBuffer, RingBuffer
+
+
+class RingBufferTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_within_limit(self):
+        "Nothing is spilled while the output fits"
+        buffer = RingBuffer('quiet', 10, self.tmpdir)
+        buffer.write(b'12345')
+        buffer.write('67890')
+        self.assertEqual(buffer.contents(), b'1234567890')
+        self.assertIsNone(buffer.close())
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_spill(self):
+        "The most recent output is kept, and the file holds all of it"
+        buffer = RingBuffer('tests.Chatty.test_loop', 8, self.tmpdir)
+        for i in range(5):
+            buffer.write('line %d\n' % i)
+        self.assertEqual(len(buffer), 8)
+        self.assertEqual(buffer.contents(), b'\nline 4\n')
+        path = buffer.close()
+        self.assertEqual(path, os.path.join(self.tmpdir, 'tests.Chatty.test_loop.log'))
+        with open(path, 'rb') as f:
+            self.assertEqual(f.read(), b''.join(b'line %d\n' % i for i in range(5)))
+
+    def test_captured_output(self):
+        "Captured output behaves like the StringIO it replaces"
+        output = CapturedOutput('test', 1024, self.tmpdir)
+        print('hello', file=output)
+        self.assertEqual(output.getvalue(), 'hello\n')
+
+    def test_line_buffer(self):
+        "Error lines that don't fit are replaced by a reference to their file"
+        buffer = LineBuffer('auto-stderr', 12, self.tmpdir)
+        self.assertFalse(buffer)
+        buffer.extend(['first', 'second', 'third'])
+        self.assertTrue(buffer)
+        text = buffer.text()
+        path = os.path.join(self.tmpdir, 'auto-stderr.log')
+        self.assertEqual(text, '(Earlier output in %s)\nthird' % path)
+        with open(path) as f:
+            self.assertEqual(f.read(), 'first\nsecond\nthird\n')
@@ -0,0 +1,113 @@
+import marshal
+import os
+import shutil
+import tempfile
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from cricket import catalogue
+from cricket.catalogue import Catalogue, compile_texts, load
+from cricket.compat import unittest
+from cricket.discovery import DiscoveryCache
+from cricket.lang import SimpleLang
+from cricket.unittest.discoverer import read_module_name
+
+METADATA = {
+    'auto': {'MODULE_NAME': {'zh': '自动测试项', 'en': 'Auto Test Item'}},
+    'auto.test_bt.BTTest': {'LANGUAGES': {
+        'zh': {'BTTest': '蓝牙', 'test_scan': '扫描'},
+        'en': {'BTTest': 'Bluetooth', 'test_scan': 'Scan'},
+    }},
+    'auto.test_plain.PlainTest': {},
+}
+
+
+class CompileTests(unittest.TestCase):
+    def test_compile(self):
+        "The GUI's text is keyed by its key, and the names of the tests by their path"
+        texts = compile_texts({'zh': {'title': '工厂测试'}, 'en': {'title': 'Factory test'}}, METADATA)
+        self.assertEqual(texts, {
+            ('zh', 'title'): '工厂测试',
+            ('en', 'title'): 'Factory test',
+            ('zh', 'auto'): '自动测试项',
+            ('en', 'auto'): 'Auto Test Item',
+            ('zh', 'auto.test_bt.BTTest'): '蓝牙',
+            ('zh', 'auto.test_bt.BTTest.test_scan'): '扫描',
+            ('en', 'auto.test_bt.BTTest'): 'Bluetooth',
+            ('en', 'auto.test_bt.BTTest.test_scan'): 'Scan',
+        })
+
+    def test_lookup(self):
+        texts = Catalogue.from_metadata(METADATA)
+        self.assertEqual(texts.text('en', 'auto.test_bt.BTTest.test_scan'), 'Scan')
+        self.assertEqual(texts.get('en', 'auto.test_plain.PlainTest', 'PlainTest'), 'PlainTest')
+        with self.assertRaises(KeyError):
+            texts.text('fr', 'title')
+        self.assertEqual(texts.languages, ['en', 'zh'])
+
+    def test_module_name(self):
+        "A package's MODULE_NAME is read from its source"
+        self.assertEqual(read_module_name('__init__.py', "MODULE_NAME = {'zh': '自动', 'en': 'Auto'}\n"),
+                         {'zh': '自动', 'en': 'Auto'})
+        self.assertIsNone(read_module_name('__init__.py', 'MODULE_NAME = make_name()\n'))
+        self.assertIsNone(read_module_name('__init__.py', ''))
+
+
+class CompiledCatalogueTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.cache = DiscoveryCache(self.tmpdir, os.path.join(self.tmpdir, 'discovery.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_saved_with_discovery(self):
+        "Caching a discovery compiles the catalogue next to it"
+        self.cache.save('fingerprint', ['auto.test_bt.BTTest.test_scan'], [], METADATA)
+        with open(self.cache.catalogue_path, 'rb') as f:
+            compiled = marshal.load(f)
+        self.assertEqual(compiled['texts'][('en', 'auto.test_bt.BTTest')], 'Bluetooth')
+        self.assertEqual(load(self.cache).text('en', 'auto'), 'Auto Test Item')
+
+    def test_loaded_without_parsing(self):
+        "A compiled catalogue is used as it is"
+        self.cache.save('fingerprint', [], [], METADATA)
+        with mock.patch('cricket.catalogue.compile_texts') as compile_texts:
+            texts = load(self.cache)
+        compile_texts.assert_not_called()
+        self.assertEqual(texts.text('zh', 'auto.test_bt.BTTest.test_scan'), '扫描')
+
+    def test_languages_changed(self):
+        "The catalogue is compiled again from the cached discovery when languages.json changes"
+        self.cache.save('fingerprint', [], [], METADATA)
+        with mock.patch('cricket.catalogue._languages_source', return_value=b'{"en": {"title": "Changed"}}'):
+            texts = load(self.cache)
+        self.assertEqual(texts.text('en', 'title'), 'Changed')
+        self.assertEqual(texts.text('en', 'auto'), 'Auto Test Item')
+
+    def test_no_cache(self):
+        "With nothing cached, there is only the GUI's own text"
+        texts = load(self.cache)
+        self.assertEqual(texts.text('en', 'title'), 'Factory Test')
+        self.assertIsNone(texts.get('en', 'auto'))
+
+
+class SimpleLangTests(unittest.TestCase):
+    def setUp(self):
+        self.lang = SimpleLang()
+        self.current = mock.patch.object(catalogue, '_current', [Catalogue.from_metadata(METADATA)])
+        self.current.start()
+
+    def tearDown(self):
+        self.current.stop()
+        self.lang.current_lang = 'zh'
+
+    def test_switch(self):
+        "The language can be changed while running"
+        self.assertEqual(self.lang.get_text('title'), '工厂测试')
+        self.lang.current_lang = 'en'
+        self.assertEqual(self.lang.get_text('title'), 'Factory Test')
+        with self.assertRaises(ValueError):
+            self.lang.current_lang = 'fr'
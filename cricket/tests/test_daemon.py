@@ -0,0 +1,183 @@
+import os
+import selectors
+import shutil
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from cricket.compat import unittest
+from cricket.model import TestMethod
+from cricket.pipes import FrameParser, encode_frame
+from cricket.unittest.daemon import (
+    MESSAGE_STDERR, MESSAGE_STDOUT, Connection, DaemonClient, DaemonError, DaemonExecutor, RunLog, RunnerDaemon,
+    is_listening, runtime_directory,
+)
+from cricket.unittest.model import UnittestProject
+
+LABELS = ['tests.test_scheduler.ConflictGraphTests']
+
+
+class DaemonTests(unittest.TestCase):
+    "Run tests through a runner daemon serving this directory."
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'runner.sock')
+        self.daemon = subprocess.Popen(
+            [sys.executable, '-m', 'cricket.unittest.daemon', '--socket', self.path],
+            stdout=subprocess.DEVNULL,
+        )
+        deadline = time.time() + 30
+        while not is_listening(self.path) and time.time() < deadline:
+            time.sleep(0.05)
+
+    def tearDown(self):
+        self.daemon.terminate()
+        self.daemon.wait()
+        shutil.rmtree(self.tmpdir)
+
+    def _project(self):
+        project = UnittestProject()
+        project.daemon_socket = self.path
+        return project
+
+    def _finish(self, executor):
+        deadline = time.time() + 30
+        while executor.poll() and time.time() < deadline:
+            executor.wait(1.0)
+        return executor.project.confirm_exists('tests.test_scheduler.ConflictGraphTests.test_shared_resource')
+
+    def test_run(self):
+        "Tests run in the daemon report their results as usual"
+        test = self._finish(DaemonExecutor(self._project(), 'tests', 3, LABELS))
+        self.assertEqual(test.status, TestMethod.STATUS_PASS)
+
+    def test_attach(self):
+        "A new client can pick up an earlier run from the start"
+        first = DaemonExecutor(self._project(), 'tests', 3, LABELS)
+        deadline = time.time() + 30
+        while first.run_id is None and time.time() < deadline:
+            first.wait(1.0)
+            first.poll()
+        first.proc.close()
+
+        runs = DaemonClient(self.path, start=False).runs()
+        self.assertEqual([run['id'] for run in runs], [first.run_id])
+        self.assertEqual(runs[0]['module'], 'tests')
+
+        project = self._project()
+        executor = DaemonExecutor(project, 'tests', 3, LABELS, run_id=first.run_id)
+        test = self._finish(executor)
+        self.assertEqual(test.status, TestMethod.STATUS_PASS)
+        self.assertEqual(executor.result_count, {TestMethod.STATUS_PASS: 3})
+
+    def test_no_daemon(self):
+        "Without a daemon, there is nothing to attach to"
+        os.unlink(self.path)
+        self.assertEqual(DaemonExecutor.attach_running(self._project()), [])
+
+    def test_start(self):
+        "A client starts a daemon if there is none, without waiting for it to import the tests"
+        self.path = os.path.join(self.tmpdir, 'started.sock')
+        client = DaemonClient(self.path)
+        started = time.time()
+        run = client.run(LABELS, module='tests', count=3)
+        self.addCleanup(client.daemon.wait)
+        self.addCleanup(client.daemon.terminate)
+        self.assertLess(time.time() - started, 5)
+        self.assertIsNone(run.id)
+        run.close()
+        self.assertTrue(is_listening(self.path))
+
+    def test_failed_start(self):
+        "A daemon that never answers is reported as a suite error"
+        errors = []
+        project = self._project()
+        project.daemon_socket = os.path.join(self.tmpdir, 'broken.sock')
+        with mock.patch('sys.executable', '/bin/false'):
+            executor = DaemonExecutor(project, 'tests', 3, LABELS)
+        executor.subscribe('suite_error', lambda executor, module, error: errors.append(error))
+        deadline = time.time() + 30
+        while executor.poll() and time.time() < deadline:
+            executor.wait(1.0)
+        self.assertEqual(len(errors), 1)
+        self.assertIn('failed to start', errors[0])
+
+
+class RuntimeDirectoryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.environ = mock.patch.dict(os.environ)
+        self.environ.start()
+        os.environ.pop('XDG_RUNTIME_DIR', None)
+
+    def tearDown(self):
+        self.environ.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def test_private(self):
+        "Sockets go in a directory only this user can get into"
+        with mock.patch('tempfile.gettempdir', return_value=self.tmpdir):
+            runtime = runtime_directory()
+        self.assertEqual(os.path.dirname(runtime), self.tmpdir)
+        self.assertEqual(os.stat(runtime).st_mode & 0o777, 0o700)
+
+    def test_not_private(self):
+        "A directory others can get into isn't trusted"
+        os.mkdir(os.path.join(self.tmpdir, 'cricket-%d' % os.getuid()), 0o777)
+        os.chmod(os.path.join(self.tmpdir, 'cricket-%d' % os.getuid()), 0o777)
+        with mock.patch('tempfile.gettempdir', return_value=self.tmpdir):
+            with self.assertRaises(DaemonError):
+                runtime_directory()
+
+
+class RunLogTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _frames(self, count):
+        return [encode_frame(MESSAGE_STDOUT, ('line %d\n' % i).encode('utf-8')) for i in range(count)]
+
+    def test_capped(self):
+        "Only the latest frames are kept in memory; the rest are replayed from the spill file"
+        frames = self._frames(100)
+        log = RunLog('run', 200, self.tmpdir)
+        for frame in frames:
+            log.append(frame)
+        self.assertLessEqual(log.size, 200)
+        self.assertEqual(log.replay(), b''.join(frames))
+        log.remove()
+        self.assertEqual(os.listdir(self.tmpdir), [])
+
+    def test_spill_lost(self):
+        "If frames can't be spilled, the replay is still whole frames"
+        log = RunLog('run', 200, os.path.join(self.tmpdir, 'file'))
+        with open(os.path.join(self.tmpdir, 'file'), 'w'):
+            pass
+        for frame in self._frames(100):
+            log.append(frame)
+        kinds = [kind for kind, payload in FrameParser().feed(log.replay())]
+        self.assertEqual(kinds[0], MESSAGE_STDERR)
+        self.assertEqual(set(kinds[1:]), set([MESSAGE_STDOUT]))
+
+
+class ConnectionTests(unittest.TestCase):
+    def test_drop_twice(self):
+        "A client dropped twice in one batch is only forgotten once"
+        daemon = RunnerDaemon(os.path.join(tempfile.gettempdir(), 'unused.sock'))
+        sock, other = socket.socketpair()
+        self.addCleanup(other.close)
+        connection = Connection(sock)
+        daemon.connections[sock.fileno()] = connection
+        daemon.selector.register(sock, selectors.EVENT_READ, None)
+        daemon._drop(connection)
+        daemon._drop(connection)
+        self.assertEqual(daemon.connections, {})
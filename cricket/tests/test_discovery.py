@@ -0,0 +1,242 @@
+import os
+import shutil
+import sys
+import tempfile
+import time
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from cricket.compat import unittest
+from cricket.discovery import Discovery, DiscoveryCache, fingerprint
+from cricket.unittest.discoverer import PyTestDiscoverer, Unresolved, consume, scan_module
+from cricket.unittest.model import UnittestProject
+from tests.utils import record
+
+SAMPLE = '''
+import unittest
+
+
+class SampleTest(unittest.TestCase):
+    LANGUAGES = {
+        'zh': {'SampleTest': '示例'},
+    }
+
+    def test_first(self):
+        pass
+
+    def test_second(self):
+        pass
+'''
+
+
+class DiscoveryTests(unittest.TestCase):
+    "Discover a small test tree of our own."
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        self.root = os.path.join(self.tmpdir, 'tests')
+        os.mkdir(self.root)
+        self._write('test_sample.py', SAMPLE)
+        self.cache = DiscoveryCache(self.root, os.path.join(self.tmpdir, 'cache', 'discovery.json'))
+
+        # The discoverer runs in the test tree, so it needs to be told
+        # where cricket is.
+        path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+        self.environ = mock.patch.dict(os.environ, {'PYTHONPATH': path})
+        self.environ.start()
+        os.chdir(self.root)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        self.environ.stop()
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.root, name), 'w') as f:
+            f.write(content)
+
+    def test_fingerprint(self):
+        "Any change to the Python files in the tree changes the fingerprint"
+        before = fingerprint(self.root)
+        self.assertEqual(fingerprint(self.root), before)
+        with open(os.path.join(self.root, 'notes.txt'), 'w') as f:
+            f.write('not a test')
+        self.assertEqual(fingerprint(self.root), before)
+
+        self._write('test_sample.py', SAMPLE + '\n')
+        self.assertNotEqual(fingerprint(self.root), before)
+
+    def test_discover(self):
+        "Discovery finds the tests and their metadata, and caches them"
+        self.assertIsNone(self.cache.load())
+        current = self.cache.fingerprint()
+        discovery = Discovery(UnittestProject(), self.cache, current)
+        discovery.wait()
+        self.assertEqual(discovery.tests, [
+            'test_sample.SampleTest.test_first',
+            'test_sample.SampleTest.test_second',
+        ])
+        self.assertEqual(discovery.metadata, {
+            'test_sample.SampleTest': {'LANGUAGES': {'zh': {'SampleTest': '示例'}}},
+        })
+
+        cached = self.cache.load()
+        self.assertEqual(cached['fingerprint'], current)
+        self.assertEqual(cached['tests'], discovery.tests)
+        self.assertEqual(cached['metadata'], discovery.metadata)
+
+    def test_failed(self):
+        "A tree with a module that can't be imported isn't cached"
+        self._write('test_broken.py', 'class Broken(:\n')
+        discovery = Discovery(UnittestProject(), self.cache, self.cache.fingerprint())
+        discovery.wait()
+        self.assertEqual(discovery.failed, ['test_broken'])
+        self.assertIsNone(self.cache.load())
+
+    def test_poll(self):
+        "Discovery can be driven by polling its pipes"
+        discovery = Discovery(UnittestProject())
+        deadline = time.time() + 30
+        while discovery.poll() and time.time() < deadline:
+            time.sleep(0.05)
+        self.assertEqual(discovery.filenos(), [])
+        self.assertEqual(len(discovery.tests), 2)
+
+    def test_events(self):
+        "Tests are announced as they arrive, a module at a time"
+        os.mkdir('other')
+        self._write(os.path.join('other', '__init__.py'), '')
+        self._write(os.path.join('other', 'test_other.py'), SAMPLE.replace('SampleTest', 'OtherTest'))
+
+        def on_tests_found(discovery, tests):
+            # Their test cases are described before they arrive.
+            described = all(test.rsplit('.', 1)[0] in discovery.metadata for test in tests)
+            events.append(('tests_found', {'tests': tests, 'described': described}))
+
+        discovery = Discovery(UnittestProject())
+        events = record(discovery, 'module_found', 'discovery_end')
+        discovery.subscribe('tests_found', on_tests_found)
+        discovery.wait()
+        self.assertEqual(events, [
+            ('tests_found', {
+                'tests': ['other.test_other.OtherTest.test_first', 'other.test_other.OtherTest.test_second'],
+                'described': True,
+            }),
+            ('module_found', {'module': 'other'}),
+            ('tests_found', {
+                'tests': ['test_sample.SampleTest.test_first', 'test_sample.SampleTest.test_second'],
+                'described': True,
+            }),
+            ('module_found', {'module': 'test_sample'}),
+            ('discovery_end', {}),
+        ])
+
+
+class StaticDiscoveryTests(unittest.TestCase):
+    "Read test cases from the source of their modules."
+    def setUp(self):
+        self.cwd = os.getcwd()
+        self.tmpdir = tempfile.mkdtemp()
+        self.modules = set(sys.modules)
+        os.chdir(self.tmpdir)
+
+    def tearDown(self):
+        os.chdir(self.cwd)
+        # Forget the modules imported from the tree.
+        for name in set(sys.modules) - self.modules:
+            del sys.modules[name]
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, content):
+        with open(os.path.join(self.tmpdir, name), 'w') as f:
+            f.write(content)
+        return os.path.join(self.tmpdir, name)
+
+    def test_scan(self):
+        "Test cases are found without running the module"
+        path = self._write('test_scan.py', '''
+import unittest
+from unittest import TestCase as Base
+import no_such_module
+
+
+class Mixin(object):
+    LANGUAGES = {'en': {'test_shared': 'Shared'}}
+
+    def test_shared(self):
+        pass
+
+
+class First(Mixin, Base):
+    def test_b(self):
+        pass
+
+    def test_a(self):
+        pass
+
+    def helper(self):
+        pass
+
+
+class Second(unittest.TestCase):
+    LANGUAGES = {'zh': {'Second': '第二'}}
+
+    def runTest(self):
+        pass
+
+
+if __name__ == '__main__':
+    unittest.main()
+''')
+        self.assertEqual(scan_module(path), [
+            ('First', ['test_a', 'test_b', 'test_shared'], {'en': {'test_shared': 'Shared'}}),
+            ('Second', ['runTest'], {'zh': {'Second': '第二'}}),
+        ])
+
+    def test_unresolved(self):
+        "Modules whose test cases depend on run time are left to be imported"
+        for source in [
+            'from helpers import HardwareTest\nclass T(HardwareTest):\n    pass\n',
+            'from unittest import TestCase\nclass T(TestCase):\n    test_a = make_test()\n',
+            'from unittest import TestCase\nclass T(TestCase):\n    LANGUAGES = load_languages()\n',
+            'import sys\nif sys.platform == "linux":\n    class T(object):\n        pass\n',
+            'from unittest import TestCase\nclass T(TestCase):\n    pass\nT.test_a = lambda self: None\n',
+            'from helpers import *\n',
+            'def load_tests(loader, tests, pattern):\n    return tests\n',
+            'class Broken(:\n',
+        ]:
+            path = self._write('test_unresolved.py', source)
+            with self.assertRaises(Unresolved):
+                scan_module(path)
+
+    def test_same_as_import(self):
+        "Static discovery lists the same tests as importing them"
+        os.mkdir('pkg')
+        self._write(os.path.join('pkg', '__init__.py'), '')
+        self._write(os.path.join('pkg', 'test_static.py'), SAMPLE)
+        self._write(os.path.join('pkg', 'test_dynamic.py'), '''
+import unittest
+
+class Dynamic(unittest.TestCase):
+    pass
+
+for name in ['test_x', 'test_y']:
+    setattr(Dynamic, name, lambda self: None)
+''')
+        self._write('test_top.py', SAMPLE.replace('SampleTest', 'TopTest'))
+        self._write('helpers.py', SAMPLE)
+
+        imported = PyTestDiscoverer()
+        imported.collect_tests(static=False)
+        static = PyTestDiscoverer()
+        static.collect_tests()
+        self.assertEqual(static.collected_tests, imported.collected_tests)
+        self.assertEqual(static.metadata, imported.metadata)
+        self.assertIn('pkg.test_dynamic.Dynamic.test_y', static.collected_tests)
+
+    def test_consume(self):
+        "Nested suites are flattened in order"
+        suite = [1, [2, [3, []], 4], [[5]], 6]
+        self.assertEqual(list(consume(suite)), [1, 2, 3, 4, 5, 6])
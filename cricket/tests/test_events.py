@@ -0,0 +1,181 @@
+import gc
+
+from cricket.compat import unittest
+from cricket import events
+from cricket.events import Coalescer, EventSource
+from cricket.model import Project, TestMethod
+
+
+class Source(EventSource):
+    pass
+
+
+class SubSource(Source):
+    pass
+
+
+class SlottedSource(EventSource):
+    __slots__ = ('_subscriptions',)
+
+    def __init__(self):
+        self._subscriptions = None
+
+
+class Listener(object):
+    def __init__(self):
+        self.events = []
+
+    def on_event(self, source, **data):
+        self.events.append((source, data))
+
+    def on_batch(self, sources):
+        self.events.append(sources)
+
+
+class EventSourceTests(unittest.TestCase):
+    def tearDown(self):
+        for cls in (Source, SubSource, SlottedSource):
+            EventSource._events.pop(cls, None)
+            EventSource._inherited_events.pop(cls, None)
+        events._routes.clear()
+
+    def test_bind(self):
+        "A class subscription receives the events of every instance"
+        listener = Listener()
+        Source.bind('changed', listener.on_event)
+        first, second = Source(), Source()
+        first.emit('changed', value=1)
+        second.emit('changed', value=2)
+        second.emit('other')
+        self.assertEqual(listener.events, [(first, {'value': 1}), (second, {'value': 2})])
+
+    def test_exact_class(self):
+        "A class subscription doesn't receive the events of its subclasses"
+        calls = []
+        SubSource.bind('changed', lambda source: calls.append('sub'))
+        Source.bind('changed', lambda source: calls.append('base'))
+        SubSource().emit('changed')
+        Source().emit('changed')
+        self.assertEqual(calls, ['sub', 'base'])
+
+    def test_subclasses(self):
+        "Subscriptions can ask for the events of subclasses, bases first"
+        calls = []
+        handler = lambda source: calls.append('base')
+        SubSource.bind('changed', lambda source: calls.append('sub'))
+        Source.bind('changed', handler, subclasses=True)
+        SubSource().emit('changed')
+        Source().emit('changed')
+        self.assertEqual(calls, ['base', 'sub', 'base'])
+
+        Source.unbind('changed', handler, subclasses=True)
+        SubSource().emit('changed')
+        self.assertEqual(calls, ['base', 'sub', 'base', 'sub'])
+
+    def test_subscribe(self):
+        "An instance subscription only receives the events of its instance"
+        listener = Listener()
+        first, second = Source(), Source()
+        first.subscribe('changed', listener.on_event)
+        first.emit('changed')
+        second.emit('changed')
+        self.assertEqual(listener.events, [(first, {})])
+
+        first.unsubscribe('changed', listener.on_event)
+        first.emit('changed')
+        self.assertEqual(len(listener.events), 1)
+
+    def test_slotted(self):
+        "An event source using __slots__ can take subscriptions in its own slot"
+        listener = Listener()
+        source = SlottedSource()
+        source.emit('changed')
+        source.subscribe('changed', listener.on_event)
+        source.emit('changed')
+        self.assertEqual(listener.events, [(source, {})])
+
+    def test_unbind(self):
+        listener = Listener()
+        Source.bind('changed', listener.on_event)
+        Source.unbind('changed', listener.on_event)
+        Source().emit('changed')
+        self.assertEqual(listener.events, [])
+
+    def test_weak(self):
+        "A subscription ends when the object of its handler goes away"
+        listener = Listener()
+        source = Source()
+        Source.bind('changed', listener.on_event)
+        source.subscribe('changed', listener.on_event)
+        source.emit('changed')
+        self.assertEqual(len(listener.events), 2)
+
+        del listener
+        gc.collect()
+        source.emit('changed')
+        self.assertEqual(EventSource._events[Source]['changed'], [])
+        self.assertEqual(source._subscriptions['changed'], [])
+
+    def test_functions_kept(self):
+        "Handlers that aren't bound methods are kept while they are subscribed"
+        calls = []
+        Source.bind('changed', lambda source: calls.append(source))
+        gc.collect()
+        source = Source()
+        source.emit('changed')
+        self.assertEqual(calls, [source])
+
+
+class CoalescerTests(unittest.TestCase):
+    def setUp(self):
+        self.scheduled = []
+        self.coalescer = Coalescer(self.scheduled.append)
+
+    def tearDown(self):
+        EventSource._events.pop(Source, None)
+        events._routes.clear()
+
+    def test_batch(self):
+        "Events until the next turn of the event loop are delivered together, each source once"
+        listener = Listener()
+        Source.bind('changed', listener.on_batch, self.coalescer)
+        first, second = Source(), Source()
+        first.emit('changed')
+        second.emit('changed')
+        first.emit('changed')
+        self.assertEqual(listener.events, [])
+        self.assertEqual(self.scheduled, [self.coalescer.flush])
+
+        self.scheduled.pop()()
+        self.assertEqual(listener.events, [[first, second]])
+
+        second.emit('changed')
+        self.assertEqual(len(self.scheduled), 1)
+        self.scheduled.pop()()
+        self.assertEqual(listener.events, [[first, second], [second]])
+
+    def test_separate_topics(self):
+        "Each subscription gets its own batch"
+        listener = Listener()
+        source = Source()
+        source.subscribe('changed', listener.on_batch, self.coalescer)
+        source.subscribe('moved', listener.on_batch, self.coalescer)
+        source.emit('changed')
+        source.emit('moved')
+        self.scheduled.pop()()
+        self.assertEqual(listener.events, [[source], [source]])
+
+    def test_model(self):
+        "Status updates from the model's nodes can be coalesced"
+        listener = Listener()
+        project = Project()
+        project.refresh(['module.Case.test_%d' % i for i in range(3)])
+        TestMethod.bind('status_update', listener.on_batch, self.coalescer)
+        try:
+            testMethods = [project.find('module.Case.test_%d' % i) for i in range(3)]
+            for testMethod in testMethods + testMethods[:1]:
+                testMethod.set_result(TestMethod.STATUS_PASS, '', '', 0.1)
+            self.scheduled.pop()()
+        finally:
+            TestMethod.unbind('status_update', listener.on_batch)
+        self.assertEqual(listener.events, [testMethods])
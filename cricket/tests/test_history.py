@@ -0,0 +1,118 @@
+import os
+import shutil
+import tempfile
+
+from cricket.compat import unittest
+from cricket.executor import Executor
+from cricket.history import DurationHistory, format_duration
+from cricket.model import Project
+
+
+class DurationHistoryTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'cricket', 'durations.json')
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def test_estimate(self):
+        "Estimates follow recent durations, without jumping to each one"
+        history = DurationHistory(self.path)
+        self.assertIsNone(history.estimate('tests.Eth.test_ping'))
+        history.record('tests.Eth.test_ping', 10.0)
+        self.assertEqual(history.estimate('tests.Eth.test_ping'), 10.0)
+        history.record('tests.Eth.test_ping', 20.0)
+        self.assertAlmostEqual(history.estimate('tests.Eth.test_ping'), 13.0)
+        self.assertEqual(history.estimate('tests.Eth.test_ping', 0.5), 10.0)
+        self.assertEqual(history.estimate('tests.Eth.test_ping', 0.9), 20.0)
+
+    def test_save(self):
+        "The history survives a restart"
+        history = DurationHistory(self.path)
+        history.record('tests.Eth.test_ping', 10.0)
+        history.record_run('tests', 2.0)
+        history.save()
+        self.assertEqual(os.listdir(os.path.dirname(self.path)), ['durations.json'])
+
+        history = DurationHistory(self.path)
+        self.assertEqual(history.estimate('tests.Eth.test_ping'), 10.0)
+        self.assertEqual(history.parallelism('tests'), 2.0)
+
+    def test_unreadable(self):
+        "A damaged history is started again"
+        os.makedirs(os.path.dirname(self.path))
+        with open(self.path, 'w') as f:
+            f.write('{"tests": ')
+        history = DurationHistory(self.path)
+        self.assertIsNone(history.estimate('tests.Eth.test_ping'))
+
+    def test_cycle_time(self):
+        "Tests that have never run count as the average test, shared between workers"
+        history = DurationHistory(self.path)
+        self.assertIsNone(history.cycle_time('tests', ['tests.A.test_a']))
+        history.record('tests.A.test_a', 10.0)
+        history.record('tests.A.test_b', 30.0)
+        history.record_run('tests', 2.0)
+        paths = ['tests.A.test_a', 'tests.A.test_b', 'tests.A.test_c']
+        self.assertEqual(history.cycle_time('tests', paths), 30.0)
+
+    def test_format_duration(self):
+        self.assertEqual(format_duration(45), '45s')
+        self.assertEqual(format_duration(90), '1 min')
+        self.assertEqual(format_duration(600), '10 mins')
+        self.assertEqual(format_duration(3700), '1 hour')
+        self.assertEqual(format_duration(3 * 3600 + 5), '3 hours')
+
+
+class QuietExecutor(Executor):
+    "An executor fed by hand, without a runner."
+    def _launch(self, labels):
+        return None
+
+    def _start_readers(self):
+        pass
+
+
+class RemainingTimeTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.executor = QuietExecutor(Project(), 'tests', 3, ['tests.A.test_a', 'tests.A.test_b', 'tests.A.test_c'])
+        self.executor.history = DurationHistory(os.path.join(self.tmpdir, 'durations.json'))
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _run(self, token, path, start, end):
+        self.executor._start_test(token, {'path': path, 'start_time': start})
+        self.executor._end_test(token, {'status': 'OK', 'end_time': end, 'description': ''})
+
+    def test_history(self):
+        "Tests left to run are expected to take as long as they did last time"
+        self.executor.history.record('tests.A.test_c', 100.0)
+        self._run(1, 'tests.A.test_a', 0.0, 5.0)
+        # test_b has no history, so counts as the 5s test_a took.
+        self.assertEqual(self.executor.remaining_time(5.0), 105.0)
+
+    def test_running(self):
+        "Time already spent on a running test is deducted"
+        self.executor.history.record('tests.A.test_c', 100.0)
+        self._run(1, 'tests.A.test_a', 0.0, 5.0)
+        self.executor._start_test(2, {'path': 'tests.A.test_c', 'start_time': 5.0})
+        self.assertEqual(self.executor.remaining_time(45.0), 65.0)
+
+    def test_parallel(self):
+        "Tests run side by side finish sooner"
+        self.executor._start_test(1, {'path': 'tests.A.test_a', 'start_time': 0.0})
+        self._run(2, 'tests.A.test_b', 0.0, 10.0)
+        self._run(1, 'tests.A.test_a', 0.0, 10.0)
+        self.assertEqual(self.executor.parallelism, 2.0)
+        self.assertEqual(self.executor.remaining_time(10.0), 5.0)
+
+    def test_recorded(self):
+        "The durations of a run are kept for the next one"
+        self._run(1, 'tests.A.test_a', 0.0, 5.0)
+        self.executor._record_history()
+        history = DurationHistory(self.executor.history.path)
+        self.assertEqual(history.estimate('tests.A.test_a'), 5.0)
+        self.assertEqual(history.parallelism('tests'), 1.0)
@@ -0,0 +1,111 @@
+import os
+import socket
+
+from cricket.compat import unittest
+from cricket.hotplug import HotplugMonitor, parse_uevent
+from tests.utils import TemporaryDirectoryTestCase, record
+
+DEVICES = '/devices/platform/soc/c0a00000.usb/xhci-hcd.0.auto'
+
+
+def uevent(action, devpath, **properties):
+    "A uevent, as the kernel would send it."
+    properties = dict(properties, ACTION=action, DEVPATH=devpath)
+    fields = ['%s@%s' % (action, devpath)] + ['%s=%s' % item for item in sorted(properties.items())]
+    return '\0'.join(fields).encode('utf-8') + b'\0'
+
+
+class ParseTests(unittest.TestCase):
+    def test_parse(self):
+        self.assertEqual(
+            parse_uevent(uevent('add', DEVICES + '/usb2/2-1/2-1.1', SUBSYSTEM='usb', DEVTYPE='usb_device')),
+            {'ACTION': 'add', 'DEVPATH': DEVICES + '/usb2/2-1/2-1.1', 'SUBSYSTEM': 'usb', 'DEVTYPE': 'usb_device'},
+        )
+
+    def test_not_uevents(self):
+        "Messages that aren't from the kernel are ignored"
+        self.assertIsNone(parse_uevent(b'libudev\0\xfe\xed\xca\xfe'))
+        self.assertIsNone(parse_uevent(b'add@/devices/x\0SUBSYSTEM=usb\0'))
+
+
+class HotplugMonitorTests(TemporaryDirectoryTestCase):
+    "Drive a monitor with synthetic uevents and a sysfs of our own."
+    def setUp(self):
+        super(HotplugMonitorTests, self).setUp()
+        self.kernel, sock = socket.socketpair(socket.AF_UNIX, socket.SOCK_DGRAM)
+        sock.setblocking(False)
+        self.monitor = HotplugMonitor(sock, self.tmpdir)
+        self.events = record(self.monitor, 'usb_port', 'connector')
+        self.monitor.watch_usb_port('usb2/2-1/2-1.1')
+        self.monitor.watch_usb_port('usb3/3-1/3-1.1')
+        self.monitor.watch_connector('card2-HDMI-A-1')
+        self._write('class/drm/card2-HDMI-A-1/status', 'disconnected\n')
+
+    def tearDown(self):
+        self.monitor.close()
+        self.kernel.close()
+        super(HotplugMonitorTests, self).tearDown()
+
+    def _send(self, *uevents):
+        for data in uevents:
+            self.kernel.send(data)
+        self.monitor.poll()
+
+    def test_scan(self):
+        "The initial state is read from sysfs"
+        os.makedirs(os.path.join(self.tmpdir, 'bus/usb/devices/usb3/3-1/3-1.1'))
+        self.monitor.scan()
+        self.assertEqual(sorted(self.events, key=repr), sorted([
+            ('usb_port', {'port': 'usb2/2-1/2-1.1', 'present': False}),
+            ('usb_port', {'port': 'usb3/3-1/3-1.1', 'present': True}),
+            ('connector', {'connector': 'card2-HDMI-A-1', 'status': 'disconnected'}),
+        ], key=repr))
+
+        # Scanning again only reports changes.
+        del self.events[:]
+        self.monitor.scan()
+        self.assertEqual(self.events, [])
+
+    def test_usb(self):
+        "Devices plugged into and out of watched ports are reported"
+        self.monitor.scan()
+        del self.events[:]
+        self._send(
+            uevent('add', DEVICES + '/usb2/2-1/2-1.1', SUBSYSTEM='usb', DEVTYPE='usb_device'),
+            uevent('add', DEVICES + '/usb2/2-1/2-1.1/2-1.1:1.0', SUBSYSTEM='usb', DEVTYPE='usb_interface'),
+            uevent('add', DEVICES + '/usb2/2-1/2-1.2', SUBSYSTEM='usb', DEVTYPE='usb_device'),
+            uevent('add', DEVICES + '/usb2/2-1/2-1.1/2-1.1:1.0/host0', SUBSYSTEM='scsi'),
+            uevent('remove', DEVICES + '/usb2/2-1/2-1.1', SUBSYSTEM='usb', DEVTYPE='usb_device'),
+        )
+        self.assertEqual(self.events, [
+            ('usb_port', {'port': 'usb2/2-1/2-1.1', 'present': True}),
+            ('usb_port', {'port': 'usb2/2-1/2-1.1', 'present': False}),
+        ])
+
+    def test_connector(self):
+        "A hotplug on the card rereads the status of its connectors"
+        self.monitor.scan()
+        del self.events[:]
+        self._write('class/drm/card2-HDMI-A-1/status', 'connected\n')
+        self._send(
+            uevent('change', '/devices/platform/soc/c0400000.display/drm/card1', SUBSYSTEM='drm', HOTPLUG='1'),
+            uevent('change', '/devices/platform/soc/c0440000.hdmi/drm/card2', SUBSYSTEM='drm', HOTPLUG='1'),
+            uevent('change', '/devices/platform/soc/c0440000.hdmi/drm/card2', SUBSYSTEM='drm', HOTPLUG='1'),
+        )
+        self.assertEqual(self.events, [
+            ('connector', {'connector': 'card2-HDMI-A-1', 'status': 'connected'}),
+        ])
+
+    def test_handlers(self):
+        "Events go to the handlers bound to the monitor"
+        seen = []
+
+        def on_usb_port(monitor, port, present):
+            seen.append((port, present))
+
+        HotplugMonitor.bind('usb_port', on_usb_port)
+        try:
+            self._send(uevent('add', DEVICES + '/usb3/3-1/3-1.1', SUBSYSTEM='usb', DEVTYPE='usb_device'))
+        finally:
+            HotplugMonitor.unbind('usb_port', on_usb_port)
+        self.assertEqual(seen, [('usb3/3-1/3-1.1', True)])
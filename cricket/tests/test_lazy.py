@@ -0,0 +1,43 @@
+import sys
+
+from cricket.compat import unittest
+from cricket.lazy import LazyModule, lazy
+
+
+class LazyModuleTests(unittest.TestCase):
+    def test_import_on_use(self):
+        "The module isn't imported until one of its attributes is used"
+        sys.modules.pop('colorsys', None)
+        colorsys = LazyModule('colorsys')
+        self.assertNotIn('colorsys', sys.modules)
+        self.assertEqual(colorsys.rgb_to_hsv(1.0, 0.0, 0.0), (0.0, 1.0, 1.0))
+        self.assertIn('colorsys', sys.modules)
+
+    def test_missing(self):
+        "A module that can't be imported fails when it is used"
+        missing = LazyModule('no_such_module')
+        with self.assertRaises(ImportError):
+            missing.anything
+
+
+class LazyAttributeTests(unittest.TestCase):
+    def test_built_once(self):
+        "A lazy attribute is built the first time it is read, and kept"
+        class Window(object):
+            builds = 0
+
+            @lazy
+            def dialog(self):
+                "A dialog"
+                Window.builds += 1
+                return object()
+
+        window = Window()
+        self.assertFalse(lazy.built(window, 'dialog'))
+        self.assertEqual(Window.builds, 0)
+
+        dialog = window.dialog
+        self.assertIs(window.dialog, dialog)
+        self.assertTrue(lazy.built(window, 'dialog'))
+        self.assertEqual(Window.builds, 1)
+        self.assertEqual(Window.dialog.__doc__, 'A dialog')
@@ -1,5 +1,7 @@
+import random
+
 from cricket.compat import unittest
-from cricket.model import Project, TestModule, TestCase
+from cricket.model import Project, TestMethod, TestModule, TestCase
 
 
 class TestProject(unittest.TestCase):
@@ -849,3 +851,196 @@ class FindLabelTests(unittest.TestCase):
                 'app8.package2',
             ]),
             (6, ['app8']))
+
+
+def walk_find_tests(node, active=True, status=None, labels=None):
+    "find_tests() as it was before the model kept an index or counts: by visiting every node."
+    tests = []
+    count = 0
+    if isinstance(node, TestCase):
+        for testMethod in node.values():
+            if ((not active or testMethod.active)
+                    and (not status or testMethod.status in status)
+                    and (not labels or testMethod.path in labels)):
+                count = count + 1
+                tests.append(testMethod.path)
+        if len(node) == count:
+            return len(node), node.path
+        return count, tests
+
+    found_partial = False
+    for child in node.values():
+        if labels and child.path in labels:
+            subcount, subtests = walk_find_tests(child, True, status)
+        else:
+            subcount, subtests = walk_find_tests(child, active, status, labels)
+        if not active or child.active:
+            count = count + subcount
+            if isinstance(subtests, list):
+                found_partial = True
+                tests.extend(subtests)
+            else:
+                tests.append(subtests)
+    if not found_partial:
+        return count, [] if isinstance(node, Project) else node.path
+    return count, tests
+
+
+class PathIndexTests(unittest.TestCase):
+    "The project keeps every node indexed by path."
+    def setUp(self):
+        super(PathIndexTests, self).setUp()
+        self.project = Project()
+        self.project.refresh([
+            'app1.TestCase.test_method',
+            'app2.tests.TestCase1.test_method1',
+            'app2.tests.TestCase1.test_method2',
+            'app2.tests.TestCase2.test_method',
+        ])
+
+    def test_find(self):
+        "Nodes are found by path"
+        self.assertIsInstance(self.project.find('app2'), TestModule)
+        self.assertIsInstance(self.project.find('app2.tests.TestCase1'), TestCase)
+        method = self.project.find('app2.tests.TestCase1.test_method2')
+        self.assertIsInstance(method, TestMethod)
+        self.assertIs(self.project.confirm_exists('app2.tests.TestCase1.test_method2'), method)
+        self.assertIsNone(self.project.find('app2.tests.TestCase3'))
+
+    def test_refresh(self):
+        "Nodes removed by a refresh are removed from the index"
+        self.project.refresh([
+            'app2.tests.TestCase1.test_method1',
+            'app3.TestCase.test_method',
+        ])
+        self.assertIsNone(self.project.find('app1'))
+        self.assertIsNone(self.project.find('app1.TestCase.test_method'))
+        self.assertIsNone(self.project.find('app2.tests.TestCase2'))
+        self.assertIsNone(self.project.find('app2.tests.TestCase1.test_method2'))
+        self.assertIsNotNone(self.project.find('app2.tests.TestCase1.test_method1'))
+        self.assertIsNotNone(self.project.find('app3.TestCase.test_method'))
+
+    def test_same_as_walk(self):
+        "Selecting labels through the index gives the same answer as walking the project"
+        rng = random.Random(42)
+        labels = [
+            'app%d.pkg%d.tests%d.Case%d.test_%d' % (rng.randrange(3), rng.randrange(2), rng.randrange(2), rng.randrange(3), rng.randrange(4))
+            for i in range(80)
+        ]
+        project = Project()
+        project.refresh(labels)
+        paths = list(project._index)
+        for path in rng.sample(paths, 10):
+            project.find(path).set_active(False)
+        for path in paths:
+            node = project.find(path)
+            if isinstance(node, TestMethod) and rng.random() < 0.5:
+                node.set_result(rng.choice([TestMethod.STATUS_PASS, TestMethod.STATUS_FAIL]), '', '', 0.0)
+
+        for trial in range(300):
+            chosen = rng.sample(paths, rng.randint(1, 4))
+            active = rng.random() < 0.5
+            status = rng.choice([None, [TestMethod.STATUS_FAIL]])
+            self.assertEqual(project.find_tests(active, status, chosen), walk_find_tests(project, active, status, chosen))
+
+
+class CountTests(unittest.TestCase):
+    "Every node keeps counts of the test methods below it."
+    def _check(self, node):
+        "Check the counts of a node against its test methods; return them."
+        if isinstance(node, TestMethod):
+            return 1, int(node.active), {node.status: 1} if node.status is not None else {}
+        tests, active, statuses = 0, 0, {}
+        for child in node.values():
+            child_tests, child_active, child_statuses = self._check(child)
+            tests += child_tests
+            active += child_active
+            for status, count in child_statuses.items():
+                statuses[status] = statuses.get(status, 0) + count
+        self.assertEqual(node.test_count, tests, node)
+        self.assertEqual(node.active_count, active, node)
+        self.assertEqual(dict((k, v) for k, v in node.status_count.items() if v), statuses, node)
+        self.assertEqual(node._active_children, sum(1 for child in node.values() if child.active), node)
+        return tests, active, statuses
+
+    def test_counts(self):
+        "The counts follow tests being added, removed, activated and run"
+        rng = random.Random(7)
+        statuses = [TestMethod.STATUS_PASS, TestMethod.STATUS_FAIL, TestMethod.STATUS_ERROR]
+        project = Project()
+        for step in range(20):
+            project.refresh([
+                'app%d.pkg%d.tests.Case%d.test_%d' % (rng.randrange(3), rng.randrange(2), rng.randrange(3), rng.randrange(4))
+                for i in range(40)
+            ])
+            paths = list(project._index)
+            for path in rng.sample(paths, min(len(paths), 10)):
+                node = project.find(path)
+                if isinstance(node, TestMethod) and rng.random() < 0.6:
+                    node.set_result(rng.choice(statuses), '', '', 0.0)
+                else:
+                    node.toggle_active()
+            self._check(project)
+
+            for trial in range(20):
+                active = rng.random() < 0.5
+                status = rng.choice([None, [TestMethod.STATUS_FAIL], [TestMethod.STATUS_FAIL, TestMethod.STATUS_ERROR]])
+                self.assertEqual(project.find_tests(active, status), walk_find_tests(project, active, status))
+
+    def test_count_status(self):
+        "Results are counted by status"
+        project = Project()
+        project.refresh(['app.Case.test_a', 'app.Case.test_b', 'other.Case.test_c'])
+        project.find('app.Case.test_a').set_result(TestMethod.STATUS_FAIL, '', '', 0.0)
+        project.find('app.Case.test_b').set_result(TestMethod.STATUS_PASS, '', '', 0.0)
+        project.find('app.Case.test_a').set_result(TestMethod.STATUS_PASS, '', '', 0.0)
+        self.assertEqual(project['app'].count_status([TestMethod.STATUS_PASS]), 2)
+        self.assertEqual(project.count_status([TestMethod.STATUS_FAIL]), 0)
+        self.assertEqual(project.test_count, 3)
+        self.assertEqual(project.find_tests(True, [TestMethod.STATUS_FAIL]), (0, []))
+
+    def test_purge_active(self):
+        "Purging the only active method of a case leaves the case, and its parents, inactive"
+        project = Project()
+        project.refresh(['app.Case.test_a', 'app.Case.test_b', 'app.Other.test_c'])
+        project.find('app.Case.test_b').set_active(False)
+        project.find('app.Other').set_active(False)
+        project.refresh(['app.Case.test_b', 'app.Other.test_c'])
+        self.assertFalse(project.find('app.Case').active)
+        self.assertFalse(project['app'].active)
+        self.assertEqual(project['app'].test_count, 2)
+        self.assertEqual(project['app'].active_count, 0)
+        self._check(project)
+
+
+class TestMethodTests(unittest.TestCase):
+    def setUp(self):
+        super(TestMethodTests, self).setUp()
+        self.project = Project()
+        self.project.refresh(['app.Case.test_a'])
+        self.testMethod = self.project.find('app.Case.test_a')
+
+    def test_result(self):
+        "Each part of the result is available until the next run"
+        self.assertIsNone(self.testMethod.status)
+        self.assertIsNone(self.testMethod.output)
+        self.assertIsNone(self.testMethod.error)
+        self.assertIsNone(self.testMethod.duration)
+
+        self.testMethod.set_result(TestMethod.STATUS_FAIL, 'out', 'Traceback', 1.5, '/tmp/output.log')
+        self.assertEqual(self.testMethod.status, TestMethod.STATUS_FAIL)
+        self.assertEqual(self.testMethod.output, 'out')
+        self.assertEqual(self.testMethod.error, 'Traceback')
+        self.assertEqual(self.testMethod.duration, 1.5)
+        self.assertEqual(self.testMethod.output_file, '/tmp/output.log')
+
+        self.testMethod.set_result(TestMethod.STATUS_PASS, '', '', 0.5)
+        self.assertEqual(self.testMethod.output, '')
+        self.assertEqual(self.testMethod.error, '')
+        self.assertIsNone(self.testMethod.output_file)
+
+    def test_slots(self):
+        "Test methods have no instance dict"
+        self.assertFalse(hasattr(self.testMethod, '__dict__'))
+        with self.assertRaises(AttributeError):
+            self.testMethod.unknown = True
@@ -0,0 +1,227 @@
+import io
+import os
+import shutil
+import sys
+import tempfile
+import time
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from cricket.compat import unittest
+from cricket.executor import Executor, EventDrivenExecutor
+from cricket.model import TestMethod
+from cricket import capture, pipes
+from cricket.unittest.model import UnittestProject
+
+
+class NoisyTests(unittest.TestCase):
+    "Not run directly; streamed through a PipedTestRunner by the tests below."
+    __test__ = False
+
+    def test_markers(self):
+        print(pipes.PipedTestResult.RESULT_SEPARATOR)
+        print('\x1b[0m not json')
+        print(pipes.PipedTestRunner.END_TEST_RESULTS)
+
+    def test_big(self):
+        pipes.report_metric('bytes', 200000)
+        sys.stdout.write('x' * 200000)
+
+    def test_fail(self):
+        self.fail('broken')
+
+    def test_progress(self):
+        print('step 1')
+        sys.stdout.write('waiting...')
+        time.sleep(pipes.OUTPUT_FLUSH_INTERVAL * 3)
+        print(' done')
+
+
+def run_noisy(protocol):
+    stream = io.TextIOWrapper(io.BytesIO(), encoding='utf-8', write_through=True)
+    old_stdout = sys.stdout
+    try:
+        suite = unittest.TestLoader().loadTestsFromNames(
+            ['test_markers', 'test_big', 'test_fail'], NoisyTests)
+        pipes.PipedTestRunner(stream, protocol=protocol).run(suite)
+    finally:
+        sys.stdout = old_stdout
+    return stream.buffer.getvalue()
+
+
+def decode(data, step=None):
+    "Decode a raw stream, optionally feeding it a few bytes at a time."
+    decoder = pipes.PipedStreamDecoder()
+    step = step or len(data)
+    events = []
+    for i in range(0, len(data), step):
+        events.extend(decoder.feed(data[i:i + step]))
+    return decoder, events
+
+
+def results(events):
+    "Collect (path, status, output) for each finished test."
+    started = {}
+    found = []
+    for kind, token, body in events:
+        if kind == 'start':
+            started[token] = (body['path'], [])
+        elif kind == 'chunk' and token in started:
+            started[token][1].append(body)
+        elif kind == 'end':
+            path, chunks = started.pop(token)
+            output = b''.join(chunks).decode('utf-8') if chunks else body.get('output', '')
+            found.append((path.split('.')[-1], body['status'], output))
+    return found
+
+
+class FrameParserTests(unittest.TestCase):
+    def test_partial_frames(self):
+        "Frames split across reads are only returned once complete"
+        data = pipes.encode_frame(pipes.FRAME_START, {'id': 1}) + pipes.encode_frame(pipes.FRAME_OUTPUT, b'abc')
+        parser = pipes.FrameParser()
+        frames = []
+        for i in range(len(data)):
+            frames.extend(parser.feed(data[i:i + 1]))
+        self.assertEqual(frames, [
+            (pipes.FRAME_START, b'{"id":1}'),
+            (pipes.FRAME_OUTPUT, b'abc'),
+        ])
+
+
+class ProtocolTests(unittest.TestCase):
+    expected = [
+        ('test_markers', 'OK', '\x1f\n\x1b[0m not json\n\x03\n'),
+        ('test_big', 'OK', 'x' * 200000),
+        ('test_fail', 'F', ''),
+    ]
+
+    def test_framed(self):
+        "The framed protocol carries any output unambiguously"
+        data = run_noisy(pipes.FRAMED_PROTOCOL)
+        decoder, events = decode(data, step=7)
+        self.assertTrue(decoder.framed)
+        self.assertTrue(decoder.finished)
+        self.assertEqual(results(events), self.expected)
+        self.assertIn(('metric', 2, {'id': 2, 'name': 'bytes', 'value': 200000}), events)
+
+    def test_line(self):
+        "The line protocol is still understood"
+        decoder, events = decode(run_noisy(pipes.LINE_PROTOCOL))
+        self.assertFalse(decoder.framed)
+        self.assertTrue(decoder.finished)
+        self.assertEqual(results(events), self.expected)
+
+    def test_preamble(self):
+        "Output before the handshake is reported as plain output"
+        data = b'Creating test database...\n' + run_noisy(pipes.FRAMED_PROTOCOL)
+        decoder, events = decode(data, step=3)
+        self.assertEqual(events[0], ('output', None, 'Creating test database...'))
+        self.assertEqual(len(results(events)), 3)
+
+
+class OutputTests(unittest.TestCase):
+    def test_streamed_output(self):
+        "Output is sent line by line, and partial lines on a timer"
+        stream = io.TextIOWrapper(io.BytesIO(), encoding='utf-8', write_through=True)
+        old_stdout = sys.stdout
+        try:
+            suite = unittest.TestLoader().loadTestsFromNames(['test_progress'], NoisyTests)
+            pipes.PipedTestRunner(stream, protocol=pipes.FRAMED_PROTOCOL).run(suite)
+        finally:
+            sys.stdout = old_stdout
+        decoder, events = decode(stream.buffer.getvalue())
+        chunks = [data for kind, token, data in events if kind == 'chunk' and token == 1]
+        self.assertEqual(chunks, [b'step 1\n', b'waiting...', b' done\n'])
+
+    def test_output_limit(self):
+        "Output beyond the limit is spilled to a file, and the file noted"
+        class Records(object):
+            def __init__(self):
+                self.written = []
+
+            def write_output(self, token, data):
+                self.written.append(data)
+
+        records = Records()
+        tmpdir = tempfile.mkdtemp()
+        try:
+            with mock.patch.dict(os.environ, {capture.RUN_DIR_ENV: tmpdir}):
+                output = pipes.TestOutput(records, 1, 'tests.Noisy.test_loud', limit=10)
+                output.write('12345678\n')
+                output.write('abcdef\n')
+                output.write('more\n')
+                path = output.close()
+                output.write('late\n')
+            self.assertEqual(path, os.path.join(tmpdir, 'tests.Noisy.test_loud.log'))
+            with open(path, 'rb') as f:
+                self.assertEqual(f.read(), b'bcdef\nmore\n')
+            self.assertEqual(records.written, [
+                b'12345678\n',
+                b'a',
+                '\n[11 more bytes of output in %s]\n' % path,
+            ])
+        finally:
+            shutil.rmtree(tmpdir)
+
+
+class ExecutorTests(unittest.TestCase):
+    def _execute(self, project):
+        labels = ['tests.test_scheduler.ConflictGraphTests']
+        executor = Executor(project, 'tests', 3, labels)
+        deadline = time.time() + 30
+        while executor.poll() and time.time() < deadline:
+            time.sleep(0.05)
+        return project.confirm_exists('tests.test_scheduler.ConflictGraphTests.test_shared_resource')
+
+    def test_framed_executor(self):
+        "The executor negotiates the framed protocol with the unittest backend"
+        test = self._execute(UnittestProject())
+        self.assertEqual(test.status, TestMethod.STATUS_PASS)
+
+    def test_line_executor(self):
+        "The executor still reads the line protocol from other backends"
+        project = UnittestProject()
+        project.supports_framed_protocol = False
+        test = self._execute(project)
+        self.assertEqual(test.status, TestMethod.STATUS_PASS)
+
+
+class EventDrivenExecutorTests(unittest.TestCase):
+    def test_event_driven_executor(self):
+        "The event driven executor only wakes up when the runner writes"
+        project = UnittestProject()
+        labels = ['tests.test_scheduler.ConflictGraphTests']
+        executor = EventDrivenExecutor(project, 'tests', 3, labels)
+        deadline = time.time() + 30
+        while executor.poll() and time.time() < deadline:
+            executor.wait(1.0)
+        test = project.confirm_exists('tests.test_scheduler.ConflictGraphTests.test_disjoint_resources')
+        self.assertEqual(test.status, TestMethod.STATUS_PASS)
+
+    def test_lingering_runner(self):
+        "A runner that closes its pipes, after writing bytes that aren't UTF-8, isn't waited for"
+        script = (
+            'import os, sys, time\n'
+            'sys.stderr.buffer.write(b"/dev/ttyS1: \\xff\\xfe\\n")\n'
+            'sys.stderr.flush()\n'
+            'os.close(1)\n'
+            'os.close(2)\n'
+            'time.sleep(1)\n'
+        )
+        project = UnittestProject()
+        errors = []
+        with mock.patch.object(project, 'execute_commandline', return_value=[sys.executable, '-c', script]):
+            executor = EventDrivenExecutor(project, 'tests', 1, ['tests.test_scheduler.ConflictGraphTests'])
+        executor.subscribe('suite_error', lambda executor, module, error: errors.append(error))
+        while executor.filenos():
+            executor.wait(5.0)
+            started = time.time()
+            self.assertTrue(executor.poll())
+            self.assertLess(time.time() - started, 0.5)
+        deadline = time.time() + 30
+        while executor.poll() and time.time() < deadline:
+            executor.wait(1.0)
+        self.assertEqual(errors, ['/dev/ttyS1: ��'])
@@ -0,0 +1,120 @@
+import os
+import struct
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from cricket import probe
+from tests.utils import TemporaryDirectoryTestCase
+
+
+def edid(manufacturer='SAM', model=3911, serial=0x4d325a30, name=b'S24R35x'):
+    "A base EDID block, with a display name descriptor."
+    letters = 0
+    for letter in manufacturer:
+        letters = (letters << 5) | (ord(letter) - ord('A') + 1)
+    data = bytearray(probe.EDID_HEADER + struct.pack('>H', letters) + struct.pack('<HI', model, serial))
+    data += bytes(54 - len(data))
+    # A detailed timing, then the name, padded as the standard says.
+    data += b'\x02\x3a' + bytes(16)
+    if name is not None:
+        data += b'\x00\x00\x00\xfc\x00' + (name + b'\n').ljust(13, b' ')
+    return bytes(data.ljust(probe.EDID_LENGTH, b'\x00'))
+
+
+class ProbeTestCase(TemporaryDirectoryTestCase):
+    def setUp(self):
+        super(ProbeTestCase, self).setUp()
+        for function in (probe.interface_mac, probe.interface_flags, probe.interface_address,
+                         probe.loaded_modules, probe.processes):
+            function.cache_clear()
+
+
+class CacheTests(ProbeTestCase):
+    def test_ttl(self):
+        "Answers are remembered until their time to live has passed"
+        answers = iter([1, 2])
+        answer = probe.cached(5.0)(lambda: next(answers))
+        with mock.patch('cricket.probe._clock', return_value=100.0):
+            self.assertEqual(answer(), 1)
+        with mock.patch('cricket.probe._clock', return_value=104.9):
+            self.assertEqual(answer(), 1)
+        with mock.patch('cricket.probe._clock', return_value=105.0):
+            self.assertEqual(answer(), 2)
+
+    def test_no_answer(self):
+        "No answer is asked for again"
+        answers = iter([None, 'wlan0'])
+        answer = probe.cached(5.0)(lambda: next(answers))
+        self.assertIsNone(answer())
+        self.assertEqual(answer(), 'wlan0')
+
+    def test_cache_clear(self):
+        answers = iter([1, 2])
+        answer = probe.cached(5.0)(lambda: next(answers))
+        self.assertEqual(answer(), 1)
+        answer.cache_clear()
+        self.assertEqual(answer(), 2)
+
+
+class InterfaceTests(ProbeTestCase):
+    def test_loopback(self):
+        self.assertEqual(probe.interface_mac('lo'), '00:00:00:00:00:00')
+        self.assertTrue(probe.interface_flags('lo') & probe.IFF_UP)
+        self.assertTrue(probe.interface_up('lo'))
+        self.assertEqual(probe.interface_address('lo'), '127.0.0.1')
+
+    def test_missing(self):
+        "An interface that isn't there has no answers"
+        self.assertIsNone(probe.interface_mac('nosuch0'))
+        self.assertIsNone(probe.interface_flags('nosuch0'))
+        self.assertFalse(probe.interface_up('nosuch0'))
+        self.assertIsNone(probe.interface_address('nosuch0'))
+
+
+class ProcTests(ProbeTestCase):
+    def test_modules(self):
+        self._write('modules', '8852bs 4186112 0 - Live 0x0000000000000000\n'
+                               'bluetooth 630784 11 btusb,hci_uart, Live 0x0000000000000000\n')
+        self.assertEqual(probe.loaded_modules(self.tmpdir), frozenset(['8852bs', 'bluetooth']))
+        self.assertTrue(probe.module_loaded('8852bs', self.tmpdir))
+        self.assertFalse(probe.module_loaded('8852', self.tmpdir))
+
+    def test_no_modules(self):
+        self.assertEqual(probe.loaded_modules(self.tmpdir), frozenset())
+
+    def test_processes(self):
+        self._write('1/comm', 'systemd\n')
+        self._write('812/comm', 'wpa_supplicant\n')
+        self._write('97/comm', 'wpa_supplicant\n')
+        self._write('1033/comm', 'factorytest-gui\n')
+        self._write('self/comm', 'python\n')
+        os.makedirs(os.path.join(self.tmpdir, '1200'))
+        self.assertEqual(probe.pidof('wpa_supplicant', self.tmpdir), [97, 812])
+        self.assertEqual(probe.pidof('factorytest-gui-main', self.tmpdir), [1033])
+        self.assertTrue(probe.process_running('systemd', self.tmpdir))
+        self.assertFalse(probe.process_running('python', self.tmpdir))
+
+    def test_this_process(self):
+        with open('/proc/self/comm') as f:
+            name = f.read().strip()
+        self.assertIn(os.getpid(), probe.pidof(name))
+
+
+class EdidTests(ProbeTestCase):
+    def test_parse(self):
+        self.assertEqual(probe.parse_edid(edid()), probe.Edid('SAM', 3911, 0x4d325a30, 'S24R35x'))
+        self.assertEqual(probe.parse_edid(edid('DEL', 41200, 0, None)), probe.Edid('DEL', 41200, 0, None))
+
+    def test_not_edid(self):
+        self.assertIsNone(probe.parse_edid(b''))
+        self.assertIsNone(probe.parse_edid(b'\x00' * 128))
+        self.assertIsNone(probe.parse_edid(edid()[:100]))
+
+    def test_read(self):
+        self._write('class/drm/card2-HDMI-A-1/edid', edid())
+        self._write('class/drm/card2-HDMI-A-2/edid', b'')
+        self.assertEqual(probe.read_edid('card2-HDMI-A-1', self.tmpdir).manufacturer, 'SAM')
+        self.assertIsNone(probe.read_edid('card2-HDMI-A-2', self.tmpdir))
+        self.assertIsNone(probe.read_edid('card1-DSI-1', self.tmpdir))
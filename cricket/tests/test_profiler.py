@@ -0,0 +1,104 @@
+import atexit
+import json
+import os
+import shutil
+import sys
+import tempfile
+try:
+    from unittest import mock
+except ImportError:
+    import mock
+
+from cricket.compat import unittest
+from cricket.profiler import BUDGET_ENV, StartupProfiler
+
+
+class StartupProfilerTests(unittest.TestCase):
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+        self.path = os.path.join(self.tmpdir, 'startup.json')
+        self.profiler = StartupProfiler()
+
+    def tearDown(self):
+        self._disable(self.profiler)
+        shutil.rmtree(self.tmpdir)
+
+    def _disable(self, profiler):
+        "Stop timing imports, and don't write a report at exit."
+        sys.meta_path[:] = [finder for finder in sys.meta_path if getattr(finder, 'profiler', None) is not profiler]
+        atexit.unregister(profiler.finish)
+
+    def _report(self):
+        with mock.patch('sys.stdout'):
+            self.profiler.ready()
+        with open(self.path) as f:
+            return json.load(f)
+
+    def test_disabled(self):
+        "Nothing is recorded unless profiling is asked for"
+        self.profiler.configure(['gui'], {})
+        with self.profiler.phase('import'):
+            pass
+        self.profiler.ready()
+        self.assertFalse(self.profiler.enabled)
+        self.assertEqual(self.profiler.phases, [])
+        self.assertFalse(os.path.exists(self.path))
+
+    def test_configure(self):
+        "Profiling is enabled by the flag or the environment"
+        self.profiler.configure(['gui', '--profile', self.path], {})
+        self.assertEqual(self.profiler.path, self.path)
+        other = StartupProfiler()
+        other.configure(['gui'], {'CRICKET_PROFILE': self.path})
+        self.assertTrue(other.enabled)
+        self._disable(other)
+
+    def test_phases(self):
+        "Phases are nested as they ran, and the report ends when the first test starts"
+        self.profiler.enable(self.path)
+        self.profiler.begin('discovery')
+        with self.profiler.phase('main window'):
+            with self.profiler.phase('hardware info'):
+                pass
+        self.profiler.end('discovery')
+        report = self._report()
+
+        self.assertEqual(
+            [(phase['name'], phase['depth']) for phase in report['phases']],
+            [('interpreter', 0), ('discovery', 0), ('main window', 0), ('hardware info', 1)],
+        )
+        for phase in report['phases']:
+            self.assertGreaterEqual(phase['duration'], 0)
+        self.assertTrue(report['ready'])
+        self.assertEqual(report['marks'][-1]['name'], 'first test started')
+        self.assertEqual(report['total'], report['marks'][-1]['time'])
+
+    def test_imports(self):
+        "The time taken to import each module is recorded"
+        self._write_module('profiled_outer', 'import profiled_inner\n')
+        self._write_module('profiled_inner', 'import time\ntime.sleep(0.05)\n')
+        sys.path.insert(0, self.tmpdir)
+        try:
+            self.profiler.enable(self.path)
+            import profiled_outer
+            self.assertEqual(profiled_outer.__loader__.__class__.__name__, 'SourceFileLoader')
+        finally:
+            sys.path.remove(self.tmpdir)
+            sys.modules.pop('profiled_outer', None)
+            sys.modules.pop('profiled_inner', None)
+        imports = dict((timing['module'], timing) for timing in self._report()['imports'])
+        self.assertGreaterEqual(imports['profiled_inner']['self'], 0.05)
+        self.assertGreaterEqual(imports['profiled_outer']['cumulative'], 0.05)
+        self.assertLess(imports['profiled_outer']['self'], 0.05)
+
+    def test_budget(self):
+        "The report says whether startup was over budget"
+        self.profiler.enable(self.path)
+        with mock.patch.dict(os.environ, {BUDGET_ENV: '0'}):
+            report = self._report()
+        self.assertEqual(report['budget'], 0)
+        self.assertTrue(report['over_budget'])
+
+    def _write_module(self, name, source):
+        with open(os.path.join(self.tmpdir, name + '.py'), 'w') as f:
+            f.write(source)
@@ -0,0 +1,129 @@
+import os
+import select
+
+from cricket.sampler import Sampler, Sensor, find_thermal_zone, proc_field
+from tests.utils import TemporaryDirectoryTestCase, record
+
+
+class SensorTests(TemporaryDirectoryTestCase):
+    def test_reread(self):
+        "The file is opened once, and read again from the start"
+        sensor = Sensor('temp', self._write('temp', '45000\n'), lambda text: int(text) // 1000)
+        self.addCleanup(sensor.close)
+        self.assertEqual(sensor.read(), 45)
+        fd = sensor._fd
+        self._write('temp', '51000\n')
+        self.assertEqual(sensor.read(), 51)
+        self.assertEqual(sensor._fd, fd)
+
+    def test_unreadable(self):
+        "A file that can't be read or parsed reads as None, and is opened again"
+        path = os.path.join(self.tmpdir, 'carrier')
+        sensor = Sensor('carrier', path, int)
+        self.addCleanup(sensor.close)
+        self.assertIsNone(sensor.read())
+        self._write('carrier', 'x\n')
+        self.assertIsNone(sensor.read())
+        self.assertIsNone(sensor._fd)
+        self._write('carrier', '1\n')
+        self.assertEqual(sensor.read(), 1)
+
+    def test_back_off(self):
+        "A steady sensor is read less often, until its value changes"
+        sensor = Sensor('temp', self._write('temp', '45\n'), int, interval=1.0, max_interval=4.0)
+        self.addCleanup(sensor.close)
+        delays = []
+        for content in ['45', '45', '45', '45', '46', '46']:
+            self._write('temp', content)
+            sensor.sample()
+            delays.append(sensor.delay)
+        self.assertEqual(delays, [1.0, 2.0, 4.0, 4.0, 1.0, 2.0])
+        self.assertEqual([value for when, value in sensor.history], [45, 45, 45, 45, 46, 46])
+
+    def test_history(self):
+        "Only the latest readings are kept"
+        sensor = Sensor('temp', self._write('temp', '45\n'), int, history=3)
+        self.addCleanup(sensor.close)
+        for when in range(5):
+            sensor.sample(when)
+        self.assertEqual(list(sensor.history), [(2, 45), (3, 45), (4, 45)])
+
+
+class SamplerTests(TemporaryDirectoryTestCase):
+    def setUp(self):
+        super(SamplerTests, self).setUp()
+        self.sampler = Sampler()
+        self.events = record(self.sampler, 'sample')
+
+    def tearDown(self):
+        self.sampler.stop()
+        super(SamplerTests, self).tearDown()
+
+    def test_schedule(self):
+        "Each sensor is read when it is due; those without an interval only once"
+        self._write('temp', '45\n')
+        temp = self.sampler.add('temp', os.path.join(self.tmpdir, 'temp'), int, interval=1.0)
+        size = self.sampler.add('size', self._write('size', '7634944\n'), int, interval=None)
+        self.assertEqual(self.sampler.sample(100.0), 1.0)
+        self.assertEqual(len(size.history), 1)
+
+        self.assertEqual(self.sampler.sample(100.5), 0.5)
+        self.assertEqual(len(temp.history), 1)
+
+        self.assertEqual(self.sampler.sample(101.0), 2.0)
+        self.assertEqual(len(temp.history), 2)
+        self.assertEqual(len(size.history), 1)
+
+    def test_nothing_due(self):
+        self.sampler.add('size', self._write('size', '7634944\n'), int, interval=None)
+        self.assertIsNone(self.sampler.sample(100.0))
+        self.assertIsNone(self.sampler.sample(200.0))
+
+    def test_poll(self):
+        "Changed values are announced when polled, once each"
+        self.sampler.add('temp', self._write('temp', '45\n'), int, interval=1.0)
+        self.sampler.add('size', self._write('size', '7634944\n'), int, interval=None)
+        self.sampler.sample(100.0)
+        self.sampler.poll()
+        self.assertEqual(sorted(self.events, key=repr), sorted([
+            ('sample', {'sensor': 'temp', 'value': 45}),
+            ('sample', {'sensor': 'size', 'value': 7634944}),
+        ], key=repr))
+
+        # A steady value isn't announced again.
+        del self.events[:]
+        self.sampler.sample(101.0)
+        self.sampler.poll()
+        self.assertEqual(self.events, [])
+
+        self._write('temp', '46\n')
+        self.sampler.sample(103.0)
+        self.sampler.poll()
+        self.assertEqual(self.events, [('sample', {'sensor': 'temp', 'value': 46})])
+        self.assertEqual([value for when, value in self.sampler.history('temp')], [45, 45, 46])
+        self.assertEqual(self.sampler.value('temp'), 46)
+
+    def test_thread(self):
+        "The sampler's thread makes its descriptor readable"
+        self.sampler.add('size', self._write('size', '7634944\n'), int, interval=None)
+        self.sampler.start()
+        readable, _, _ = select.select([self.sampler.fileno()], [], [], 5)
+        self.assertEqual(readable, [self.sampler.fileno()])
+        self.sampler.poll()
+        self.assertEqual(self.events, [('sample', {'sensor': 'size', 'value': 7634944})])
+
+
+class HelperTests(TemporaryDirectoryTestCase):
+    def test_thermal_zone(self):
+        self._write('thermal_zone0/type', 'soc_thermal\n')
+        self._write('thermal_zone1/type', 'cluster0_thermal\n')
+        self.assertEqual(find_thermal_zone('cluster0_thermal', self.tmpdir),
+                         os.path.join(self.tmpdir, 'thermal_zone1', 'temp'))
+        self.assertIsNone(find_thermal_zone('gpu_thermal', self.tmpdir))
+        self.assertIsNone(find_thermal_zone('cluster0_thermal', os.path.join(self.tmpdir, 'missing')))
+
+    def test_proc_field(self):
+        text = 'processor\t: 0\nmodel name\t: Spacemit(R) X60\nisa\t\t: rv64imafdcv\n'
+        self.assertEqual(proc_field(text, 'model name'), 'Spacemit(R) X60')
+        with self.assertRaises(ValueError):
+            proc_field(text, 'mmu')
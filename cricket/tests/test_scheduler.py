@@ -0,0 +1,97 @@
+import json
+import time
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from cricket.compat import unittest
+from cricket.pipes import PipedTestResult, PipedTestRunner
+from cricket.scheduler import ScheduledTestRunner, build_conflict_graph, build_units
+
+
+def make_case(name, resources, delay=0.0, output=None):
+    "Build a throwaway TestCase class that sleeps, and optionally prints."
+    def test_method(self):
+        if output:
+            print(output)
+        time.sleep(delay)
+
+    attrs = {'test_method': test_method}
+    if resources is not None:
+        attrs['RESOURCES'] = resources
+    return type(name, (unittest.TestCase,), attrs)
+
+
+def parse_records(text):
+    "Split a piped result stream into (pre, post) pairs."
+    markers = (PipedTestResult.RESULT_SEPARATOR, PipedTestRunner.START_TEST_RESULTS)
+    lines = text.splitlines()
+    records = []
+    for i, line in enumerate(lines):
+        if line in markers:
+            records.append((json.loads(lines[i + 1]), json.loads(lines[i + 2])))
+    return lines, records
+
+
+class ConflictGraphTests(unittest.TestCase):
+    "Check the conflict graph built from resource declarations."
+    def _units(self, *cases):
+        return build_units(unittest.TestSuite(
+            unittest.TestLoader().loadTestsFromTestCase(case) for case in cases
+        ))
+
+    def test_disjoint_resources(self):
+        "Test cases using different resources don't conflict"
+        units = self._units(make_case('Eth0', ('eth0',)), make_case('WiFi', 'wlan0'))
+        self.assertEqual(build_conflict_graph(units), [set(), set()])
+
+    def test_shared_resource(self):
+        "Test cases sharing a resource conflict"
+        units = self._units(make_case('Play', ('audio:hw1',)), make_case('Record', ('audio:hw1', 'mic')))
+        self.assertEqual(build_conflict_graph(units), [{1}, {0}])
+
+    def test_undeclared_resources(self):
+        "Test cases without a declaration conflict with everything"
+        units = self._units(make_case('Eth0', ('eth0',)), make_case('Legacy', None), make_case('Free', ()))
+        self.assertEqual(build_conflict_graph(units), [{1}, {0, 2}, {1}])
+
+
+class ScheduledRunnerTests(unittest.TestCase):
+    "Check the stream produced by running test cases in parallel."
+    def _run(self, *cases):
+        suite = unittest.TestSuite(
+            unittest.TestLoader().loadTestsFromTestCase(case) for case in cases
+        )
+        stream = StringIO()
+        ScheduledTestRunner(stream, jobs=4).run(suite)
+        return parse_records(stream.getvalue())
+
+    def test_parallel_records(self):
+        "Non-conflicting tests overlap, and each record stays intact"
+        lines, records = self._run(
+            make_case('Eth0', ('eth0',), 0.3, output='eth0 up'),
+            make_case('Eth1', ('eth1',), 0.3, output='eth1 up'),
+        )
+        self.assertEqual(lines[0], PipedTestRunner.START_TEST_RESULTS)
+        self.assertEqual(lines[-1], PipedTestRunner.END_TEST_RESULTS)
+        self.assertEqual(len(records), 2)
+
+        outputs = dict((pre['path'].split('.')[-2], post['output']) for pre, post in records)
+        self.assertEqual(outputs, {'Eth0': 'eth0 up\n', 'Eth1': 'eth1 up\n'})
+
+        (pre1, post1), (pre2, post2) = records
+        self.assertLess(max(pre1['start_time'], pre2['start_time']),
+                        min(post1['end_time'], post2['end_time']))
+
+    def test_conflicting_records(self):
+        "Conflicting tests never overlap"
+        lines, records = self._run(
+            make_case('Play', ('audio:hw1',), 0.1),
+            make_case('Record', ('audio:hw1',), 0.1),
+            make_case('Legacy', None, 0.1),
+        )
+        self.assertEqual(len(records), 3)
+        spans = sorted((pre['start_time'], post['end_time']) for pre, post in records)
+        for (start1, end1), (start2, end2) in zip(spans, spans[1:]):
+            self.assertLessEqual(end1, start2)
@@ -1,8 +1,14 @@
+import io
 import subprocess
 import unittest
+try:
+    from unittest import mock
+except ImportError:
+    import mock
 
 import cricket
 
+from cricket.pipes import FramedRecordStream, PipedRecordReader, PipedStreamDecoder
 from cricket.unittest import discoverer
 from cricket.unittest import executor
 
@@ -52,6 +58,101 @@ class TestExecutorCmdLine(unittest.TestCase):
         self.assertNotIn('tests.test_unit_integration.TestExecutorCmdLine',
                           output)
 
+    def test_workers(self):
+        '''
+        Test that results from several worker processes are merged
+        into a single well-formed stream
+        '''
+
+        labels = [
+            'tests.test_unit_integration.TestCollection',
+            'tests.test_scheduler.ConflictGraphTests.test_disjoint_resources',
+            'tests.test_scheduler.ConflictGraphTests.test_shared_resource',
+        ]
+        cmdline = ['python', '-m', 'cricket.unittest.executor', '--workers', '2'] + labels
+
+        runner = subprocess.Popen(
+            cmdline,
+            stdin=None,
+            stdout=subprocess.PIPE,
+            stderr=subprocess.PIPE,
+            shell=False,
+        )
+
+        reader = PipedRecordReader()
+        results = {}
+        for line in runner.stdout:
+            event = reader.feed(line.decode('utf-8').rstrip('\n'))
+            if event and event[0] == 'result':
+                pre, post = event[1]
+                results[pre['path']] = (pre['shard'], post['status'])
+        runner.wait()
+
+        self.assertTrue(reader.finished)
+        self.assertEqual(sorted(results), [
+            'tests.test_scheduler.ConflictGraphTests.test_disjoint_resources',
+            'tests.test_scheduler.ConflictGraphTests.test_shared_resource',
+            'tests.test_unit_integration.TestCollection.test_testCollection',
+        ])
+        self.assertEqual(
+            results['tests.test_scheduler.ConflictGraphTests.test_disjoint_resources'][0],
+            results['tests.test_scheduler.ConflictGraphTests.test_shared_resource'][0])
+        self.assertEqual(set(status for shard, status in results.values()), set(['OK']))
+
+
+class TestSplitLabels(unittest.TestCase):
+
+    def test_split_keeps_test_cases_together(self):
+        '''
+        Methods of the same test case land in the same shard
+        '''
+
+        shards = executor.split_labels([
+            'tests.test_scheduler.ConflictGraphTests.test_disjoint_resources',
+            'tests.test_scheduler.ConflictGraphTests.test_shared_resource',
+            'tests.test_lazy.LazyModuleTests.test_import_on_use',
+            'tests.test_history',
+        ], 3)
+        self.assertEqual(shards, [
+            ['tests.test_scheduler.ConflictGraphTests.test_disjoint_resources',
+             'tests.test_scheduler.ConflictGraphTests.test_shared_resource'],
+            ['tests.test_lazy.LazyModuleTests.test_import_on_use'],
+            ['tests.test_history'],
+        ])
+
+    def test_split_modules(self):
+        '''
+        Modules are shared out, though their names look like test methods
+        '''
+
+        shards = executor.split_labels(['tests.test_events', 'tests.test_history', 'tests.test_lazy'], 3)
+        self.assertEqual(shards, [['tests.test_events'], ['tests.test_history'], ['tests.test_lazy']])
+
+
+class TestMergeShard(unittest.TestCase):
+
+    def test_end_without_start(self):
+        '''
+        A shard ending a test it never started is reported, not fatal
+        '''
+
+        shard_out = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+        shard = FramedRecordStream(shard_out)
+        shard.write_end(7, {'status': 'OK', 'path': 'auto.test_08_bt'})
+        shard.write_record({'path': 'auto.test_09_wifi'}, {'status': 'OK'})
+        shard.close()
+        proc = mock.Mock(returncode=0)
+        proc.stdout = io.BytesIO(shard_out.buffer.getvalue())
+
+        merged_out = io.TextIOWrapper(io.BytesIO(), encoding='utf-8')
+        with mock.patch('sys.stderr', new_callable=io.StringIO) as stderr:
+            executor.PyTestShardedExecutor().merge_shard(1, proc, FramedRecordStream(merged_out))
+        self.assertIn('auto.test_08_bt', stderr.getvalue())
+
+        events = PipedStreamDecoder().feed(merged_out.buffer.getvalue())
+        tests = [(kind, body.get('path')) for kind, token, body in events if kind in ('start', 'end')]
+        self.assertEqual(tests, [('start', 'auto.test_09_wifi'), ('end', None)])
+
 
 
 
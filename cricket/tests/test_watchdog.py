@@ -0,0 +1,131 @@
+import os
+import subprocess
+import threading
+import time
+try:
+    from StringIO import StringIO
+except ImportError:
+    from io import StringIO
+
+from cricket.compat import unittest
+from cricket.pipes import PipedTestRunner
+from cricket.scheduler import ScheduledTestRunner
+from cricket.watchdog import Watchdog, declared_timeout, timeout
+
+from tests.test_scheduler import parse_records
+
+
+class StuckTests(unittest.TestCase):
+    "Not run directly; run through a PipedTestRunner by the tests below."
+    __test__ = False
+    TIMEOUT = 0.5
+    RESOURCES = ()
+
+    def test_busy_loop(self):
+        i = 0
+        while i < 10:
+            pass
+
+    def test_subprocess(self):
+        subprocess.run(['sleep', '30'])
+
+    def test_stubborn(self):
+        while True:
+            try:
+                time.sleep(0.1)
+            except BaseException:
+                print('ignored')
+                break
+        self.fail('not reached')
+
+    @timeout(5)
+    def test_quick(self):
+        pass
+
+    @timeout(0.5)
+    def test_slow_teardown(self):
+        "Overruns after its body, while tearing down."
+        self.addCleanup(time.sleep, 1.5)
+
+
+class WatchdogTests(unittest.TestCase):
+    def _run(self, runner, *names):
+        suite = unittest.TestLoader().loadTestsFromNames(names, StuckTests)
+        start = time.time()
+        runner.run(suite)
+        lines, records = parse_records(runner.stream.getvalue())
+        results = dict((pre['path'].split('.')[-1], post) for pre, post in records)
+        return time.time() - start, results
+
+    def test_declared_timeout(self):
+        "A decorated test overrides the limit of its class"
+        self.assertEqual(declared_timeout(StuckTests('test_busy_loop')), 0.5)
+        self.assertEqual(declared_timeout(StuckTests('test_quick')), 5)
+        self.assertIsNone(declared_timeout(self))
+
+    def test_timeouts(self):
+        "Tests that overrun are stopped and reported, and the suite carries on"
+        elapsed, results = self._run(
+            PipedTestRunner(StringIO()),
+            'test_busy_loop', 'test_subprocess', 'test_stubborn', 'test_quick',
+        )
+        self.assertLess(elapsed, 10)
+        self.assertEqual(results['test_busy_loop']['status'], 'T')
+        self.assertIn('timed out after 0.5 seconds', results['test_busy_loop']['error'])
+        self.assertIn('TestTimeout', results['test_busy_loop']['error'])
+        self.assertEqual(results['test_subprocess']['status'], 'T')
+        self.assertEqual(results['test_stubborn']['status'], 'T')
+        self.assertEqual(results['test_stubborn']['output'], 'ignored\n')
+        self.assertEqual(results['test_quick']['status'], 'OK')
+
+    def test_interrupted_once(self):
+        "A test is interrupted once, and nothing escapes into the runner"
+        elapsed, results = self._run(PipedTestRunner(StringIO()), 'test_stubborn', 'test_slow_teardown', 'test_quick')
+        self.assertEqual(results['test_stubborn']['status'], 'T')
+        self.assertIn('not reached', results['test_stubborn']['error'])
+        self.assertEqual(results['test_slow_teardown']['status'], 'T')
+        self.assertEqual(results['test_quick']['status'], 'OK')
+
+    def test_popen_restored(self):
+        "subprocess.Popen is only replaced while a test is watched"
+        popen = subprocess.Popen
+        self._run(PipedTestRunner(StringIO()), 'test_quick')
+        self.assertIs(subprocess.Popen, popen)
+
+    def test_two_watchdogs(self):
+        "Watchdogs watching at the same time put back the original Popen"
+        popen = subprocess.Popen
+        first, second = Watchdog(), Watchdog()
+        first.arm(StuckTests('test_quick'))
+        thread = threading.Thread(target=lambda: (second.arm(StuckTests('test_quick')), second.disarm()))
+        thread.start()
+        thread.join()
+        self.assertIsNot(subprocess.Popen, popen)
+        first.disarm()
+        self.assertIs(subprocess.Popen, popen)
+
+    def test_other_threads(self):
+        "Processes started by a thread whose test isn't watched are left alone"
+        watchdog = Watchdog()
+        started = []
+        thread = threading.Thread(target=lambda: started.append(subprocess.Popen(['sleep', '30'])))
+        watchdog.arm(StuckTests('test_quick'))
+        try:
+            thread.start()
+            thread.join()
+        finally:
+            watchdog.disarm()
+        proc = started[0]
+        self.addCleanup(proc.wait)
+        self.addCleanup(proc.kill)
+        self.assertEqual(os.getsid(proc.pid), os.getsid(0))
+
+    def test_scheduled_timeouts(self):
+        "Tests run by the scheduler are held to their limits too"
+        elapsed, results = self._run(
+            ScheduledTestRunner(StringIO(), jobs=2),
+            'test_busy_loop', 'test_subprocess',
+        )
+        self.assertLess(elapsed, 10)
+        self.assertEqual(results['test_busy_loop']['status'], 'T')
+        self.assertEqual(results['test_subprocess']['status'], 'T')
@@ -0,0 +1,148 @@
+import os
+import shutil
+import socket
+import tempfile
+import threading
+
+from cricket.compat import unittest
+from cricket.wpa import ScanResult, WpaControl, decode_ssid, parse_scan_results
+from tests.utils import record
+
+SCAN_RESULTS = (
+    'bssid / frequency / signal level / flags / ssid\n'
+    '2c:b2:1a:5e:30:11\t2437\t-48\t[WPA2-PSK-CCMP][ESS]\tfactory\n'
+    '9c:a6:15:02:7e:40\t5180\t-71\t[ESS]\t\\xe5\\xb7\\xa5\\xe5\\x8e\\x82\n'
+)
+
+
+class StandIn(object):
+    "A wpa_supplicant control socket, answering as wpa_supplicant would."
+    def __init__(self, path):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.sock.bind(path)
+        self.sock.settimeout(5)
+        self.attached = set()
+        self.results = SCAN_RESULTS
+
+    def close(self):
+        self.sock.close()
+
+    def answer(self):
+        "Answer the next command, and return it."
+        data, client = self.sock.recvfrom(4096)
+        command = data.decode('utf-8')
+        if command == 'ATTACH':
+            self.attached.add(client)
+            reply = 'OK\n'
+        elif command == 'DETACH':
+            self.attached.discard(client)
+            reply = 'OK\n'
+        elif command == 'SCAN':
+            reply = 'OK\n'
+        elif command == 'SCAN_RESULTS':
+            reply = self.results
+        elif command == 'PING':
+            reply = 'PONG\n'
+        else:
+            reply = 'UNKNOWN COMMAND\n'
+        self.sock.sendto(reply.encode('utf-8'), client)
+        return command
+
+    def event(self, message):
+        for client in self.attached:
+            self.sock.sendto(message.encode('utf-8'), client)
+
+
+class ParseTests(unittest.TestCase):
+    def test_scan_results(self):
+        self.assertEqual(parse_scan_results(SCAN_RESULTS), [
+            ScanResult('2c:b2:1a:5e:30:11', 2437, -48, '[WPA2-PSK-CCMP][ESS]', 'factory'),
+            ScanResult('9c:a6:15:02:7e:40', 5180, -71, '[ESS]', '工厂'),
+        ])
+        self.assertEqual(parse_scan_results('bssid / frequency / signal level / flags / ssid\n'), [])
+
+    def test_ssid(self):
+        self.assertEqual(decode_ssid('caf\\xc3\\xa9'), 'café')
+        self.assertEqual(decode_ssid('say \\"hi\\"'), 'say "hi"')
+
+
+class WpaControlTests(unittest.TestCase):
+    def setUp(self):
+        self.ctrl_dir = tempfile.mkdtemp()
+        self.server = StandIn(os.path.join(self.ctrl_dir, 'wlan0'))
+        self.wpa = WpaControl('wlan0', self.ctrl_dir)
+        self.events = record(self.wpa, 'event', 'reply', 'scan_results', 'closed')
+        self.wpa.open()
+        self.assertEqual(self.server.answer(), 'ATTACH')
+
+    def tearDown(self):
+        self.wpa.close()
+        self.server.close()
+        shutil.rmtree(self.ctrl_dir)
+
+    def test_not_running(self):
+        "Connecting fails when wpa_supplicant isn't running for the interface"
+        with self.assertRaises(OSError):
+            WpaControl('wlan1', self.ctrl_dir).open()
+
+    def test_scan(self):
+        "When a scan has finished, its results are fetched and announced"
+        self.wpa.scan()
+        self.assertEqual(self.server.answer(), 'SCAN')
+        self.assertTrue(self.wpa.wait(5))
+        self.assertEqual(self.events, [
+            ('reply', {'command': 'ATTACH', 'reply': 'OK\n'}),
+            ('reply', {'command': 'SCAN', 'reply': 'OK\n'}),
+        ])
+
+        del self.events[:]
+        self.server.event('<3>CTRL-EVENT-SCAN-STARTED ')
+        self.server.event('<3>CTRL-EVENT-SCAN-RESULTS ')
+        self.assertTrue(self.wpa.wait(5))
+        self.assertEqual(self.server.answer(), 'SCAN_RESULTS')
+        self.assertTrue(self.wpa.wait(5))
+        results = parse_scan_results(SCAN_RESULTS)
+        self.assertEqual(self.events, [
+            ('event', {'name': 'CTRL-EVENT-SCAN-STARTED', 'text': ''}),
+            ('event', {'name': 'CTRL-EVENT-SCAN-RESULTS', 'text': ''}),
+            ('scan_results', {'results': results}),
+            ('reply', {'command': 'SCAN_RESULTS', 'reply': SCAN_RESULTS}),
+        ])
+        self.assertEqual(self.wpa.scan_results, results)
+
+    def test_subscribe(self):
+        "Handlers can be subscribed to one client"
+        seen = []
+        self.wpa.subscribe('scan_results', lambda wpa, results: seen.append(len(results)))
+        self.server.event('<3>CTRL-EVENT-SCAN-RESULTS ')
+        self.wpa.wait(5)
+        self.server.answer()
+        self.wpa.wait(5)
+        self.assertEqual(seen, [2])
+
+    def test_request(self):
+        "A request waits for its own reply, apart from events"
+        self.server.event('<3>CTRL-EVENT-SCAN-STARTED ')
+        thread = threading.Thread(target=self.server.answer)
+        thread.start()
+        try:
+            self.assertEqual(self.wpa.request('PING'), 'PONG\n')
+        finally:
+            thread.join()
+
+    def test_terminating(self):
+        "The client closes when wpa_supplicant goes away"
+        self.server.event('<3>CTRL-EVENT-TERMINATING ')
+        self.assertTrue(self.wpa.wait(5))
+        self.assertFalse(self.wpa.connected)
+        self.assertEqual(self.events[-1], ('closed', {}))
+        # Commands sent after that are dropped.
+        self.wpa.scan()
+        self.assertFalse(self.wpa.pending)
+
+    def test_gone(self):
+        "Sending to a wpa_supplicant that has gone closes the client"
+        self.server.close()
+        self.wpa.scan()
+        self.assertFalse(self.wpa.connected)
+        self.assertEqual(self.events, [('closed', {})])
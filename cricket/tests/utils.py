@@ -0,0 +1,46 @@
+"Helpers shared by the tests."
+import os
+import shutil
+import tempfile
+
+from cricket.compat import unittest
+
+
+def record(source, *events):
+    """Subscribe to events from one source.
+
+    Returns the list they are appended to, as (event, data), in the
+    order they are emitted.
+    """
+    recorded = []
+
+    def recorder(event):
+        return lambda source, **data: recorded.append((event, data))
+
+    for event in events:
+        source.subscribe(event, recorder(event))
+    return recorded
+
+
+class TemporaryDirectoryTestCase(unittest.TestCase):
+    "A test case with a directory of its own (e.g. standing in for sysfs), in self.tmpdir."
+    def setUp(self):
+        self.tmpdir = tempfile.mkdtemp()
+
+    def tearDown(self):
+        shutil.rmtree(self.tmpdir)
+
+    def _write(self, name, content):
+        """Write a file in the directory, and return its path.
+
+        The file is written in place, as the kernel does, so descriptors
+        already open on it see the change.
+        """
+        path = os.path.join(self.tmpdir, name)
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        binary = 'b' if isinstance(content, bytes) else ''
+        with open(path, ('r+' if os.path.exists(path) else 'w') + binary) as f:
+            f.write(content)
+            f.truncate()
+        return path
@@ -3,6 +3,8 @@ from unittest import TestCase
 import os
 
 class CTPTest(TestCase):
+    RESOURCES = ('i2c-6',)
+
     LANGUAGES = {
         'zh': {
             'CTPTest': '触摸屏',
@@ -3,6 +3,8 @@ from unittest import TestCase
 import os
 
 class NVMeSSDTest(TestCase):
+    RESOURCES = ('nvme0',)
+
     LANGUAGES = {
         'zh': {
             'NVMeSSDTest': 'NVMe固态硬盘',
@@ -5,6 +5,8 @@ import subprocess
 #import usb.core
 
 class MiniPCIeTest(TestCase):
+    RESOURCES = ('pcie2',)
+
     LANGUAGES = {
         'zh': {
             'MiniPCIeTest': 'Mini PCIe to SATA',
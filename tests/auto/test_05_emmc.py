@@ -3,6 +3,8 @@ from unittest import TestCase
 import os
 
 class eMMCTest(TestCase):
+    RESOURCES = ('mmcblk2',)
+
     LANGUAGES = {
         'zh': {
             'eMMCTest': 'eMMC',
@@ -3,6 +3,8 @@ from unittest import TestCase
 import os
 
 class EEPROMTest(TestCase):
+    RESOURCES = ('i2c-2',)
+
     LANGUAGES = {
         'zh': {
             'EEPROMTest': 'EEPROM',
@@ -1,5 +1,6 @@
 from unittest import TestCase
 
+import os
 import time
 import socket
 import struct
@@ -9,6 +10,9 @@ import subprocess
 from dns.resolver import Resolver
 
 class Eth1Test(TestCase):
+    RESOURCES = ('eth1',)
+    TIMEOUT = 90
+
     LANGUAGES = {
         'zh': {
             'Eth1Test': '网口2',
@@ -20,11 +24,13 @@ class Eth1Test(TestCase):
         }
     }
 
-    def get_carrier(self, ifname: str):
-        carrier = f'/sys/class/net/{ifname}/carrier'
-
-        with open(carrier, 'r') as f:
-            return f.readline().strip()
+    def get_carrier(self, fd: int):
+        # Read the carrier file again through the same descriptor.
+        try:
+            return os.pread(fd, 16, 0).decode().strip()
+        except OSError:
+            # The file can't be read while the link is down.
+            return '0'
 
     def get_ip(self, ifname: str):
         s = socket.socket(socket.AF_INET, socket.SOCK_DGRAM)
@@ -40,9 +46,12 @@ class Eth1Test(TestCase):
         ping = f'ping -I {ifname} -c 3 {site}'
         timeout = 15
 
+        carrier = os.open(f'/sys/class/net/{ifname}/carrier', os.O_RDONLY)
+        self.addCleanup(os.close, carrier)
+
         i = 0
         while i < timeout:
-            if self.get_carrier(ifname) == '1':
+            if self.get_carrier(carrier) == '1':
                 break
 
             time.sleep(1)
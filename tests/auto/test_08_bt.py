@@ -3,6 +3,9 @@ from unittest import TestCase
 import subprocess
 
 class BTTest(TestCase):
+    RESOURCES = ('hci0',)
+    TIMEOUT = 30
+
     LANGUAGES = {
         'zh': {
             'BTTest': '蓝牙',
@@ -1,9 +1,60 @@
 from unittest import TestCase
 
+import os
+import socket
 import subprocess
+import tempfile
 import time
 
+CTRL_PATH = '/var/run/wpa_supplicant/wlan0'
+
+class WpaControl:
+    """A wpa_supplicant control socket client, as wpa_cli is, without a
+    process per command (kept here so the factory tests don't depend on
+    cricket)."""
+    def __init__(self, path=CTRL_PATH):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+        self.local = os.path.join(tempfile.gettempdir(), f'wpa_ctrl_{os.getpid()}-test')
+        if os.path.exists(self.local):
+            os.unlink(self.local)
+        self.sock.bind(self.local)
+        try:
+            self.sock.connect(path)
+        except OSError:
+            self.close()
+            raise
+
+    def close(self):
+        self.sock.close()
+        if os.path.exists(self.local):
+            os.unlink(self.local)
+
+    def send(self, command):
+        self.sock.send(command.encode('utf-8'))
+
+    def receive(self, deadline):
+        "The next message (reply or event), or None once the deadline has passed."
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return None
+        self.sock.settimeout(remaining)
+        try:
+            return self.sock.recv(65536).decode('utf-8', 'replace')
+        except socket.timeout:
+            return None
+
+    def command(self, command, deadline):
+        "Send a command, and return its reply; events arriving meanwhile are skipped."
+        self.send(command)
+        while True:
+            message = self.receive(deadline)
+            if message is None or not message.startswith('<'):
+                return message
+
 class WiFiTest(TestCase):
+    RESOURCES = ('wlan0',)
+    TIMEOUT = 150
+
     LANGUAGES = {
         'zh': {
             'WiFiTest': 'WiFi',
@@ -15,39 +66,39 @@ class WiFiTest(TestCase):
         }
     }
 
-    def _wpa_cli(self, command):
-        timeout = 10
-        cmd = f'wpa_cli -p/var/run/wpa_supplicant -iwlan0 {command}'
-        proc = subprocess.run(cmd, capture_output=True, text=True, shell=True, timeout=timeout)
-        print(f'Create wpa_cli subprocess run {command} return {proc.returncode}')
-        return proc.returncode, proc.stdout
-
     def test_scan(self):
+        timeout = 10
         try:
-            timeout = 10
-            cmd = 'pidof wpa_supplicant'
-            proc = subprocess.run(cmd, capture_output=True, text=True, shell=True, timeout=timeout)
-            if proc.returncode:
+            wpa = WpaControl()
+        except OSError:
+            try:
                 cmd = 'wpa_supplicant -B -Dnl80211 -iwlan0 -c/etc/wpa_supplicant.conf'
                 proc = subprocess.run(cmd, capture_output=True, text=True, shell=True, timeout=timeout)
-                print(f'Create wpa_supplicant subprocess return {proc.returncode}')
-                self.assertEqual(proc.returncode, 0)
-
-            rc, out = self._wpa_cli('scan')
-            print(out)
-            self.assertEqual(rc, 0)
-
-            i = 0
-            while i < timeout:
-                rc, out = self._wpa_cli('scan_results')
-                print(out)
-                self.assertEqual(rc, 0)
-                if len(out.splitlines()) > 1:
-                    break
-                time.sleep(1)
-                i += 1
-
-            if i == timeout:
+            except subprocess.TimeoutExpired:
+                self.fail('Start wpa_supplicant timeout')
+            print(f'Create wpa_supplicant subprocess return {proc.returncode}')
+            self.assertEqual(proc.returncode, 0)
+            wpa = WpaControl()
+        self.addCleanup(wpa.close)
+
+        deadline = time.monotonic() + timeout
+        self.assertEqual(wpa.command('ATTACH', deadline), 'OK\n')
+        self.addCleanup(wpa.send, 'DETACH')
+
+        # Finish as soon as the first scan that finds an access point ends.
+        wpa.send('SCAN')
+        results = []
+        while not results:
+            message = wpa.receive(deadline)
+            if message is None:
                 self.fail('scan results without ap')
-        except subprocess.TimeoutExpired:
-            self.fail('Scan failed')
+            if 'CTRL-EVENT-SCAN-RESULTS' not in message:
+                continue
+            reply = wpa.command('SCAN_RESULTS', deadline) or ''
+            results = reply.splitlines()[1:]
+            if not results:
+                # Nothing found yet; scan again.
+                wpa.send('SCAN')
+
+        for result in results:
+            print(result)
@@ -5,6 +5,9 @@ import subprocess
 #import usb.core
 
 class USB4GModuleTest(TestCase):
+    RESOURCES = ('usb1', 'modem0')
+    TIMEOUT = 30
+
     LANGUAGES = {
         'zh': {
             'USB4GModuleTest': '4G模块',